@@ -1,14 +1,27 @@
 import streamlit as st
 from dotenv import load_dotenv
 import os
-import base64
 import datetime
 import time
-from src.crawler import AsyncWebCrawler, URLValidator
-from src.chat import ChatAPI, ChatManager
+from src.checkpoint import CrawlCheckpoint
+from src.crawler import URLValidator, CrawlResult
+from src.jobs import CrawlJobManager, normalize_seed
+from src.linkfilter import (LinkRules, DEFAULT_DENY_EXTENSIONS, DEFAULT_EXCLUDE, DEFAULT_STRIP_PARAMS,
+                            parse_prefix_caps)
+from src.chat import ChatAPI, ChatManager, KeepAliveSession
 from src.file_processor import FileProcessor
-import json
-import asyncio
+from src.metrics import REGISTRY
+from src.context import ReferenceContent
+from src.cache import ResponseCache, context_hash
+from src.content import CompressedText
+from src.corpus import Corpus, save_corpus
+from src.export import chat_export, debug_export, export_bytes, export_filename, export_mime_type
+from src.ratelimit import RateLimiter, create_backend
+from src.render import MarkdownCache, history_window
+from src.debuglog import DebugLog, parse_sample_rates
+import re
+import uuid
+from urllib.parse import urlparse
 
 # Load environment variables and configure Python to not create __pycache__ files
 load_dotenv()
@@ -17,6 +30,24 @@ os.environ['PYTHONDONTWRITEBYTECODE'] = '1'
 # Constants
 OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
 SESSION_TIMEOUT = 3600  # 1 hour
+SESSION_ID_RE = re.compile(r'[0-9a-f]{32}')  # uuid4().hex, also accepted from the page URL
+KEEPALIVE_INTERVAL = 30  # Seconds between pings that keep the API connection warm
+CHAT_HTTP2 = os.getenv("CHAT_HTTP2", "").lower() in ("1", "true", "yes")  # Needs httpx[http2]; HTTP/1.1 otherwise
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH")  # Persist cached answers when set
+SIMILAR_QUESTION_THRESHOLD = 0.85
+DEBUG_LOG_CAPACITY = int(os.getenv("DEBUG_LOG_CAPACITY", "200"))  # Newest debug entries kept per session
+DEBUG_LOG_SAMPLING = parse_sample_rates(os.getenv("DEBUG_LOG_SAMPLING"))  # e.g. "API Request=0.1,Messages Being Sent=0"
+DEBUG_LOG_SHOWN = 20  # Entries listed in the developer panel
+CHAT_WINDOW = 20  # Messages shown at once; "Load earlier messages" shows this many more
+EXPORT_FORMATS = {"json": "JSON", "jsonl": "JSON Lines", "txt": "Text"}
+# memory, sqlite:///path/to/limits.db (processes on one host) or redis://host:port/db (replicas)
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_PER_MINUTE = int(os.getenv("RATE_LIMIT_PER_MINUTE", "20"))
+RATE_LIMIT_WAIT = 30  # Seconds a prompt waits for a free request slot before giving up
+CORPUS_DIR = os.getenv("CORPUS_DIR", "corpora")  # Saved corpus snapshots
+# Crawl progress is saved here so interrupted crawls can be resumed; empty to turn off
+CRAWL_CHECKPOINT_PATH = os.getenv("CRAWL_CHECKPOINT_PATH", os.path.join("checkpoints", "crawls.sqlite"))
+CSS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "style.css")
 
 # Initialize Streamlit page configuration
 st.set_page_config(
@@ -25,212 +56,76 @@ st.set_page_config(
     initial_sidebar_state="auto"
 )
 
-# Custom CSS styles
-st.markdown("""
-<style>
-    /* Base styles */
-    :root {
-        --sidebar-width: 300px;
-        --content-padding: 1rem;
-    }
-    
-    /* Responsive container widths */
-    @media (max-width: 640px) {
-        .block-container {
-            padding-top: 3rem !important;  /* Increased padding for mobile */
-            padding-left: 0.5rem !important;
-            padding-right: 0.5rem !important;
-        }
-        
-        .stChatFloatingInputContainer {
-            padding: 0.5rem !important;
-        }
-    }
-    
-    /* Chat container */
-    .stChatFloatingInputContainer {
-        padding: 10px;
-        background-color: rgba(240, 242, 246, 0.05);
-        border-radius: 10px;
-        backdrop-filter: blur(10px);
-        margin: 0 auto;
-        max-width: 1200px;
-    }
-    
-    /* Message containers */
-    .stChatMessage {
-        background-color: rgba(240, 242, 246, 0.1) !important;
-        border-radius: 15px !important;
-        padding: clamp(0.5rem, 2vw, 1rem) !important;
-        margin: 0.75rem 0 !important;
-        max-width: 100% !important;
-        overflow-wrap: break-word !important;
-    }
-    
-    /* Sidebar improvements */
-    .css-1d391kg {
-        padding: clamp(0.5rem, 2vw, 1rem) !important;
-    }
-    
-    /* Improve text readability */
-    div[data-testid="stMarkdownContainer"] > p {
-        font-size: clamp(14px, 1.5vw, 16px) !important;
-        line-height: 1.6 !important;
-    }
-    
-    /* Style the chat input */
-    .stChatInputContainer {
-        padding-bottom: clamp(10px, 2vw, 20px) !important;
-        padding-top: clamp(5px, 1vw, 10px) !important;
-        max-width: 1200px !important;
-        margin: 0 auto !important;
-    }
-    
-    /* Title container styling */
-    .title-container {
-        margin-top: 4rem;  /* Increased margin for better spacing */
-        margin-bottom: 1rem;
-        text-align: center;
-        padding-top: 2rem;  /* Added padding at the top */
-    }
-    
-    /* Main title styling */
-    .main-title {
-        font-size: 2.5rem !important;
-        font-weight: 600 !important;
-        margin-bottom: 1rem !important;
-        padding-top: 2rem !important;  /* Increased padding */
-    }
-    
-    /* Welcome container adjustments */
-    .welcome-container {
-        text-align: center;
-        padding: clamp(1.5rem, 3vw, 2.5rem);  /* Increased padding */
-        max-width: 800px;
-        margin: 1rem auto 2rem auto;  /* Adjusted margins */
-    }
-    
-    .welcome-container h3 {
-        font-size: clamp(1.5rem, 3vw, 2rem);
-        margin-bottom: 0.75rem;
-    }
-    
-    .welcome-container p {
-        font-size: clamp(1rem, 2vw, 1.1rem);
-        color: var(--text-color);
-        opacity: 0.8;
-    }
-    
-    /* Developer Mode Styling */
-    .dev-info {
-        border: 1px solid #f0ad4e;
-        border-radius: 5px;
-        background-color: rgba(240, 173, 78, 0.1);
-        padding: 1rem;
-        margin: 0.5rem 0;
-        font-family: monospace;
-        font-size: 0.9rem !important;
-        overflow-x: auto;
-    }
-    
-    .dev-info pre {
-        white-space: pre-wrap;
-        word-wrap: break-word;
-    }
-    
-    .dev-info-title {
-        color: #f0ad4e;
-        font-weight: bold;
-        margin-bottom: 0.5rem;
-        display: flex;
-        justify-content: space-between;
-    }
-    
-    .dev-info-title button {
-        background: none;
-        border: none;
-        color: #f0ad4e;
-        cursor: pointer;
-        font-size: 0.8rem;
-    }
-    
-    /* Adjust top spacing for mobile */
-    @media (max-width: 640px) {
-        .title-container {
-            margin-top: 3rem;  /* Adjusted for mobile */
-            padding-top: 1.5rem;  /* Adjusted for mobile */
-        }
-        
-        .main-title {
-            font-size: 2rem !important;
-            padding-top: 1.5rem !important;  /* Adjusted for mobile */
-        }
-        
-        .welcome-container {
-            padding: 1rem;  /* Adjusted padding for mobile */
-            margin-top: 1.5rem;  /* Added top margin for mobile */
-        }
-    }
-    
-    /* Responsive buttons */
-    .stButton > button {
-        padding: clamp(0.5rem, 1vw, 1rem) clamp(1rem, 2vw, 2rem) !important;
-        font-size: clamp(0.875rem, 1.5vw, 1rem) !important;
-    }
-    
-    /* Add some animation */
-    @keyframes fadeIn {
-        from { opacity: 0; transform: translateY(10px); }
-        to { opacity: 1; transform: translateY(0); }
-    }
-    
-    .stChatMessage {
-        animation: fadeIn 0.3s ease-out forwards;
-    }
-    
-    /* Improve form field readability */
-    .stTextInput > div > div > input {
-        font-size: clamp(14px, 1.5vw, 16px) !important;
-    }
-    
-    /* Make selectbox more mobile-friendly */
-    .stSelectbox > div > div > select {
-        font-size: clamp(14px, 1.5vw, 16px) !important;
-        padding: clamp(0.25rem, 1vw, 0.5rem) !important;
-    }
-</style>
-""", unsafe_allow_html=True)
+@st.cache_resource
+def load_css() -> str:
+    """Custom CSS styles, read once per process instead of rebuilt on every rerun"""
+    with open(CSS_PATH, encoding="utf-8") as f:
+        return f"<style>\n{f.read()}</style>"
+
+st.markdown(load_css(), unsafe_allow_html=True)
 
 # Session state initialization
 if "messages" not in st.session_state:
     st.session_state.messages = []
 if "crawled_data" not in st.session_state:
     st.session_state.crawled_data = []
+if "boilerplate" not in st.session_state:
+    st.session_state.boilerplate = {}  # Boilerplate block hashes per crawled host, for incremental crawls
 if "last_activity" not in st.session_state:
     st.session_state.last_activity = datetime.datetime.now().timestamp()
 if "debug_info" not in st.session_state:
-    st.session_state.debug_info = []
+    st.session_state.debug_info = DebugLog(DEBUG_LOG_CAPACITY, DEBUG_LOG_SAMPLING)
 if "chat_manager_cleared" not in st.session_state:
     st.session_state.chat_manager_cleared = False
+if "session_id" not in st.session_state:
+    # Kept in the page URL, so a reload after a restart still finds the session's interrupted crawls
+    session_param = st.query_params.get("session", "")
+    st.session_state.session_id = session_param if SESSION_ID_RE.fullmatch(session_param) else uuid.uuid4().hex
+if st.query_params.get("session") != st.session_state.session_id:
+    st.query_params["session"] = st.session_state.session_id
+if "crawl_job_id" not in st.session_state:
+    st.session_state.crawl_job_id = None
+if "reference_content" not in st.session_state:
+    st.session_state.reference_content = ReferenceContent(max_chars=10000)  # Limit total context to prevent token overflow
+if "chat_window" not in st.session_state:
+    st.session_state.chat_window = CHAT_WINDOW
+if "pending_debug" not in st.session_state:
+    st.session_state.pending_debug = []
 
 def check_session_timeout() -> bool:
     """Check if the session has timed out"""
     current_time = datetime.datetime.now().timestamp()
     if current_time - st.session_state.last_activity > SESSION_TIMEOUT:
         st.session_state.messages = []
+        st.session_state.chat_window = CHAT_WINDOW
         st.session_state.crawled_data = []
+        st.session_state.boilerplate = {}
         st.session_state.last_activity = current_time
         st.session_state.chat_manager_cleared = True
         return True
     st.session_state.last_activity = current_time
     return False
 
-def generate_download_link(content: str, filename: str, display_text: str) -> str:
-    """Generate a download link for file content"""
-    b64 = base64.b64encode(content.encode()).decode()
-    ext = filename.split('.')[-1]
-    mime_type = "application/json" if ext == "json" else "text/plain"
-    return f'<a href="data:{mime_type};base64,{b64}" download="{filename}">{display_text}</a>'
+def export_panel(key: str, basename: str, formats: dict, chunks, version=None) -> None:
+    """Export controls whose file is only built when asked for, rather than on every rerun
+
+    ``chunks(fmt)`` returns the export as text chunks, which are streamed
+    (optionally through gzip) into the download. A prepared download is kept
+    until ``version``, the format or compression changes.
+    """
+    fmt = st.sidebar.selectbox("Format", list(formats), format_func=formats.get, key=f"{key}_export_format")
+    compress = st.sidebar.checkbox("Compress (gzip)", key=f"{key}_export_gzip")
+    request = (fmt, compress, version)
+    if st.sidebar.button("📦 Prepare download", key=f"{key}_export_prepare", use_container_width=True):
+        st.session_state[f"{key}_export"] = (
+            request, export_bytes(chunks(fmt), compress, kind=key), export_filename(basename, fmt, compress)
+        )
+    prepared = st.session_state.get(f"{key}_export")
+    if prepared is not None and prepared[0] == request:
+        _, data, filename = prepared
+        st.sidebar.download_button(f"⬇️ Download {filename}", data=data, file_name=filename,
+                                   mime=export_mime_type(fmt, compress), key=f"{key}_export_download",
+                                   use_container_width=True)
 
 def format_context_window(tokens: int) -> str:
     """Format context window size in a readable way"""
@@ -252,69 +147,298 @@ def format_model_name(model: dict) -> str:
     except Exception:
         return model.get('id', 'Unknown Model')
 
-def add_debug_info(title: str, content: any, type_info: str = "info"):
-    """Add debug information to the session state"""
-    timestamp = datetime.datetime.now().strftime("%H:%M:%S")
-    if isinstance(content, dict) or isinstance(content, list):
-        formatted_content = json.dumps(content, indent=2)
-    else:
-        formatted_content = str(content)
-    
-    st.session_state.debug_info.append({
-        "timestamp": timestamp,
-        "title": title,
-        "content": formatted_content,
-        "type": type_info
-    })
+def add_debug_info(title: str, content: any, type_info: str = "info", timestamp: str = None):
+    """Add debug information to the session's debug log; it is serialized only when viewed or exported"""
+    st.session_state.debug_info.add(title, content, type_info, timestamp)
+
+def defer_debug_info(title: str, build, type_info: str = "info"):
+    """Queue debug information to be built by flush_debug_info, unless sampling drops it"""
+    if st.session_state.developer_mode and st.session_state.debug_info.keep(title, type_info):
+        timestamp = datetime.datetime.now().strftime("%H:%M:%S")
+        st.session_state.pending_debug.append((timestamp, title, build, type_info))
+
+def flush_debug_info():
+    """Build and record queued debug information, off the time-to-first-token path"""
+    pending, st.session_state.pending_debug = st.session_state.pending_debug, []
+    for timestamp, title, build, type_info in pending:
+        st.session_state.debug_info.add(title, build(), type_info, timestamp, sample=False)
 
 def clear_debug_info():
     """Clear debug information from the session state"""
-    st.session_state.debug_info = []
+    st.session_state.debug_info.clear()
+
+@st.fragment
+def debug_panel() -> None:
+    """List the newest debug entries; only the selected one is serialized"""
+    debug_log = st.session_state.debug_info
+    entries = debug_log.latest(DEBUG_LOG_SHOWN)
+    st.caption(f"Showing the newest {len(entries)} of {len(debug_log)} entries kept "
+               f"(capacity {debug_log.capacity}, {debug_log.recorded} recorded)")
+    st.dataframe([{"time": entry.timestamp, "type": entry.type, "title": entry.title} for entry in entries],
+                 use_container_width=True, hide_index=True)
+    selected = st.selectbox("Entry", range(len(entries)), key="debug_entry",
+                            format_func=lambda i: f"[{entries[i].timestamp}] {entries[i].title}")
+    if selected is not None and selected < len(entries):
+        st.code(entries[selected].content, language="json")
 
 def prepare_crawled_content() -> str:
-    """Prepare crawled content for inclusion in the system prompt"""
-    if not st.session_state.crawled_data:
-        return ""
+    """Prepare crawled content for inclusion in the system prompt, rebuilt only when the documents change"""
+    return st.session_state.reference_content.update(st.session_state.crawled_data)
+
+def crawl_result_to_dict(result: CrawlResult) -> dict:
+    """Convert a crawl result into the dict stored in crawled_data"""
+    return {
+        'url': result.url,
+        'title': result.title,
+        'content': result.text,  # Compressed; slicing and len() inflate only what they need
+        'status_code': result.status_code,
+        'fingerprint': result.fingerprint,
+        'source_hash': result.source_hash
+    }
+
+def previous_crawl_results(urls: list) -> list:
+    """Return the stored crawl results belonging to the same sites as urls"""
+    netlocs = {urlparse(url).netloc for url in urls}
+    return [
+        CrawlResult(
+            url=item['url'],
+            title=item['title'],
+            content=item['content'],
+            status_code=item.get('status_code', 200),
+            fingerprint=item.get('fingerprint', ''),
+            source_hash=item.get('source_hash', '')
+        )
+        for item in st.session_state.crawled_data
+        if item.get('url') != "uploaded_file" and urlparse(item['url']).netloc in netlocs
+    ]
+
+def merge_crawl_results(results: list, changes: dict) -> None:
+    """Apply an incremental crawl to crawled_data, touching only added, changed and removed pages"""
+    updated = set(changes.get('added', [])) | set(changes.get('changed', []))
+    removed = set(changes.get('removed', []))
+    new_items = {result.url: crawl_result_to_dict(result) for result in results if result.url in updated}
     
-    content_parts = []
-    total_chars = 0
-    max_chars = 10000  # Limit total context to prevent token overflow
+    merged = []
+    for item in st.session_state.crawled_data:
+        item_url = item.get('url')
+        if item_url in removed:
+            continue
+        if item_url in new_items:
+            merged.append(new_items.pop(item_url))
+        else:
+            # Unchanged pages and documents from other sources keep their existing entry
+            merged.append(item)
+    merged.extend(new_items.values())
+    st.session_state.crawled_data = merged
+
+@st.cache_resource
+def open_corpus_snapshot(path: str, modified: float) -> Corpus:
+    """Memory-mapped snapshot shared by every session; saving over it changes modified and reopens it"""
+    return Corpus(path)
+
+def corpus_snapshots() -> list:
+    if not os.path.isdir(CORPUS_DIR):
+        return []
+    return sorted(name[:-len(".corpus")] for name in os.listdir(CORPUS_DIR) if name.endswith(".corpus"))
+
+def corpus_panel() -> None:
+    """Save crawled data as a named snapshot, or replace it with a saved one"""
+    st.sidebar.markdown("---")
+    st.sidebar.title("💾 Saved Corpora")
+    if st.session_state.crawled_data:
+        name = st.sidebar.text_input("Snapshot name", key="corpus_name", placeholder="e.g. product-docs")
+        if st.sidebar.button("💾 Save Corpus", key="corpus_save", use_container_width=True, disabled=not name):
+            safe_name = "".join(c if c.isalnum() or c in "-_." else "_" for c in name).strip(".")
+            path = os.path.join(CORPUS_DIR, f"{safe_name}.corpus")
+            try:
+                started = time.time()
+                # The boilerplate hashes let an incremental crawl of a loaded snapshot clean its changed pages
+                boilerplate = {host: sorted(hashes) for host, hashes in st.session_state.boilerplate.items()}
+                size = save_corpus(path, st.session_state.crawled_data,
+                                   metadata={"name": name, "boilerplate": boilerplate})
+                st.sidebar.success(f"✅ Saved {len(st.session_state.crawled_data)} documents ({size / 1e6:.1f} MB)")
+                if st.session_state.developer_mode:
+                    add_debug_info("Corpus Saved", {"path": path, "bytes": size,
+                                                    "seconds": round(time.time() - started, 3)})
+            except (OSError, ValueError) as e:
+                st.sidebar.error(f"❌ Could not save corpus: {str(e)}")
+    snapshots = corpus_snapshots()
+    if not snapshots:
+        st.sidebar.caption(f"No saved corpora in {CORPUS_DIR}/")
+        return
+    selected = st.sidebar.selectbox("Saved corpus", snapshots, key="corpus_selected")
+    if st.sidebar.button("📂 Load Corpus", key="corpus_load", use_container_width=True):
+        path = os.path.join(CORPUS_DIR, f"{selected}.corpus")
+        try:
+            started = time.time()
+            corpus = open_corpus_snapshot(path, os.path.getmtime(path))
+            st.session_state.crawled_data = list(corpus.documents())  # A copy: uploads append to it
+            st.session_state.boilerplate = {host: set(hashes)
+                                            for host, hashes in corpus.metadata.get("boilerplate", {}).items()}
+            prepare_crawled_content()
+            st.sidebar.success(f"✅ Loaded {len(corpus)} documents from {selected}")
+            if st.session_state.developer_mode:
+                add_debug_info("Corpus Loaded", {"path": path, "documents": len(corpus),
+                                                 "seconds": round(time.time() - started, 3)})
+        except (OSError, ValueError) as e:
+            st.sidebar.error(f"❌ Could not load corpus: {str(e)}")
+
+@st.cache_resource
+def get_link_rules(include: str, exclude: str, prefix_caps: str, skip_files: bool, strip_tracking: bool) -> LinkRules:
+    """Link rules compiled once per distinct setting and shared by every crawl using them"""
+    return LinkRules(include=include.splitlines(), exclude=exclude.splitlines(),
+                     deny_extensions=DEFAULT_DENY_EXTENSIONS if skip_files else (),
+                     strip_params=DEFAULT_STRIP_PARAMS if strip_tracking else (),
+                     prefix_caps=parse_prefix_caps(prefix_caps.splitlines()))
+
+@st.cache_resource
+def get_crawl_job_manager() -> CrawlJobManager:
+    """Process-wide crawl job manager shared by all sessions"""
+    checkpoint = CrawlCheckpoint(CRAWL_CHECKPOINT_PATH) if CRAWL_CHECKPOINT_PATH else None
+    return CrawlJobManager(max_concurrent=4, max_per_owner=1, checkpoint=checkpoint)
+
+def resumable_crawl_label(job: dict) -> str:
+    seeds = job["seeds"][0] + (f" +{len(job['seeds']) - 1}" if len(job["seeds"]) > 1 else "")
+    return f"{seeds} · {job['pages']} pages · {job['state']} {time.strftime('%b %d %H:%M', time.localtime(job['updated']))}"
+
+def finish_crawl_job(job_id: str) -> None:
+    """Move a finished crawl job's results into crawled_data"""
+    info = get_crawl_job_manager().status(job_id)
+    job = get_crawl_job_manager().collect(job_id)
+    st.session_state.crawl_job_id = None
+    if job is None or info is None:
+        return
     
-    content_parts.append("\n\n### REFERENCE CONTENT ###\n")
-    content_parts.append("Use the following information to answer the user's questions:\n\n")
+    if info.state == "cancelled":
+        st.session_state.crawl_notice = ("warning", "⚠️ Crawl cancelled.")
+        return
+    if info.state == "failed":
+        st.session_state.crawl_notice = ("error", f"❌ Crawling error: {info.error}")
+        if st.session_state.developer_mode:
+            add_debug_info("Crawler Error", info.error, "error")
+        return
+    if not job.results:
+        st.session_state.crawl_notice = ("warning", "⚠️ No content found on this website.")
+        return
     
-    for idx, item in enumerate(st.session_state.crawled_data):
-        title = item.get('title', f"Document {idx+1}")
-        url = item.get('url', 'No URL')
-        content = item.get('content', '')
-        
-        # Calculate how many characters we can include from this document
-        remaining_chars = max_chars - total_chars
-        if remaining_chars <= 0:
-            break
-            
-        # Truncate the content if needed
-        excerpt = content[:min(len(content), remaining_chars)]
-        total_chars += len(excerpt) + 100  # Add buffer for the formatting
-        
-        content_parts.append(f"--- {title} ---\n")
-        if url != "uploaded_file":
-            content_parts.append(f"Source: {url}\n")
-        content_parts.append(f"{excerpt}\n\n")
+    if job.previous:
+        merge_crawl_results(job.results, job.changes)
+        st.session_state.boilerplate.update(job.boilerplate)
+        notice = (f"✅ Found {len(job.results)} pages. 🔄 {len(job.changes['added'])} added, "
+                  f"{len(job.changes['changed'])} changed, {len(job.changes['removed'])} removed")
+    else:
+        st.session_state.crawled_data = [crawl_result_to_dict(result) for result in job.results]
+        st.session_state.boilerplate = dict(job.boilerplate)
+        notice = f"✅ Found {len(job.results)} pages"
+    st.session_state.crawl_notice = ("success", notice)
+    st.session_state.show_crawled_pages = True
+    prepare_crawled_content()  # Build the reference block now rather than on the next prompt
     
-    if total_chars >= max_chars:
-        content_parts.append("(Note: Some content was truncated due to length limits)\n")
-        
-    return "".join(content_parts)
+    if st.session_state.developer_mode:
+        add_debug_info("Crawl Results Summary", {
+            "pages_found": len(job.results),
+            "urls": [result.url for result in job.results],
+            "total_content_size": sum(len(result.text) for result in job.results),
+            "changes": {key: len(urls) for key, urls in job.changes.items()},
+            "errors": job.errors,
+            "duration": f"{info.finished_at - (info.started_at or info.submitted_at):.2f} seconds"
+        })
+
+@st.fragment(run_every=1.0)
+def crawl_job_panel() -> None:
+    """Poll the session's background crawl without rerunning the whole app"""
+    job_id = st.session_state.crawl_job_id
+    info = get_crawl_job_manager().status(job_id)
+    if info is None or info.finished:
+        if info is not None:
+            finish_crawl_job(job_id)
+        else:
+            st.session_state.crawl_job_id = None
+        st.rerun()
+    
+    label = "⏳ Waiting for a crawl slot..." if info.state == "queued" else "🌐 Crawling..."
+    st.progress(info.progress, text=f"{label} {info.pages_found} pages found")
+    if info.messages:
+        st.caption(info.messages[-1])
+    if st.button("⏹️ Cancel Crawl", key="cancel_crawl", use_container_width=True):
+        get_crawl_job_manager().cancel(job_id)
+
+@st.cache_resource
+def get_markdown_cache() -> MarkdownCache:
+    return MarkdownCache()
+
+def show_earlier_messages() -> None:
+    st.session_state.chat_window += CHAT_WINDOW
+
+@st.fragment
+def chat_history() -> None:
+    """Show the latest messages; paging back reruns only this fragment"""
+    hidden, window = history_window(st.session_state.messages, st.session_state.chat_window)
+    if hidden:
+        st.button(f"⬆️ Load earlier messages ({hidden} hidden)", key="load_earlier", use_container_width=True,
+                  on_click=show_earlier_messages)
+    markdown_cache = get_markdown_cache()
+    for message in window:
+        with st.chat_message(message["role"]):
+            st.markdown(markdown_cache.get(message))
+
+@st.cache_resource
+def get_chat_connection() -> KeepAliveSession:
+    """Process-wide HTTP session to the API host, warmed on first page load"""
+    connection = KeepAliveSession(OPENROUTER_BASE_URL, interval=KEEPALIVE_INTERVAL, http2=CHAT_HTTP2)
+    connection.start()
+    return connection
+
+@st.cache_resource
+def get_response_cache() -> ResponseCache:
+    """Process-wide cache of answers, keyed by model, question, context and temperature"""
+    return ResponseCache(max_entries=512, ttl=24 * 3600, path=RESPONSE_CACHE_PATH)
+
+@st.cache_resource
+def get_rate_limiter() -> RateLimiter:
+    """Process-wide request limiter, bucketed per API key and shared through RATE_LIMIT_BACKEND"""
+    return RateLimiter(max_requests=RATE_LIMIT_PER_MINUTE, time_window=60, backend=create_backend(RATE_LIMIT_BACKEND))
 
 # Initialize API and managers
 def get_api_and_managers(api_key: str):
-    """Initialize API and managers without caching"""
-    chat_api = ChatAPI(OPENROUTER_BASE_URL, api_key)
+    """Initialize API and managers; the pooled connection, response cache and rate limiter are shared between reruns"""
+    cache = get_response_cache() if st.session_state.get("use_response_cache", True) else None
+    chat_api = ChatAPI(OPENROUTER_BASE_URL, api_key, session=get_chat_connection().session, cache=cache)
+    chat_api.rate_limiter = get_rate_limiter()
+    chat_api.rate_limit_wait = RATE_LIMIT_WAIT
+    if st.session_state.get("match_similar_questions", False):
+        chat_api.cache_similarity = SIMILAR_QUESTION_THRESHOLD
     chat_manager = ChatManager(chat_api)
     file_processor = FileProcessor()
     return chat_api, chat_manager, file_processor
 
+@st.cache_data(ttl=300, show_spinner=False)
+def get_models(api_key: str) -> dict:
+    """Model list per API key, refreshed every five minutes instead of on every rerun"""
+    models_data = get_api_and_managers(api_key)[0].fetch_models()
+    if "error" in models_data:
+        raise RuntimeError(models_data["error"])  # Raised so errors are not cached
+    return models_data
+
+def stream_comparison(chat_api: ChatAPI, messages: list, models: list, temperature: float, max_tokens: int,
+                      placeholder) -> str:
+    """Stream several models' answers side by side and return them combined for the chat history"""
+    answers = {model: "" for model in models}
+    slots = {}
+    with placeholder.container():
+        for column, model in zip(st.columns(len(models)), models):
+            column.markdown(f"**{model.split('/')[-1].replace(':free', '')}**")
+            slots[model] = column.empty()
+    
+    for model, content in chat_api.compare(messages, models, temperature=temperature, max_tokens=max_tokens):
+        answers[model] += content
+        slots[model].markdown(answers[model] + "▌")
+    for model, answer in answers.items():
+        slots[model].markdown(answer)
+    return "\n\n".join(f"**{model}**\n\n{answer.strip()}" for model, answer in answers.items() if answer.strip())
+
+get_chat_connection()  # Start warming the connection before the first prompt
+
 # Sidebar configuration
 with st.sidebar:
     st.title("🔑 Configuration")
@@ -340,19 +464,44 @@ with st.sidebar:
     api_key = st.session_state.get('api_key', '')
     if api_key:
         chat_api, _, _ = get_api_and_managers(api_key)
-        models_data = chat_api.fetch_models()
+        try:
+            models_data = get_models(api_key)
+        except RuntimeError as e:
+            models_data = {"error": str(e)}
         
         if "error" not in models_data:
             free_models = [model for model in models_data['data'] if is_free_model(model)]
             if free_models:
                 model_options = {format_model_name(model): model['id'] for model in free_models}
+                model_labels = {model_id: label for label, model_id in model_options.items()}
+                # Models that answered fastest so far come first; the best is the default choice
+                ranked_models = chat_api.model_stats.rank(list(model_options.values()))
                 st.info("ℹ️ All shown models are completely FREE to use!")
                 selected_model = st.selectbox(
                     "Select Free AI Model",
                     options=list(model_options.keys()),
+                    index=list(model_options.values()).index(ranked_models[0]),
                     key="selected_model"
                 )
                 
+                response_mode = st.radio(
+                    "Response Mode",
+                    ["Single model", "Race", "Compare"],
+                    key="response_mode",
+                    horizontal=True,
+                    help="Race sends your question to several models and shows the first to answer. "
+                         "Compare shows all of their answers side by side."
+                )
+                if response_mode != "Single model":
+                    multi_model_labels = st.multiselect(
+                        "Models to race or compare",
+                        options=list(model_options.keys()),
+                        default=[model_labels[model_id] for model_id in ranked_models[:3]],
+                        max_selections=4,
+                        key="multi_model_labels"
+                    )
+                    st.session_state.multi_models = [model_options[label] for label in multi_model_labels]
+                
                 if selected_model:
                     st.session_state.current_model = model_options[selected_model]
                     selected_model_data = next(
@@ -415,80 +564,133 @@ max_tokens = st.sidebar.slider(
     help="Maximum number of tokens (words) in the response"
 )
 
+use_response_cache = st.sidebar.checkbox(
+    "Reuse cached answers",
+    value=st.session_state.get("use_response_cache", True),
+    help="Answer a question asked before, with the same model, documents and conversation, from cache"
+)
+st.session_state.use_response_cache = use_response_cache
+st.session_state.match_similar_questions = st.sidebar.checkbox(
+    "Match similar questions",
+    value=st.session_state.get("match_similar_questions", False),
+    disabled=not use_response_cache,
+    help="Also reuse the answer to a differently worded but similar question"
+) and use_response_cache
+
 # Web crawler section
 st.sidebar.markdown("---")
 st.sidebar.title("🌐 Web Crawler")
 
-url_input = st.sidebar.text_input("Enter URL to crawl", key="url_input")
+url_input = st.sidebar.text_area(
+    "Enter URLs to crawl",
+    key="url_input",
+    help="One URL or domain per line. Several sites are crawled concurrently."
+)
 depth = st.sidebar.slider("Crawling Depth", min_value=1, max_value=5, value=2)
 st.sidebar.caption("How deep to explore website links")
 max_pages = st.sidebar.slider("Maximum Pages", min_value=1, max_value=100, value=50)
 st.sidebar.caption("Maximum number of pages to process")
+crawl_topic = st.sidebar.text_input(
+    "Focus topic (optional)",
+    key="crawl_topic",
+    help="Pages whose links and URLs match these words are crawled first"
+)
+incremental_crawl = st.sidebar.checkbox(
+    "Incremental recrawl",
+    value=True,
+    help="When re-crawling a site, only re-process pages whose content changed since the last crawl"
+)
+with st.sidebar.expander("🔗 Link Filters"):
+    skip_files = st.checkbox("Skip links to files and media", value=True, key="link_skip_files",
+                             help="PDFs, images, archives, video and other non-HTML links are not fetched")
+    strip_tracking = st.checkbox("Ignore tracking parameters", value=True, key="link_strip_tracking",
+                                 help="utm_*, fbclid, session IDs and similar are removed, so variants of a page are fetched once")
+    include_patterns = st.text_area("Only follow links matching", key="link_include",
+                                    help="One pattern per line: a glob over the whole URL (e.g. */docs/*), or re: and a regex")
+    exclude_patterns = st.text_area("Never follow links matching", value="\n".join(DEFAULT_EXCLUDE), key="link_exclude")
+    prefix_caps = st.text_area("Page caps per path", key="link_caps", placeholder="/blog/=20\n/tag/=5",
+                               help="Follow at most this many links under a path prefix")
 
-if st.sidebar.button("Start Crawling", key="crawl_button", use_container_width=True):
-    if not url_input:
+if st.sidebar.button("Start Crawling", key="crawl_button", use_container_width=True,
+                     disabled=bool(st.session_state.crawl_job_id)):
+    seed_urls = [normalize_seed(line) for line in url_input.splitlines() if line.strip()]
+    validations = [(url, *URLValidator.validate(url)) for url in seed_urls]
+    invalid_urls = [(url, message) for url, is_valid, message in validations if not is_valid]
+    if not seed_urls:
         st.sidebar.warning("⚠️ Please enter a URL to crawl")
+    elif invalid_urls:
+        for url, message in invalid_urls:
+            st.sidebar.error(f"❌ {url}: {message}")
     else:
-        if not url_input.startswith(('http://', 'https://')):
-            url_input = 'https://' + url_input
+        if depth > 3 and max_pages > 50:
+            st.sidebar.warning("⚠️ High depth and page count may take a long time to process")
         
-        is_valid, message = URLValidator.validate(url_input)
-        if not is_valid:
-            st.sidebar.error(f"❌ {message}")
-        else:
-            if depth > 3 and max_pages > 50:
-                st.sidebar.warning("⚠️ High depth and page count may take a long time to process")
+        try:
+            if st.session_state.developer_mode:
+                add_debug_info("Crawler Configuration", {
+                    "urls": seed_urls,
+                    "depth": depth,
+                    "max_pages": max_pages,
+                    "topic": crawl_topic
+                })
             
-            with st.spinner(f"Crawling {url_input}..."):
-                try:
-                    if st.session_state.developer_mode:
-                        add_debug_info("Crawler Configuration", {
-                            "url": url_input,
-                            "depth": depth,
-                            "max_pages": max_pages
-                        })
-                    
-                    crawler = AsyncWebCrawler(max_depth=depth, max_pages=max_pages)
-                    with st.status("🌐 Crawling website...", expanded=True) as status:
-                        status.write("🔍 Starting crawler...")
-                        results = asyncio.run(crawler.crawl(url_input, status))
-                    
-                    if not results:
-                        st.sidebar.warning("⚠️ No content found on this website.")
-                    else:
-                        st.session_state.crawled_data = [
-                            {
-                                'url': result.url,
-                                'title': result.title,
-                                'content': result.content,
-                                'status_code': result.status_code
-                            } for result in results
-                        ]
-                        st.sidebar.success(f"✅ Found {len(results)} pages")
-                        
-                        if st.session_state.developer_mode:
-                            add_debug_info("Crawl Results Summary", {
-                                "pages_found": len(results),
-                                "urls": [result.url for result in results],
-                                "total_content_size": sum(len(result.content) for result in results)
-                            })
-                        
-                        # Display results
-                        st.subheader("📄 Crawled Pages")
-                        for result in st.session_state.crawled_data:
-                            with st.expander(f"📄 {result['title'][:50]}..."):
-                                st.write(f"URL: {result['url']}")
-                                st.write(f"Content Length: {len(result['content'])} characters")
-                                st.write("First 200 characters of content:")
-                                st.text(result['content'][:200] + "...")
-
-                        if st.session_state.crawled_data:
-                            st.info("💡 You can now ask questions about the crawled content!")
-                except Exception as e:
-                    st.sidebar.error(f"❌ Crawling error: {str(e)}")
-                    if st.session_state.developer_mode:
-                        add_debug_info("Crawler Error", str(e), "error")
-                        st.sidebar.code(str(e))
+            previous = previous_crawl_results(seed_urls) if incremental_crawl else []
+            st.session_state.crawl_job_id = get_crawl_job_manager().submit(
+                seed_urls,
+                owner=st.session_state.session_id,
+                max_depth=depth,
+                max_pages=max_pages,
+                topic=crawl_topic or None,
+                previous=previous,
+                boilerplate=st.session_state.boilerplate if incremental_crawl else None,
+                link_rules=get_link_rules(include_patterns, exclude_patterns, prefix_caps, skip_files, strip_tracking)
+            )
+        except Exception as e:
+            st.sidebar.error(f"❌ Crawling error: {str(e)}")
+            if st.session_state.developer_mode:
+                add_debug_info("Crawler Error", str(e), "error")
+                st.sidebar.code(str(e))
+
+resumable_crawls = get_crawl_job_manager().resumable(st.session_state.session_id) if not st.session_state.crawl_job_id else []
+if resumable_crawls:
+    with st.sidebar.expander(f"⏯️ Interrupted crawls ({len(resumable_crawls)})"):
+        crawl_labels = {job["job_id"]: resumable_crawl_label(job) for job in resumable_crawls}
+        resume_id = st.selectbox("Crawl", list(crawl_labels), format_func=crawl_labels.get, key="resume_crawl_id",
+                                 help="Continues from the pages already found, with the link filters set above")
+        resume_column, discard_column = st.columns(2)
+        if resume_column.button("▶️ Resume", key="resume_crawl", use_container_width=True):
+            try:
+                st.session_state.crawl_job_id = get_crawl_job_manager().resume(
+                    resume_id,
+                    owner=st.session_state.session_id,
+                    link_rules=get_link_rules(include_patterns, exclude_patterns, prefix_caps, skip_files, strip_tracking)
+                )
+                st.rerun()
+            except (ValueError, RuntimeError) as e:
+                st.error(f"❌ Could not resume: {str(e)}")
+        if discard_column.button("🗑️ Discard", key="discard_crawl", use_container_width=True):
+            get_crawl_job_manager().discard(resume_id, owner=st.session_state.session_id)
+            st.rerun()
+
+if st.session_state.crawl_job_id:
+    with st.sidebar:
+        crawl_job_panel()
+
+notice = st.session_state.pop("crawl_notice", None)
+if notice:
+    level, message = notice
+    getattr(st.sidebar, level)(message)
+
+# Display the pages from a crawl that just finished
+if st.session_state.pop("show_crawled_pages", False) and st.session_state.crawled_data:
+    st.subheader("📄 Crawled Pages")
+    for result in st.session_state.crawled_data:
+        with st.expander(f"📄 {result['title'][:50]}..."):
+            st.write(f"URL: {result['url']}")
+            st.write(f"Content Length: {len(result['content'])} characters")
+            st.write("First 200 characters of content:")
+            st.text(result['content'][:200] + "...")
+    st.info("💡 You can now ask questions about the crawled content!")
 
 # File upload section
 st.sidebar.markdown("---")
@@ -518,8 +720,9 @@ if uploaded_file is not None:
             st.session_state.crawled_data.append({
                 'url': "uploaded_file",
                 'title': uploaded_file.name,
-                'content': text_content[:1000000]  # Limit to ~1MB
+                'content': CompressedText(text_content[:1000000])  # Limit to ~1MB
             })
+            prepare_crawled_content()
             st.sidebar.success(f"✅ Successfully processed: {uploaded_file.name}")
             st.sidebar.info("💡 You can now ask questions about the uploaded document!")
             
@@ -535,6 +738,8 @@ if uploaded_file is not None:
             add_debug_info("File Processing Exception", str(e), "error")
             st.sidebar.code(str(e))
 
+corpus_panel()
+
 # Main chat interface
 st.markdown("""
 <div class="title-container">
@@ -559,16 +764,12 @@ if st.session_state.crawled_data:
         st.success(f"✅ {data_count} documents loaded and ready for questions")
 
 # Display chat messages
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        st.markdown(message["content"])
+chat_history()
 
 # Display developer info if developer mode is enabled
 if st.session_state.developer_mode and st.session_state.debug_info:
     st.markdown("## 🛠️ Developer Information")
-    for idx, debug_item in enumerate(st.session_state.debug_info):
-        with st.expander(f"[{debug_item['timestamp']}] {debug_item['title']}"):
-            st.code(debug_item["content"], language="json")
+    debug_panel()
 
 # Chat input and response handling
 if prompt := st.chat_input("What would you like to know?", key="chat_input"):
@@ -588,6 +789,10 @@ if prompt := st.chat_input("What would you like to know?", key="chat_input"):
         else:
             # Get API and chat manager 
             chat_api, chat_manager, _ = get_api_and_managers(st.session_state.api_key)
+            response_mode = st.session_state.get("response_mode", "Single model")
+            multi_models = st.session_state.get("multi_models", [])
+            if len(multi_models) < 2:
+                response_mode = "Single model"
             
             # Add user message to session state messages
             st.session_state.messages.append({"role": "user", "content": prompt})
@@ -625,27 +830,28 @@ if prompt := st.chat_input("What would you like to know?", key="chat_input"):
                         enhanced_system_prompt = base_system_prompt
                         if crawled_content:
                             enhanced_system_prompt = f"{base_system_prompt}\n{crawled_content}"
-                            if st.session_state.developer_mode:
-                                add_debug_info("Enhanced System Prompt", {
-                                    "base_prompt": base_system_prompt,
-                                    "added_content_length": len(crawled_content),
-                                    "total_length": len(enhanced_system_prompt)
-                                })
+                            defer_debug_info("Enhanced System Prompt", lambda: {
+                                "base_prompt": base_system_prompt,
+                                "added_content_length": len(crawled_content),
+                                "total_length": len(enhanced_system_prompt)
+                            })
                         
                         # Prepare messages for sending to API
                         messages_to_send = chat_manager.get_messages().copy()
                         
-                        # Debug: Check messages exist
-                        if st.session_state.developer_mode:
-                            add_debug_info("Chat Manager Messages Count", {
-                                "count": len(chat_manager.messages),
-                                "messages": [{"role": msg["role"], "content_preview": msg["content"][:30] + "..."} 
-                                            for msg in chat_manager.messages]
-                            })
+                        # Debug: Check messages exist. Debug entries are built once the
+                        # response is streaming so they do not delay the first token.
+                        manager_messages = chat_manager.get_messages()
+                        defer_debug_info("Chat Manager Messages Count", lambda: {
+                            "count": len(manager_messages),
+                            "messages": [{"role": msg["role"], "content_preview": msg["content"][:30] + "..."} 
+                                        for msg in manager_messages]
+                        })
                         
                         # Make sure we have messages to send - this should not happen now
                         if not messages_to_send or len(messages_to_send) == 0:
                             message_placeholder.error("❌ Error: No messages to send to the API.")
+                            flush_debug_info()
                             if st.session_state.developer_mode:
                                 add_debug_info("Message Error", "No messages to send to the API", "error") 
                             st.session_state.messages.pop()
@@ -658,118 +864,164 @@ if prompt := st.chat_input("What would you like to know?", key="chat_input"):
                                 })
                             
                             # Log request details in developer mode
-                            if st.session_state.developer_mode:
-                                request_payload = {
-                                    "model": st.session_state.current_model,
-                                    "temperature": temperature,
-                                    "max_tokens": max_tokens,
-                                    "stream": True,
-                                    "message_count": len(messages_to_send),
-                                    "includes_crawled_data": bool(crawled_content),
-                                    "system_prompt_length": len(enhanced_system_prompt) if enhanced_system_prompt else 0
-                                }
-                                add_debug_info("API Request", request_payload)
-                                
-                                # Also log actual messages being sent in debug mode
-                                if messages_to_send:
-                                    message_summary = []
-                                    for msg in messages_to_send:
-                                        # Truncate long content for readability
-                                        content = msg.get('content', '')
-                                        if len(content) > 500:
-                                            content = content[:500] + "... [truncated]"
-                                        message_summary.append({
-                                            "role": msg.get('role'),
-                                            "content_length": len(msg.get('content', '')),
-                                            "content_preview": content
-                                        })
-                                    add_debug_info("Messages Being Sent", message_summary)
-                            
-                            # Make the actual request
-                            response = chat_api.make_request(
-                                messages=messages_to_send,
-                                model=st.session_state.current_model,
-                                temperature=temperature,
-                                max_tokens=max_tokens
-                            )
+                            defer_debug_info("API Request", lambda: {
+                                "model": multi_models if response_mode != "Single model" else st.session_state.current_model,
+                                "temperature": temperature,
+                                "max_tokens": max_tokens,
+                                "stream": True,
+                                "message_count": len(messages_to_send),
+                                "includes_crawled_data": bool(crawled_content),
+                                "system_prompt_length": len(enhanced_system_prompt) if enhanced_system_prompt else 0
+                            })
                             
-                            # Log response metadata in developer mode
-                            if st.session_state.developer_mode:
-                                response_meta = {
-                                    "status_code": response.status_code,
-                                    "headers": dict(response.headers),
-                                    "elapsed": str(response.elapsed)
-                                }
-                                add_debug_info("API Response Metadata", response_meta)
+                            # Also log actual messages being sent in debug mode
+                            def summarize_messages():
+                                message_summary = []
+                                for msg in messages_to_send:
+                                    # Truncate long content for readability
+                                    content = msg.get('content', '')
+                                    if len(content) > 500:
+                                        content = content[:500] + "... [truncated]"
+                                    message_summary.append({
+                                        "role": msg.get('role'),
+                                        "content_length": len(msg.get('content', '')),
+                                        "content_preview": content
+                                    })
+                                return message_summary
+                            defer_debug_info("Messages Being Sent", summarize_messages)
                             
-                            if response.status_code == 200:
-                                status.update(label="💭 Generating response...")
-                                
-                                # Process the streaming response
-                                token_count = 0
-                                start_time = time.time()
-                                
-                                for content in chat_api.process_stream(response):
-                                    full_response += content
-                                    message_placeholder.markdown(full_response + "▌")
-                                    token_count += 1
-                                    
-                                    # Update developer stats periodically
-                                    if st.session_state.developer_mode and token_count % 10 == 0:
-                                        elapsed = time.time() - start_time
-                                        tokens_per_second = token_count / elapsed if elapsed > 0 else 0
-                                        status.write(f"📊 Received {token_count} tokens at {tokens_per_second:.1f} tokens/sec")
-                                
-                                message_placeholder.markdown(full_response)
+                            if response_mode == "Compare":
+                                status.update(label="💭 Comparing models...")
+                                full_response = stream_comparison(chat_api, messages_to_send, multi_models,
+                                                                  temperature, max_tokens, message_placeholder)
                                 status.update(label="✨ Done!", state="complete")
+                                flush_debug_info()
                                 
-                                # Log final response stats in developer mode
                                 if st.session_state.developer_mode:
-                                    final_elapsed = time.time() - start_time
-                                    final_tokens_per_second = token_count / final_elapsed if final_elapsed > 0 else 0
-                                    
-                                    add_debug_info("Generation Stats", {
-                                        "total_tokens": token_count,
-                                        "generation_time": f"{final_elapsed:.2f} seconds",
-                                        "tokens_per_second": f"{final_tokens_per_second:.1f}",
-                                        "response_size": f"{len(full_response)} characters"
+                                    add_debug_info("Comparison Stats", {
+                                        model: {
+                                            "time_to_first_chunk": f"{stats['ttft']:.3f} seconds" if stats.get('ttft') else None,
+                                            "chunks": stats.get('chunks'),
+                                            "failed": stats.get('failed', True)
+                                        } for model, stats in chat_api.last_compare_stats.items()
                                     })
                                 
-                                # Only add to history if we actually got a response
                                 if full_response:
                                     chat_manager.add_message("assistant", full_response)
                                     st.session_state.messages = chat_manager.get_messages().copy()
                                 else:
-                                    message_placeholder.error("❌ Received empty response from API.")
+                                    message_placeholder.error("❌ Received empty responses from all models.")
                                     st.session_state.messages.pop()
-                                
-                            elif response.status_code == 401:
-                                message_placeholder.error("❌ Authentication error: Invalid API key.")
-                                if st.session_state.developer_mode:
-                                    add_debug_info("API Error", "Authentication error: Invalid API key", "error")
-                                st.session_state.messages.pop()
-                            elif response.status_code == 400:
-                                # Handle 400 Bad Request errors specifically
-                                error_text = response.text
-                                try:
-                                    error_json = response.json()
-                                    if "error" in error_json and "message" in error_json["error"]:
-                                        error_text = error_json["error"]["message"]
-                                except:
-                                    pass
-                                
-                                message_placeholder.error(f"❌ Bad Request: {error_text}")
-                                if st.session_state.developer_mode:
-                                    add_debug_info("API Error", f"Bad Request: {error_text}", "error")
-                                st.session_state.messages.pop()
                             else:
-                                message_placeholder.error(f"❌ Error: {response.text}")
-                                if st.session_state.developer_mode:
-                                    add_debug_info("API Error", response.text, "error")
-                                st.session_state.messages.pop()
+                                # Make the actual request. A race has no single response
+                                # until one of its models answers.
+                                if response_mode == "Race":
+                                    response = None
+                                    stream = chat_api.race(messages_to_send, multi_models,
+                                                           temperature=temperature, max_tokens=max_tokens)
+                                else:
+                                    response = chat_api.make_request(
+                                        messages=messages_to_send,
+                                        model=st.session_state.current_model,
+                                        temperature=temperature,
+                                        max_tokens=max_tokens
+                                    )
+                                    stream = chat_api.process_stream(response)
+                                    
+                                    # Log response metadata in developer mode
+                                    defer_debug_info("API Response Metadata", lambda: {
+                                        "status_code": response.status_code,
+                                        "headers": dict(response.headers),
+                                        "elapsed": str(response.elapsed)
+                                    })
+                                
+                                if response is None or response.status_code == 200:
+                                    from_cache = getattr(response, "from_cache", False)
+                                    status.update(label="⚡ Answering from cache..." if from_cache else "💭 Generating response...")
+                                    
+                                    # Process the streaming response. The API streams chunks, which
+                                    # may hold several tokens, so rates are reported per chunk.
+                                    chunk_count = 0
+                                    start_time = time.time()
+                                    
+                                    for content in stream:
+                                        full_response += content
+                                        message_placeholder.markdown(full_response + "▌")
+                                        chunk_count += 1
+                                        if chunk_count == 1:
+                                            flush_debug_info()
+                                        
+                                        # Update developer stats periodically
+                                        if st.session_state.developer_mode and chunk_count % 10 == 0:
+                                            elapsed = time.time() - start_time
+                                            chunks_per_second = chunk_count / elapsed if elapsed > 0 else 0
+                                            status.write(f"📊 Received {chunk_count} chunks at {chunks_per_second:.1f} chunks/sec")
+                                    
+                                    message_placeholder.markdown(full_response)
+                                    if response_mode == "Race" and chat_api.last_stream_stats.get('model'):
+                                        done_label = f"🏁 {chat_api.last_stream_stats['model'].split('/')[-1].replace(':free', '')} answered first"
+                                    else:
+                                        done_label = "⚡ Answered from cache" if from_cache else "✨ Done!"
+                                    status.update(label=done_label, state="complete")
+                                    flush_debug_info()
+                                    
+                                    # Log final response stats in developer mode
+                                    if st.session_state.developer_mode:
+                                        stream_stats = chat_api.last_stream_stats
+                                        final_elapsed = time.time() - start_time
+                                        generation_stats = {
+                                            "model": stream_stats.get('model'),
+                                            "chunks": chunk_count,
+                                            "cached": from_cache,
+                                            "time_to_first_chunk": f"{stream_stats['ttft']:.3f} seconds" if stream_stats.get('ttft') else None,
+                                            "generation_time": f"{final_elapsed:.2f} seconds",
+                                            "chunks_per_second": f"{chunk_count / final_elapsed if final_elapsed > 0 else 0:.1f}",
+                                            "response_size": f"{len(full_response)} characters"
+                                        }
+                                        if stream_stats.get('completion_tokens'):
+                                            generation_stats["completion_tokens"] = stream_stats['completion_tokens']
+                                            generation_stats["tokens_per_second"] = f"{stream_stats['completion_tokens'] / final_elapsed:.1f}"
+                                        add_debug_info("Generation Stats", generation_stats)
+                                    
+                                    # Only add to history if we actually got a response
+                                    if full_response:
+                                        chat_manager.add_message("assistant", full_response)
+                                        st.session_state.messages = chat_manager.get_messages().copy()
+                                    else:
+                                        message_placeholder.error("❌ Received empty response from API.")
+                                        st.session_state.messages.pop()
+                                    
+                                elif response.status_code == 401:
+                                    flush_debug_info()
+                                    message_placeholder.error("❌ Authentication error: Invalid API key.")
+                                    if st.session_state.developer_mode:
+                                        add_debug_info("API Error", "Authentication error: Invalid API key", "error")
+                                    st.session_state.messages.pop()
+                                elif response.status_code == 400:
+                                    # Handle 400 Bad Request errors specifically
+                                    error_text = response.text
+                                    try:
+                                        error_json = response.json()
+                                        if "error" in error_json and "message" in error_json["error"]:
+                                            error_text = error_json["error"]["message"]
+                                    except:
+                                        pass
+                                    
+                                    flush_debug_info()
+                                    message_placeholder.error(f"❌ Bad Request: {error_text}")
+                                    if st.session_state.developer_mode:
+                                        add_debug_info("API Error", f"Bad Request: {error_text}", "error")
+                                    st.session_state.messages.pop()
+                                else:
+                                    flush_debug_info()
+                                    message_placeholder.error(f"❌ Error: {response.text}")
+                                    if st.session_state.developer_mode:
+                                        add_debug_info("API Error", response.text, "error")
+                                    st.session_state.messages.pop()
                         
             except Exception as e:
                 st.error(f"❌ Error: {str(e)}")
+                flush_debug_info()
                 if st.session_state.developer_mode:
                     add_debug_info("Exception", str(e), "error")
                     import traceback
@@ -782,6 +1034,7 @@ st.sidebar.markdown("---")
 if st.session_state.crawled_data:
     if st.sidebar.button("🗑️ Clear Crawled Data", key="clear_data", use_container_width=True):
         st.session_state.crawled_data = []
+        st.session_state.boilerplate = {}
         st.rerun()
 
     st.sidebar.markdown("""
@@ -798,6 +1051,7 @@ if st.session_state.messages:
     st.sidebar.markdown("---")
     if st.sidebar.button("🗑️ Clear Chat History", key="clear_chat", use_container_width=True):
         st.session_state.messages = []
+        st.session_state.chat_window = CHAT_WINDOW
         
         # Mark that chat history was cleared so we can clear the ChatManager too
         st.session_state.chat_manager_cleared = True
@@ -808,31 +1062,23 @@ if st.session_state.messages:
         st.rerun()
 
     st.sidebar.markdown("### 💾 Export Chat History")
-    
-    # JSON export
-    json_data = json.dumps(st.session_state.messages, indent=2)
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    json_filename = f"chat_session_{timestamp}.json"
-    json_link = generate_download_link(json_data, json_filename, "Download as JSON")
-    st.sidebar.markdown(json_link, unsafe_allow_html=True)
-    
-    # Text export
-    text_content = f"Chat Session\nDate: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
-    for msg in st.session_state.messages:
-        role = "User" if msg["role"] == "user" else "AI"
-        text_content += f"{role}: {msg['content']}\n\n"
-    
-    text_filename = f"chat_session_{timestamp}.txt"
-    text_link = generate_download_link(text_content, text_filename, "Download as Text")
-    st.sidebar.markdown(text_link, unsafe_allow_html=True)
+    # Keyed on the contents: the length repeats once history is capped, or cleared and refilled
+    export_panel("chat", "chat_session", EXPORT_FORMATS,
+                 lambda fmt: chat_export(st.session_state.messages, fmt),
+                 version=context_hash(st.session_state.messages))
 
 # Export debug info (only shown in developer mode)
 if st.session_state.developer_mode and st.session_state.debug_info:
     st.sidebar.markdown("---")
     st.sidebar.markdown("### 🔍 Export Debug Info")
-    
-    debug_json = json.dumps(st.session_state.debug_info, indent=2)
-    debug_timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    debug_filename = f"debug_info_{debug_timestamp}.json"
-    debug_link = generate_download_link(debug_json, debug_filename, "Download Debug Log")
-    st.sidebar.markdown(debug_link, unsafe_allow_html=True)
+    export_panel("debug", "debug_info", EXPORT_FORMATS,
+                 lambda fmt: debug_export(st.session_state.debug_info.records(), fmt),
+                 version=st.session_state.debug_info.recorded)
+
+# Export performance metrics (only shown in developer mode)
+if st.session_state.developer_mode:
+    st.sidebar.markdown("---")
+    st.sidebar.markdown("### 📈 Performance Metrics")
+    # Prepared on request, so the download holds the metrics as of the last click
+    export_panel("metrics", "metrics", {"prom": "Prometheus text", "json": "JSON"},
+                 lambda fmt: [REGISTRY.to_prometheus() if fmt == "prom" else REGISTRY.to_json()])
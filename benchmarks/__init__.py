@@ -0,0 +1 @@
+"""Benchmarks for the crawler, chat client and context preparation."""
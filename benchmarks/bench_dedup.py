@@ -0,0 +1,75 @@
+"""
+Benchmark near-duplicate and boilerplate removal throughput.
+
+Generates a synthetic crawl of N pages that share a header, navigation and
+footer, with a fraction of printer-friendly near-copies, then times
+``ContentDeduplicator.process`` over it.
+
+    python benchmarks/bench_dedup.py --pages 10000
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from dataclasses import dataclass
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.dedup import ContentDeduplicator
+
+WORDS = [f"word{i}" for i in range(5000)]
+
+@dataclass
+class Page:
+    url: str
+    content: str
+
+def make_pages(count: int, duplicate_ratio: float, blocks_per_page: int, seed: int = 0) -> list:
+    """Build synthetic pages with shared boilerplate and some near-duplicates"""
+    rng = random.Random(seed)
+    header = "Home Products Docs Blog Pricing Contact"
+    navigation = "Getting started Installation Configuration API reference FAQ"
+    footer = "Copyright 2024 Example Corp. All rights reserved. Privacy Terms Cookies"
+
+    pages = []
+    for i in range(count):
+        if pages and rng.random() < duplicate_ratio:
+            # Printer-friendly copy: same body, one extra line
+            original = rng.choice(pages)
+            pages.append(Page(f"https://example.com/print/{i}", original.content + "\nPrinted version"))
+            continue
+        body = [' '.join(rng.choices(WORDS, k=40)) for _ in range(blocks_per_page)]
+        pages.append(Page(f"https://example.com/page/{i}", '\n'.join([header, navigation, *body, footer])))
+    return pages
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--pages', type=int, default=10000)
+    parser.add_argument('--duplicate-ratio', type=float, default=0.1)
+    parser.add_argument('--blocks', type=int, default=20, help="Unique content blocks per page")
+    args = parser.parse_args()
+
+    pages = make_pages(args.pages, args.duplicate_ratio, args.blocks)
+    total_bytes = sum(len(page.content.encode('utf-8')) for page in pages)
+
+    deduplicator = ContentDeduplicator()
+    start = time.perf_counter()
+    unique = deduplicator.process(pages)
+    elapsed = time.perf_counter() - start
+
+    print(json.dumps({
+        "benchmark": "dedup",
+        "pages": args.pages,
+        "unique_pages": len(unique),
+        "duplicates": deduplicator.stats['duplicates'],
+        "boilerplate_blocks": deduplicator.stats['boilerplate_blocks'],
+        "seconds": round(elapsed, 3),
+        "pages_per_second": round(args.pages / elapsed, 1),
+        "mb_per_second": round(total_bytes / elapsed / 1e6, 2)
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,775 @@
+"""
+End-to-end benchmark suite.
+
+Drives AsyncWebCrawler, ChatAPI.process_stream, ChatManager and
+prepare_crawled_content against local stand-ins (see servers.py) and
+reports throughput, latency percentiles and peak memory.
+
+    python -m benchmarks.run                                # every benchmark
+    python -m benchmarks.run crawl chat --pages 500
+    python -m benchmarks.run --output benchmarks/results/baseline.json
+    python -m benchmarks.run --compare benchmarks/results/baseline.json
+"""
+
+import argparse
+import ast
+import asyncio
+import datetime
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+import aiohttp
+import requests
+
+from benchmarks.servers import BenchmarkServer, ChatConfig, SiteConfig
+from src.chat import ChatAPI, ChatManager, KeepAliveSession, RateLimiter
+from src.context import ReferenceContent, prepare_crawled_content
+from src.crawler import AsyncWebCrawler
+from src.linkfilter import DEFAULT_LINK_RULES
+from src.metrics import REGISTRY, http_trace_config
+from src.throttle import HostThrottle
+from src.transport import accept_encoding
+
+MODEL = "bench/fast-model:free"
+BENCHMARKS: Dict[str, Callable[[argparse.Namespace, BenchmarkServer], Dict[str, Any]]] = {}
+
+def benchmark(name: str) -> Callable:
+    def register(func: Callable) -> Callable:
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+def percentiles(values: List[float], prefix: str) -> Dict[str, Optional[float]]:
+    """p50/p90/p99 and max of a sample, in milliseconds"""
+    if not values:
+        return {f"{prefix}_p50_ms": None, f"{prefix}_p90_ms": None, f"{prefix}_p99_ms": None, f"{prefix}_max_ms": None}
+    ordered = sorted(values)
+
+    def pick(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+
+    return {
+        f"{prefix}_p50_ms": pick(0.50),
+        f"{prefix}_p90_ms": pick(0.90),
+        f"{prefix}_p99_ms": pick(0.99),
+        f"{prefix}_max_ms": round(ordered[-1] * 1000, 3)
+    }
+
+def counter_total(name: str) -> float:
+    """Sum of a registry counter over all its labels"""
+    return sum(value for _, _, value in REGISTRY.counter(name).samples())
+
+class Measurement:
+    """Wall time and peak traced Python memory of a with-block"""
+
+    def __init__(self, trace_memory: bool = True):
+        self.trace_memory = trace_memory
+        self.seconds = 0.0
+        self.peak_mb: Optional[float] = None
+
+    def __enter__(self) -> 'Measurement':
+        if self.trace_memory:
+            tracemalloc.start()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.seconds = time.perf_counter() - self.start
+        if self.trace_memory:
+            self.peak_mb = round(tracemalloc.get_traced_memory()[1] / 1e6, 3)
+            tracemalloc.stop()
+
+class NullStatus:
+    """Accepts the status and progress calls the crawler makes on Streamlit elements"""
+
+    def write(self, *args: Any) -> None:
+        pass
+
+    def progress(self, *args: Any) -> None:
+        pass
+
+    def empty(self) -> None:
+        pass
+
+class TimedCrawler(AsyncWebCrawler):
+    """Crawler that records the latency of every page fetch"""
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.latencies: List[float] = []
+
+    async def crawl_page(self, url: str, session: aiohttp.ClientSession, timeout: int = 30) -> Dict[str, Any]:
+        start = time.perf_counter()
+        try:
+            return await super().crawl_page(url, session, timeout)
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+def make_chat_api(server: BenchmarkServer, session: Optional[requests.Session] = None,
+                  http2: bool = False) -> ChatAPI:
+    api = ChatAPI(server.api_base_url, "benchmark-key", session=session, http2=http2)
+    api.rate_limiter = RateLimiter(max_requests=10 ** 9)  # The fake API has no quota
+    return api
+
+@benchmark("crawl")
+def bench_crawl(args: argparse.Namespace, server: BenchmarkServer) -> Dict[str, Any]:
+    crawler = TimedCrawler(max_depth=args.depth, max_pages=args.pages, chunk_size=args.chunk_size)
+    status = NullStatus()
+
+    async def crawl() -> None:
+        async with aiohttp.ClientSession(trace_configs=[http_trace_config()]) as session:
+            await crawler.run([server.site_url], session, status, status)
+
+    REGISTRY.reset()
+    with Measurement(args.memory) as measurement:
+        asyncio.run(crawl())
+    return {
+        "pages_found": len(crawler.results),
+        "pages_processed": crawler.processed,
+        "fetches": len(crawler.latencies),
+        "seconds": round(measurement.seconds, 3),
+        "pages_per_second": round(len(crawler.results) / measurement.seconds, 2),
+        "megabytes_fetched": round(REGISTRY.counter("crawler_bytes_total").get() / 1e6, 3),
+        "content_megachars": round(sum(len(result.text) for result in crawler.results) / 1e6, 3),
+        "content_compressed_mb": round(sum(result.text.compressed_size for result in crawler.results) / 1e6, 3),
+        **percentiles(crawler.latencies, "fetch"),
+        "peak_memory_mb": measurement.peak_mb
+    }
+
+@benchmark("link_filter")
+def bench_link_filter(args: argparse.Namespace, server: BenchmarkServer) -> Dict[str, Any]:
+    """Fetches spent on a site with file links, tracking-parameter duplicates and a calendar, with and without link rules"""
+    import dataclasses
+
+    site = dataclasses.replace(server.site, trap_rate=args.trap_rate or 0.5)
+    status = NullStatus()
+    results: Dict[str, Any] = {"trap_rate": site.trap_rate}
+    with BenchmarkServer(site, server.chat) as trap_server:
+        for name, rules in (("rules", DEFAULT_LINK_RULES), ("no_rules", None)):
+            crawler = TimedCrawler(max_depth=args.depth, max_pages=args.pages, chunk_size=args.chunk_size,
+                                   link_rules=rules)
+
+            async def crawl() -> None:
+                async with aiohttp.ClientSession() as session:
+                    await crawler.run([trap_server.site_url], session, status, status)
+
+            REGISTRY.reset()
+            start = time.perf_counter()
+            asyncio.run(crawl())
+            seconds = time.perf_counter() - start
+            synthetic_pages = sum(1 for result in crawler.results if "/page/" in result.url)
+            results[f"{name}_fetches"] = len(crawler.latencies)
+            results[f"{name}_site_pages_found"] = synthetic_pages
+            results[f"{name}_fetches_per_site_page"] = round(len(crawler.latencies) / max(synthetic_pages, 1), 2)
+            results[f"{name}_seconds"] = round(seconds, 3)
+            results[f"{name}_megabytes_fetched"] = round(REGISTRY.counter("crawler_bytes_total").get() / 1e6, 3)
+            if rules is not None:
+                links = REGISTRY.counter("crawler_links_total")
+                results["links_skipped"] = {reason: links.get(result=reason) for reason in
+                                            ("extension", "excluded", "not_included", "query_params", "prefix_cap")}
+    return results
+
+@benchmark("compression")
+def bench_compression(args: argparse.Namespace, server: BenchmarkServer) -> Dict[str, Any]:
+    """Crawl the site served uncompressed and gzip-compressed, comparing bytes on the wire"""
+    import dataclasses
+
+    status = NullStatus()
+    results: Dict[str, Any] = {"accept_encoding": accept_encoding("aiohttp")}
+    for coding in ("identity", "gzip"):
+        site = dataclasses.replace(server.site, compression="" if coding == "identity" else coding)
+        with BenchmarkServer(site, server.chat) as coded_server:
+            crawler = TimedCrawler(max_depth=args.depth, max_pages=args.pages, chunk_size=args.chunk_size)
+
+            async def crawl() -> None:
+                async with aiohttp.ClientSession() as session:
+                    await crawler.run([coded_server.site_url], session, status, status)
+
+            REGISTRY.reset()
+            start = time.perf_counter()
+            asyncio.run(crawl())
+            seconds = time.perf_counter() - start
+        results[f"{coding}_pages_found"] = len(crawler.results)
+        results[f"{coding}_seconds"] = round(seconds, 3)
+        results[f"{coding}_wire_megabytes"] = round(counter_total("crawler_wire_bytes_total") / 1e6, 3)
+        results[f"{coding}_decoded_megabytes"] = round(REGISTRY.counter("crawler_bytes_total").get() / 1e6, 3)
+    return results
+
+@benchmark("charset")
+def bench_charset(args: argparse.Namespace, server: BenchmarkServer) -> Dict[str, Any]:
+    """Crawl the site with and without a charset in its Content-Type header; both should find every page"""
+    import dataclasses
+
+    status = NullStatus()
+    results: Dict[str, Any] = {}
+    for name, charset in (("declared", "utf-8"), ("undeclared", "")):
+        with BenchmarkServer(dataclasses.replace(server.site, charset=charset), server.chat) as charset_server:
+            crawler = TimedCrawler(max_depth=args.depth, max_pages=args.pages, chunk_size=args.chunk_size)
+
+            async def crawl() -> None:
+                async with aiohttp.ClientSession() as session:
+                    await crawler.run([charset_server.site_url], session, status, status)
+
+            REGISTRY.reset()
+            start = time.perf_counter()
+            asyncio.run(crawl())
+            results[f"{name}_seconds"] = round(time.perf_counter() - start, 3)
+        results[f"{name}_pages_found"] = len(crawler.results)
+        results[f"{name}_fetch_errors"] = REGISTRY.counter("crawler_pages_total").get(status="error")
+    return results
+
+@benchmark("adaptive")
+def bench_adaptive(args: argparse.Namespace, server: BenchmarkServer) -> Dict[str, Any]:
+    """Crawl a site that slows down past its capacity and sheds load past twice that, fixed vs adaptive concurrency"""
+    import dataclasses
+
+    site = dataclasses.replace(server.site, capacity=args.capacity or 8)
+    status = NullStatus()
+    results: Dict[str, Any] = {"capacity": site.capacity}
+    with BenchmarkServer(site, server.chat) as limited_server:
+        for name, adaptive in (("fixed", False), ("adaptive", True)):
+            throttle = HostThrottle(max_concurrency=max(args.chunk_size, 64) if adaptive else args.chunk_size,
+                                    adaptive=adaptive, initial_concurrency=args.chunk_size)
+            crawler = TimedCrawler(max_depth=args.depth, max_pages=args.pages, chunk_size=args.chunk_size,
+                                   throttle=throttle)
+
+            async def crawl() -> None:
+                async with aiohttp.ClientSession() as session:
+                    await crawler.run([limited_server.site_url], session, status, status)
+
+            REGISTRY.reset()
+            start = time.perf_counter()
+            asyncio.run(crawl())
+            seconds = time.perf_counter() - start
+            pages = REGISTRY.counter("crawler_pages_total")
+            results[f"{name}_pages_found"] = len(crawler.results)
+            results[f"{name}_fetches"] = len(crawler.latencies)
+            results[f"{name}_shed"] = pages.get(status=503)
+            results[f"{name}_seconds"] = round(seconds, 3)
+            results[f"{name}_pages_per_second"] = round(len(crawler.results) / seconds, 2)
+            results.update(percentiles(crawler.latencies, f"{name}_fetch"))
+            if adaptive:
+                results["adaptive_final_limit"] = throttle.concurrency(urlparse(limited_server.site_url).netloc)
+    return results
+
+@benchmark("checkpoint")
+def bench_checkpoint(args: argparse.Namespace, server: BenchmarkServer) -> Dict[str, Any]:
+    """Crawl time with and without checkpoints, and the fetches a resumed crawl saves after an interruption"""
+    import tempfile
+    from src.checkpoint import CrawlCheckpoint
+
+    status = NullStatus()
+    host = urlparse(server.site_url).netloc
+    results: Dict[str, Any] = {}
+
+    async def crawl(crawler: TimedCrawler, checkpoint: Any = None, stop_at: Optional[int] = None) -> None:
+        async with aiohttp.ClientSession() as session:
+            task = asyncio.ensure_future(crawler.run([server.site_url], session, status, status, checkpoint=checkpoint))
+            if stop_at is not None:
+                while not task.done() and len(crawler.results) < stop_at:
+                    await asyncio.sleep(0.01)
+                task.cancel()  # Interrupted, as by a restart
+            await asyncio.gather(task, return_exceptions=True)
+
+    REGISTRY.reset()
+    with tempfile.TemporaryDirectory() as directory:
+        store = CrawlCheckpoint(os.path.join(directory, "crawls.sqlite"))
+        for name, checkpoint in (("plain", None), ("checkpointed", store.site("full", host))):
+            crawler = TimedCrawler(max_depth=args.depth, max_pages=args.pages, chunk_size=args.chunk_size)
+            start = time.perf_counter()
+            asyncio.run(crawl(crawler, checkpoint))
+            results[f"{name}_seconds"] = round(time.perf_counter() - start, 3)
+            results[f"{name}_pages_found"] = len(crawler.results)
+        writes = REGISTRY.histogram("crawl_checkpoint_seconds")
+        results["checkpoint_writes"] = sum(value for name, _, value in writes.samples() if name.endswith("_count"))
+        results["checkpoint_write_p50_ms"] = round(writes.percentile(50) * 1000, 3)
+        results["checkpoint_write_p99_ms"] = round(writes.percentile(99) * 1000, 3)
+
+        first = TimedCrawler(max_depth=args.depth, max_pages=args.pages, chunk_size=args.chunk_size)
+        asyncio.run(crawl(first, store.site("interrupted", host), stop_at=args.pages // 2))
+        resumed = TimedCrawler(max_depth=args.depth, max_pages=args.pages, chunk_size=args.chunk_size)
+        start = time.perf_counter()
+        asyncio.run(crawl(resumed, store.site("interrupted", host)))
+        results["resumed_seconds"] = round(time.perf_counter() - start, 3)
+        results["resumed_pages_found"] = len(resumed.results)
+        results["fetches_before_interruption"] = len(first.latencies)
+        results["fetches_after_resume"] = len(resumed.latencies)
+        results["file_mb"] = round(sum(os.path.getsize(os.path.join(directory, name))
+                                       for name in os.listdir(directory)) / 1e6, 2)  # With the WAL
+    return results
+
+@benchmark("chat")
+def bench_chat(args: argparse.Namespace, server: BenchmarkServer) -> Dict[str, Any]:
+    api = make_chat_api(server, http2=args.http2)
+    messages = [{"role": "user", "content": "Summarize the crawled site."}]
+    opened_before, received_before = counter_total("chat_connections_total"), counter_total("chat_wire_bytes_total")
+
+    def one_request(_: int) -> Dict[str, float]:
+        start = time.perf_counter()
+        response = api.make_request(messages=messages, model=MODEL)
+        chunks = 0
+        first = None
+        for _ in api.process_stream(response):
+            if first is None:
+                first = time.perf_counter() - start
+            chunks += 1
+        return {"ttft": first or 0.0, "total": time.perf_counter() - start, "chunks": chunks}
+
+    with Measurement(args.memory) as measurement:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            runs = list(pool.map(one_request, range(args.requests)))
+    total_chunks = sum(run["chunks"] for run in runs)
+    return {
+        "requests": len(runs),
+        "concurrency": args.concurrency,
+        "seconds": round(measurement.seconds, 3),
+        "requests_per_second": round(len(runs) / measurement.seconds, 2),
+        "chunks_per_second": round(total_chunks / measurement.seconds, 1),
+        "session": type(api.session).__name__,
+        "connections_opened": counter_total("chat_connections_total") - opened_before,
+        "wire_kilobytes": round((counter_total("chat_wire_bytes_total") - received_before) / 1e3, 1),
+        **percentiles([run["ttft"] for run in runs], "ttft"),
+        **percentiles([run["total"] for run in runs], "total"),
+        "peak_memory_mb": measurement.peak_mb
+    }
+
+@benchmark("chat_ttfb")
+def bench_chat_ttfb(args: argparse.Namespace, server: BenchmarkServer) -> Dict[str, Any]:
+    """Sequential prompts over a new connection each time versus a kept-warm one"""
+    messages = [{"role": "user", "content": "Hello"}]
+
+    def prompt(api: ChatAPI) -> Dict[str, float]:
+        response = api.make_request(messages=messages, model=MODEL)
+        for _ in api.process_stream(response):
+            pass
+        return {"ttfb": response.elapsed.total_seconds(), "ttft": api.last_stream_stats['ttft'] or 0.0}
+
+    cold = []
+    for _ in range(args.requests):
+        cold.append(prompt(make_chat_api(server, requests.Session())))
+
+    connection = KeepAliveSession(server.api_base_url, interval=1.0)
+    connection.start()
+    connection.thread.join(0.5)
+    try:
+        warm = [prompt(make_chat_api(server, connection.session)) for _ in range(args.requests)]
+    finally:
+        connection.stop()
+
+    return {
+        "requests": args.requests,
+        **percentiles([run["ttfb"] for run in cold], "cold_ttfb"),
+        **percentiles([run["ttfb"] for run in warm], "warm_ttfb"),
+        **percentiles([run["ttft"] for run in cold], "cold_ttft"),
+        **percentiles([run["ttft"] for run in warm], "warm_ttft")
+    }
+
+@benchmark("chat_manager")
+def bench_chat_manager(args: argparse.Namespace, server: BenchmarkServer) -> Dict[str, Any]:
+    manager = ChatManager(make_chat_api(server))
+    turn_latencies: List[float] = []
+
+    async def converse() -> None:
+        for turn in range(args.turns):
+            start = time.perf_counter()
+            async for _ in manager.process_message(f"Question {turn} about the documentation", MODEL):
+                pass
+            turn_latencies.append(time.perf_counter() - start)
+
+    with Measurement(args.memory) as measurement:
+        asyncio.run(converse())
+    return {
+        "turns": args.turns,
+        "history_messages": len(manager.messages),
+        "seconds": round(measurement.seconds, 3),
+        **percentiles(turn_latencies, "turn"),
+        "peak_memory_mb": measurement.peak_mb
+    }
+
+@benchmark("context")
+def bench_context(args: argparse.Namespace, server: BenchmarkServer) -> Dict[str, Any]:
+    documents = [{
+        'url': f"https://example.com/page/{i}",
+        'title': f"Page {i}",
+        'content': (f"Document {i} " + "lorem ipsum dolor sit amet " * 40) * (args.doc_kb * 1000 // 1080 + 1)
+    } for i in range(args.docs)]
+    latencies = []
+    with Measurement(args.memory) as measurement:
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            prepare_crawled_content(documents)
+            latencies.append(time.perf_counter() - start)
+
+    # What the chat path pays per prompt now that the block is only rebuilt on change
+    reference = ReferenceContent()
+    reference.update(documents)
+    cached_latencies = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        reference.update(documents)
+        cached_latencies.append(time.perf_counter() - start)
+    return {
+        "documents": args.docs,
+        "calls": args.repeat,
+        "calls_per_second": round(args.repeat / measurement.seconds, 1),
+        **percentiles(latencies, "call"),
+        **percentiles(cached_latencies, "cached_call"),
+        "peak_memory_mb": measurement.peak_mb
+    }
+
+@benchmark("dedup")
+def bench_dedup(args: argparse.Namespace, server: BenchmarkServer) -> Dict[str, Any]:
+    from benchmarks.bench_dedup import make_pages
+    from src.dedup import ContentDeduplicator
+
+    pages = make_pages(args.dedup_pages, duplicate_ratio=0.1, blocks_per_page=20)
+    deduplicator = ContentDeduplicator()
+    with Measurement(args.memory) as measurement:
+        unique = deduplicator.process(pages)
+    return {
+        "pages": len(pages),
+        "unique_pages": len(unique),
+        "seconds": round(measurement.seconds, 3),
+        "pages_per_second": round(len(pages) / measurement.seconds, 1),
+        "peak_memory_mb": measurement.peak_mb
+    }
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def import_times(statement: str) -> Dict[str, float]:
+    """Cumulative import time in ms of every module a statement imports, from a fresh interpreter"""
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                             cwd=ROOT, capture_output=True, text=True, check=True)
+    times = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative) / 1000
+    return times
+
+def app_import_statement() -> str:
+    """app.py's module-level imports as one statement"""
+    with open(os.path.join(ROOT, "app.py"), encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    return "; ".join(ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+@benchmark("startup")
+def bench_startup(args: argparse.Namespace, server: BenchmarkServer) -> Dict[str, Any]:
+    """Cold import time of the package and app, and how long each Streamlit rerun of app.py takes"""
+    from streamlit.testing.v1 import AppTest
+
+    results: Dict[str, Any] = {}
+    for module in ("src", "src.context", "src.chat", "src.crawler", "src.jobs"):
+        results[f"import_{module.replace('.', '_')}_ms"] = round(import_times(f"import {module}")[module], 3)
+    interpreter = import_times("pass")  # Imported at interpreter startup, before app.py runs
+    app_times = import_times(app_import_statement())
+    top_level = {name: ms for name, ms in app_times.items() if '.' not in name and name not in interpreter}
+    results["import_app_ms"] = round(sum(top_level.values()), 3)
+    slowest = sorted(top_level.items(), key=lambda item: -item[1])[:5]
+    results["slowest_app_imports_ms"] = {name: round(ms, 1) for name, ms in slowest}
+
+    app = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=60)
+    with Measurement(trace_memory=False) as first:
+        app.run()
+    rerun_times = []
+    for _ in range(args.reruns):
+        start = time.perf_counter()
+        app.run()
+        rerun_times.append(time.perf_counter() - start)
+    results["first_run_ms"] = round(first.seconds * 1000, 3)
+    results.update(percentiles(rerun_times, "rerun"))
+    return results
+
+@benchmark("dns")
+def bench_dns(args: argparse.Namespace, server: BenchmarkServer) -> Dict[str, Any]:
+    """Host lookup latency through aiohttp's threaded resolver and through the crawler's caching resolver"""
+    from aiohttp.resolver import ThreadedResolver
+    from src.resolver import CachingResolver, DNSCache
+
+    async def lookups(resolver: Any) -> List[float]:
+        latencies = []
+        for _ in range(args.dns_lookups):
+            start = time.perf_counter()
+            await resolver.resolve("localhost", 80, 0)
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    async def run() -> Dict[str, Any]:
+        results: Dict[str, Any] = {}
+        results.update(percentiles(await lookups(ThreadedResolver()), "threaded"))
+        # A new resolver per crawl, sharing the process-wide cache as crawl jobs do
+        cache = DNSCache()
+        latencies = []
+        for _ in range(args.dns_lookups // 10 or 1):
+            latencies.extend(await lookups(CachingResolver(cache=cache, allow_private=True)))
+        results.update(percentiles(latencies, "cached"))
+        return results
+
+    return asyncio.run(run())
+
+@benchmark("chat_history")
+def bench_chat_history(args: argparse.Namespace, server: BenchmarkServer) -> Dict[str, Any]:
+    """Streamlit rerun latency of app.py as the chat history grows, windowed and fully shown"""
+    from streamlit.testing.v1 import AppTest
+
+    content = "Some **markdown** with `code` and a list:\n\n" + "- an item of a long answer\n" * 100
+    results: Dict[str, Any] = {}
+    app = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=60)
+    app.run()
+    default_window = app.session_state.chat_window
+    for count in args.history_messages:
+        messages = [{"role": "user" if i % 2 == 0 else "assistant", "content": f"Message {i}\n\n{content}"}
+                    for i in range(count)]
+        for mode, window in (("windowed", default_window), ("full", count)):
+            app.session_state.messages = messages
+            app.session_state.chat_window = window
+            app.run()
+            rerun_times = []
+            for _ in range(args.reruns):
+                start = time.perf_counter()
+                app.run()
+                rerun_times.append(time.perf_counter() - start)
+            results[f"{mode}_{count}_rerun_p50_ms"] = percentiles(rerun_times, "rerun")["rerun_p50_ms"]
+    return results
+
+@benchmark("rate_limit")
+def bench_rate_limit(args: argparse.Namespace, server: BenchmarkServer) -> Dict[str, Any]:
+    """Slot latency per limiter backend, and how many slots separate limiters hand out together"""
+    import tempfile
+    from src.ratelimit import create_backend
+
+    results: Dict[str, Any] = {}
+    with tempfile.TemporaryDirectory() as directory:
+        urls = {"memory": "memory", "sqlite": f"sqlite:///{directory}/limits.db", "redis": server.redis_url}
+        for name, url in urls.items():
+            limiter = RateLimiter(max_requests=10 ** 9, backend=create_backend(url), key=f"latency-{time.time()}")
+            latencies = []
+            for _ in range(args.limiter_calls):
+                start = time.perf_counter()
+                limiter.check_limit()
+                latencies.append(time.perf_counter() - start)
+            results.update(percentiles(latencies, f"{name}_acquire"))
+
+            # Limiters with their own backend instance stand in for separate processes or replicas
+            limit, key = 50, f"shared-{time.time()}"
+            limiters = [RateLimiter(max_requests=limit, backend=create_backend(url), key=key) for _ in range(4)]
+            with ThreadPoolExecutor(max_workers=len(limiters)) as pool:
+                granted = sum(pool.map(lambda limiter: sum(limiter.check_limit() for _ in range(limit)), limiters))
+            results[f"{name}_granted_of_{limit}"] = granted
+    return results
+
+@benchmark("corpus")
+def bench_corpus(args: argparse.Namespace, server: BenchmarkServer) -> Dict[str, Any]:
+    """Saving a corpus snapshot, opening it in a fresh process, and searching it against an in-memory index"""
+    import random
+    import tempfile
+    from src.corpus import Corpus, save_corpus
+    from src.retrieval import RetrievalIndex
+
+    rng = random.Random(0)
+    vocabulary = [f"term{i}" for i in range(5000)]
+    documents = [{
+        'url': f"https://example.com/page/{i}",
+        'title': f"Page {i}",
+        'content': " ".join(rng.choice(vocabulary) for _ in range(rng.randint(100, 600)))
+    } for i in range(args.corpus_docs)]
+    queries = [" ".join(rng.sample(vocabulary, 3)) for _ in range(200)]
+    results: Dict[str, Any] = {"documents": args.corpus_docs}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.corpus")
+        start = time.perf_counter()
+        index = RetrievalIndex(documents)
+        results["index_build_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        start = time.perf_counter()
+        results["file_mb"] = round(save_corpus(path, documents, index) / 1e6, 2)
+        results["save_ms"] = round((time.perf_counter() - start) * 1000, 3)
+
+        # Another app instance: a new process maps the file and lists the documents
+        process = subprocess.run([sys.executable, "-m", "src.corpus", "info", path],
+                                 cwd=ROOT, capture_output=True, text=True, check=True)
+        results["open_in_new_process_ms"] = json.loads(process.stdout)["open_ms"]
+
+        with Corpus(path) as corpus:
+            mapped = corpus.index
+            for name, searched in (("memory", index), ("mapped", mapped)):
+                latencies = []
+                for query in queries:
+                    start = time.perf_counter()
+                    searched.context_documents(query)
+                    latencies.append(time.perf_counter() - start)
+                results.update(percentiles(latencies, f"{name}_search"))
+            del mapped
+    return results
+
+@benchmark("server")
+def bench_server(args: argparse.Namespace, server: BenchmarkServer) -> Dict[str, Any]:
+    """Many clients streaming chat from the API server at once, while one of them crawls the site through it"""
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    env = dict(os.environ, OPENROUTER_API_KEY="benchmark-key", API_SERVER_TOKEN="")
+    command = [sys.executable, "-m", "src.server", "--port", str(port), "--base-url", server.api_base_url,
+               "--allow-private", "--max-pages", str(args.pages), "--requests-per-minute", str(10 ** 9)]
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+
+    async def chat(session: aiohttp.ClientSession, client: int) -> Dict[str, float]:
+        start = time.perf_counter()
+        first = None
+        events = 0
+        async with session.post(f"{base}/chat", headers={'X-Client-ID': f"client-{client}"},
+                                json={"model": MODEL, "prompt": "Summarize the crawled site."}) as response:
+            async for line in response.content:
+                if line.startswith(b"event: error"):
+                    raise RuntimeError("Chat failed")
+                if line.startswith(b"data:"):
+                    first = first or time.perf_counter() - start
+                    events += 1
+        return {"ttft": first or 0.0, "total": time.perf_counter() - start, "events": events}
+
+    async def crawl(session: aiohttp.ClientSession) -> float:
+        start = time.perf_counter()
+        headers = {'X-Client-ID': "crawler"}
+        async with session.post(f"{base}/crawl", headers=headers,
+                                json={"seeds": [server.site_url], "max_depth": args.depth, "max_pages": args.pages}) as response:
+            job_id = (await response.json())["job_id"]
+        while True:
+            async with session.get(f"{base}/crawl/{job_id}", headers=headers) as response:
+                if (await response.json())["state"] not in ("queued", "running"):
+                    break
+            await asyncio.sleep(0.05)
+        async with session.post(f"{base}/crawl/{job_id}/collect", headers=headers) as response:
+            await response.read()
+        return time.perf_counter() - start
+
+    async def run() -> Dict[str, Any]:
+        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0)) as session:
+            for _ in range(100):
+                try:
+                    async with session.get(f"{base}/health"):
+                        break
+                except aiohttp.ClientConnectionError:
+                    await asyncio.sleep(0.1)
+            start = time.perf_counter()
+            crawl_task = asyncio.ensure_future(crawl(session))
+            runs = await asyncio.gather(*(chat(session, client) for client in range(args.clients)),
+                                        return_exceptions=True)
+            chats_seconds = time.perf_counter() - start
+            crawl_seconds = await crawl_task
+            async with session.get(f"{base}/documents", headers={'X-Client-ID': "crawler"}) as response:
+                documents = len(await response.json())
+            answered = [run for run in runs if isinstance(run, dict)]
+            return {
+                "clients": args.clients,
+                "failed": len(runs) - len(answered),
+                "chats_per_second": round(len(answered) / chats_seconds, 1),
+                "crawl_seconds": round(crawl_seconds, 3),
+                "pages_collected": documents,
+                **percentiles([run["ttft"] for run in answered], "ttft"),
+                **percentiles([run["total"] for run in answered], "total")
+            }
+
+    try:
+        return asyncio.run(run())
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+def compare(results: Dict[str, Dict[str, Any]], baseline_path: str) -> None:
+    """Print the relative change of every numeric metric against a saved run"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    print(f"\nChange against {baseline_path}:")
+    for name, metrics in results.items():
+        for key, value in metrics.items():
+            old = baseline.get(name, {}).get(key)
+            if isinstance(value, (int, float)) and isinstance(old, (int, float)) and old:
+                print(f"  {name}.{key}: {old} -> {value} ({(value - old) / old * 100:+.1f}%)")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n\n')[0])
+    parser.add_argument('benchmarks', nargs='*', metavar='benchmark',
+                        help=f"Benchmarks to run: {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument('--output', default=os.path.join("benchmarks", "results", "latest.json"))
+    parser.add_argument('--compare', help="Saved results to compare against")
+    parser.add_argument('--no-memory', dest='memory', action='store_false',
+                        help="Skip tracemalloc, which slows the measured code")
+    site = parser.add_argument_group("synthetic site")
+    site.add_argument('--pages', type=int, default=200)
+    site.add_argument('--fanout', type=int, default=5)
+    site.add_argument('--page-bytes', type=int, default=8000)
+    site.add_argument('--latency', type=float, default=0.02)
+    site.add_argument('--error-rate', type=float, default=0.0)
+    site.add_argument('--spa-rate', type=float, default=0.0, help="Fraction of client-rendered pages")
+    site.add_argument('--trap-rate', type=float, default=0.0,
+                      help="Fraction of pages linking to files and crawler traps (link_filter uses 0.5 if unset)")
+    site.add_argument('--capacity', type=int, default=0,
+                      help="Concurrent requests the site serves at full speed (0: unlimited; adaptive defaults to 8)")
+    site.add_argument('--depth', type=int, default=5)
+    site.add_argument('--chunk-size', type=int, default=20)
+    chat = parser.add_argument_group("fake chat API")
+    chat.add_argument('--requests', type=int, default=20)
+    chat.add_argument('--concurrency', type=int, default=4)
+    chat.add_argument('--turns', type=int, default=10)
+    chat.add_argument('--tokens', type=int, default=200)
+    chat.add_argument('--tokens-per-second', type=float, default=500.0)
+    chat.add_argument('--first-token-delay', type=float, default=0.05)
+    chat.add_argument('--http2', action='store_true', help="Chat over HTTP/2 with httpx, if installed")
+    chat.add_argument('--clients', type=int, default=200, help="Concurrent chat clients in the server benchmark")
+    other = parser.add_argument_group("context, dedup, startup, DNS, chat history, rate limiting and corpus")
+    other.add_argument('--docs', type=int, default=100)
+    other.add_argument('--doc-kb', type=int, default=50)
+    other.add_argument('--repeat', type=int, default=200)
+    other.add_argument('--dedup-pages', type=int, default=2000)
+    other.add_argument('--reruns', type=int, default=20, help="Streamlit reruns of app.py timed by startup")
+    other.add_argument('--limiter-calls', type=int, default=2000, help="Rate limiter slots taken per backend")
+    other.add_argument('--dns-lookups', type=int, default=500, help="Host lookups per resolver in the dns benchmark")
+    other.add_argument('--history-messages', type=int, nargs='+', default=[10, 100, 400],
+                       help="Chat history lengths timed by chat_history")
+    other.add_argument('--corpus-docs', type=int, default=10000, help="Documents in the corpus snapshot benchmark")
+    args = parser.parse_args()
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+
+    site_config = SiteConfig(pages=args.pages, fanout=args.fanout, page_bytes=args.page_bytes,
+                             latency=args.latency, error_rate=args.error_rate, spa_rate=args.spa_rate,
+                             trap_rate=args.trap_rate, capacity=args.capacity)
+    chat_config = ChatConfig(tokens=args.tokens, tokens_per_second=args.tokens_per_second,
+                             first_token_delay=args.first_token_delay)
+    selected = args.benchmarks or list(BENCHMARKS)
+
+    results: Dict[str, Dict[str, Any]] = {}
+    with BenchmarkServer(site_config, chat_config) as server:
+        for name in selected:
+            print(f"Running {name}...", file=sys.stderr)
+            results[name] = BENCHMARKS[name](args, server)
+            print(json.dumps({name: results[name]}, indent=2))
+
+    report = {
+        "timestamp": datetime.datetime.now().isoformat(timespec='seconds'),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        "results": results
+    }
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved results to {args.output}", file=sys.stderr)
+
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
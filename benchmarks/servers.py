@@ -0,0 +1,343 @@
+"""
+Local stand-ins for benchmarking: a synthetic website, a fake
+OpenRouter API that streams completions over SSE, and an in-memory
+Redis-protocol server for the shared rate limiter.
+
+The server runs in a subprocess so its CPU time and allocations do not
+count against the code being measured:
+
+    python -m benchmarks.servers --pages 500 --latency 0.01 --tokens-per-second 200
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import zlib
+from dataclasses import dataclass, asdict, fields
+from typing import Optional, List, Dict
+
+from aiohttp import web
+
+@dataclass
+class SiteConfig:
+    pages: int = 200
+    fanout: int = 5
+    page_bytes: int = 8000
+    latency: float = 0.02  # Seconds before each page response
+    error_rate: float = 0.0  # Fraction of pages that return HTTP 500
+    spa_rate: float = 0.0  # Fraction of pages shipping their text only as embedded JSON, like client-rendered apps
+    trap_rate: float = 0.0  # Fraction of pages also linking to files, tracking-parameter duplicates and a calendar
+    capacity: int = 0  # Concurrent page requests served at full speed; 0 for unlimited
+    compression: str = ""  # Content-Coding for pages when the client accepts it: gzip, deflate or br
+    charset: str = "utf-8"  # Charset named in the pages' Content-Type; empty sends bare text/html, as many servers do
+    seed: int = 0
+
+@dataclass
+class ChatConfig:
+    tokens: int = 200  # Tokens streamed per completion
+    tokens_per_second: float = 500.0
+    first_token_delay: float = 0.05  # Simulated queueing and prompt processing
+    tokens_per_chunk: int = 1
+
+WORDS = ("the crawler fetches pages and extracts readable text while the chat model streams "
+         "answers about documentation guides tutorials pricing release notes api reference").split()
+# A large vocabulary keeps synthetic pages distinct enough to survive near-duplicate removal
+VOCABULARY = WORDS + [f"term{i}" for i in range(5000)]
+
+class SyntheticSite:
+    """Deterministic site of linked pages with configurable size, latency and errors"""
+
+    def __init__(self, config: SiteConfig):
+        self.config = config
+        self.active = 0
+
+    def page_html(self, index: int) -> str:
+        config = self.config
+        rng = random.Random(config.seed * 1_000_003 + index)
+        paragraphs = []
+        size = 0
+        while size < config.page_bytes:
+            paragraph = ' '.join(rng.choices(VOCABULARY, k=60))
+            paragraphs.append(f"<p>{paragraph}</p>")
+            size += len(paragraph) + 7
+        first_child = index * config.fanout + 1
+        links = ''.join(
+            f'<a href="/page/{child % config.pages}">Page {child % config.pages} {rng.choice(WORDS)}</a>'
+            for child in range(first_child, first_child + config.fanout)
+        )
+        if self.is_trap(index):
+            links += self.trap_links(index)
+        if self.is_spa(index):
+            data = {"props": {"pageProps": {"title": f"Page {index}",
+                                            "sections": [{"body": paragraph[3:-4]} for paragraph in paragraphs]}},
+                    "page": "/page/[index]", "buildId": "benchmark"}
+            return (f"<html><head><title>Page {index}</title>"
+                    f'<script id="__NEXT_DATA__" type="application/json">{json.dumps(data)}</script></head>'
+                    f'<body><nav>{links}</nav><div id="__next"></div></body></html>')
+        return (f"<html><head><title>Page {index}</title></head><body>"
+                f"<nav>{links}</nav><h1>Page {index}</h1>{''.join(paragraphs)}</body></html>")
+
+    def _fraction(self, index: int, salt: str) -> float:
+        return (zlib.crc32(f"{self.config.seed}:{salt}{index}".encode()) % 10_000) / 10_000
+
+    def is_error(self, index: int) -> bool:
+        return self._fraction(index, "") < self.config.error_rate
+
+    def is_spa(self, index: int) -> bool:
+        return self._fraction(index, "spa:") < self.config.spa_rate
+
+    def is_trap(self, index: int) -> bool:
+        return self._fraction(index, "trap:") < self.config.trap_rate
+
+    def trap_links(self, index: int) -> str:
+        """Links a crawler should not spend fetches on"""
+        duplicate = (index + 1) % self.config.pages
+        return (f'<a href="/files/report-{index}.pdf">Report</a><a href="/files/photo-{index}.jpg">Photo</a>'
+                f'<a href="/page/{duplicate}?utm_source=nav&amp;ref=page{index}">Next</a>'
+                f'<a href="/page/{duplicate}?ref=page{index}&amp;utm_medium=web">Next page</a>'
+                f'<a href="/calendar/2024/{index % 12 + 1}">Events</a><a href="/logout">Log out</a>')
+
+    async def handle_file(self, request: web.Request) -> web.Response:
+        if self.config.latency:
+            await asyncio.sleep(self.config.latency)
+        return web.Response(body=bytes(self.config.page_bytes), content_type='application/octet-stream')
+
+    async def handle_calendar(self, request: web.Request) -> web.Response:
+        """An endless calendar: every month links to the next one"""
+        if self.config.latency:
+            await asyncio.sleep(self.config.latency)
+        year, month = int(request.match_info['year']), int(request.match_info['month'])
+        next_year, next_month = (year + 1, 1) if month >= 12 else (year, month + 1)
+        return web.Response(text=(f"<html><head><title>Events {year}-{month:02d}</title></head><body>"
+                                  f"<p>No events in {year}-{month:02d}</p>"
+                                  f'<a href="/calendar/{next_year}/{next_month}">Next month</a></body></html>'),
+                            content_type='text/html')
+
+    async def handle(self, request: web.Request) -> web.Response:
+        index = int(request.match_info.get('index', 0)) % self.config.pages
+        capacity = self.config.capacity
+        self.active += 1
+        try:
+            # Past its capacity the server queues requests, and past twice that it sheds them
+            if capacity and self.active > 2 * capacity:
+                return web.Response(status=503, text="Service Unavailable", headers={'Retry-After': '1'})
+            latency = self.config.latency * (max(self.active / capacity, 1.0) if capacity else 1.0)
+            if latency:
+                await asyncio.sleep(latency)
+        finally:
+            self.active -= 1
+        if self.is_error(index):
+            return web.Response(status=500, text="Internal Server Error")
+        if self.config.charset:
+            response = web.Response(text=self.page_html(index), content_type='text/html', charset=self.config.charset)
+        else:
+            response = web.Response(body=self.page_html(index).encode('utf-8'), headers={'Content-Type': 'text/html'})
+        coding = self.config.compression
+        if coding and coding in request.headers.get('Accept-Encoding', ''):
+            response.enable_compression(web.ContentCoding(coding))
+        return response
+
+class FakeOpenRouter:
+    """Minimal OpenRouter-compatible API: /models and streaming /chat/completions"""
+
+    def __init__(self, config: ChatConfig):
+        self.config = config
+        self.requests = 0
+
+    async def models(self, request: web.Request) -> web.Response:
+        return web.json_response({"data": [
+            {"id": "bench/fast-model:free", "context_length": 8192},
+            {"id": "bench/slow-model:free", "context_length": 8192},
+            {"id": "bench/broken-model:free", "context_length": 8192}
+        ]})
+
+    async def chat_completions(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        payload = await request.json()
+        config = self.config
+        model = payload.get("model", "")
+        if "broken" in model:
+            return web.json_response({"error": {"message": "Model unavailable"}}, status=503)
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache'})
+        await response.prepare(request)
+        # Slow models take ten times as long to start answering, for race and ranking benchmarks
+        await asyncio.sleep(config.first_token_delay * (10 if "slow" in model else 1))
+
+        interval = config.tokens_per_chunk / config.tokens_per_second
+        next_send = time.perf_counter()
+        tokens = min(config.tokens, int(payload.get("max_tokens") or config.tokens))
+        sent = 0
+        try:
+            while sent < tokens:
+                count = min(config.tokens_per_chunk, tokens - sent)
+                content = ''.join(f"{WORDS[(sent + i) % len(WORDS)]} " for i in range(count))
+                chunk = {"model": model, "choices": [{"delta": {"content": content}}]}
+                await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                sent += count
+                next_send += interval
+                delay = next_send - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            # Cut off at max_tokens, like a real API, the answer ends with finish_reason "length"
+            finish = {"model": model, "choices": [{"delta": {}, "finish_reason": "stop" if tokens == config.tokens else "length"}]}
+            await response.write(f"data: {json.dumps(finish)}\n\n".encode())
+            usage = {"choices": [], "usage": {"completion_tokens": tokens}}
+            await response.write(f"data: {json.dumps(usage)}\n\n".encode())
+            await response.write(b"data: [DONE]\n\n")
+            await response.write_eof()
+        except ConnectionResetError:
+            pass  # Client stopped reading, e.g. a cancelled race contestant
+        return response
+
+class FakeRedis:
+    """In-memory Redis-protocol server with the string commands the rate limiter uses"""
+
+    def __init__(self):
+        self.values: Dict[bytes, bytes] = {}
+        self.expires: Dict[bytes, float] = {}
+        self.commands = 0
+
+    def _get(self, key: bytes) -> Optional[bytes]:
+        expires = self.expires.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self.values.pop(key, None)
+            del self.expires[key]
+        return self.values.get(key)
+
+    def execute(self, args: List[bytes]) -> bytes:
+        name = args[0].upper()
+        if name == b"PING":
+            return b"+PONG\r\n"
+        if name in (b"AUTH", b"SELECT"):
+            return b"+OK\r\n"
+        if name == b"GET":
+            value = self._get(args[1])
+            return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+        if name == b"SET":
+            self.values[args[1]] = args[2]
+            self.expires.pop(args[1], None)
+            return b"+OK\r\n"
+        if name in (b"INCR", b"DECR"):
+            value = int(self._get(args[1]) or 0) + (1 if name == b"INCR" else -1)
+            self.values[args[1]] = str(value).encode()
+            return b":%d\r\n" % value
+        if name == b"PEXPIRE":
+            if self._get(args[1]) is None:
+                return b":0\r\n"
+            self.expires[args[1]] = time.monotonic() + int(args[2]) / 1000
+            return b":1\r\n"
+        if name == b"DEL":
+            removed = 0
+            for key in args[1:]:
+                removed += self._get(key) is not None
+                self.values.pop(key, None)
+                self.expires.pop(key, None)
+            return b":%d\r\n" % removed
+        if name == b"FLUSHALL":
+            self.values.clear()
+            self.expires.clear()
+            return b"+OK\r\n"
+        return b"-ERR unknown command '%s'\r\n" % name
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                header = await reader.readline()
+                if not header:
+                    break
+                args = []
+                for _ in range(int(header[1:-2])):
+                    length = int((await reader.readline())[1:-2])
+                    args.append((await reader.readexactly(length + 2))[:-2])
+                self.commands += 1
+                writer.write(self.execute(args))
+                await writer.drain()
+        except (ConnectionResetError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+def build_app(site: SiteConfig, chat: ChatConfig) -> web.Application:
+    synthetic_site = SyntheticSite(site)
+    api = FakeOpenRouter(chat)
+    app = web.Application()
+    app.router.add_get('/page/{index}', synthetic_site.handle)
+    app.router.add_get('/files/{name}', synthetic_site.handle_file)
+    app.router.add_get('/calendar/{year}/{month}', synthetic_site.handle_calendar)
+    app.router.add_get('/logout', synthetic_site.handle_file)
+    app.router.add_get('/api/v1/models', api.models)
+    app.router.add_post('/api/v1/chat/completions', api.chat_completions)
+    return app
+
+def _config_args(config: object) -> List[str]:
+    return [arg for field in fields(config)
+            for arg in (f"--{field.name.replace('_', '-')}", str(getattr(config, field.name)))]
+
+class BenchmarkServer:
+    """Run the synthetic site, fake API and fake Redis in a subprocess for the duration of a with-block"""
+
+    def __init__(self, site: Optional[SiteConfig] = None, chat: Optional[ChatConfig] = None):
+        self.site = site or SiteConfig()
+        self.chat = chat or ChatConfig()
+        self.process: Optional[subprocess.Popen] = None
+        self.port = 0
+        self.redis_port = 0
+
+    @property
+    def site_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/page/0"
+
+    @property
+    def api_base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/api/v1"
+
+    @property
+    def redis_url(self) -> str:
+        return f"redis://127.0.0.1:{self.redis_port}/0"
+
+    def __enter__(self) -> 'BenchmarkServer':
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        command = [sys.executable, "-m", "benchmarks.servers", *_config_args(self.site), *_config_args(self.chat)]
+        self.process = subprocess.Popen(command, cwd=root, stdout=subprocess.PIPE, text=True)
+        ports = json.loads(self.process.stdout.readline())
+        self.port, self.redis_port = ports["port"], ports["redis_port"]
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if self.process is not None:
+            self.process.terminate()
+            self.process.wait(timeout=10)
+
+async def serve(site: SiteConfig, chat: ChatConfig, port: int, redis_port: int = 0) -> None:
+    runner = web.AppRunner(build_app(site, chat), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', port).start()
+    redis = await asyncio.start_server(FakeRedis().handle, '127.0.0.1', redis_port)
+    print(json.dumps({"port": runner.addresses[0][1], "redis_port": redis.sockets[0].getsockname()[1],
+                      "site": asdict(site), "chat": asdict(chat)}), flush=True)
+    await asyncio.Event().wait()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve the synthetic site, fake OpenRouter API and fake Redis")
+    parser.add_argument('--port', type=int, default=0)
+    parser.add_argument('--redis-port', type=int, default=0)
+    for config in (SiteConfig(), ChatConfig()):
+        for field in fields(config):
+            parser.add_argument(f"--{field.name.replace('_', '-')}", type=type(getattr(config, field.name)),
+                                default=getattr(config, field.name))
+    args = parser.parse_args()
+    site = SiteConfig(**{field.name: getattr(args, field.name) for field in fields(SiteConfig)})
+    chat = ChatConfig(**{field.name: getattr(args, field.name) for field in fields(ChatConfig)})
+    try:
+        asyncio.run(serve(site, chat, args.port, args.redis_port))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -5,20 +5,56 @@ AI Chat & Web Crawler Application
 This package contains the core modules for the AI chat and web crawler application:
 
 - chat: Handles API communication and chat management
+- transport: Negotiates compression, counts connections and bytes, and provides HTTP/2 for the chat API
 - crawler: Implements async web crawling functionality
+- structured: Extracts text from embedded JSON and meta tags of client-rendered pages
 - file_processor: Handles document processing and text extraction
+- jobs: Runs multi-site crawl jobs on a shared connection pool
+- checkpoint: Saves crawl progress to SQLite so interrupted jobs can resume
+- linkfilter: Filters and normalizes links before they are queued for crawling
+- resolver: Caches crawler DNS lookups and refuses private and local addresses
+- context: Builds the reference-content block for the system prompt
+- content: Stores page text as compressed chunks
+- metrics: Records performance metrics with Prometheus and JSON export
+- cache: Caches chat responses to repeated questions
+- retrieval: Ranks document passages by relevance to a question (BM25)
+- corpus: Saves documents and their retrieval index as memory-mapped snapshots
+- batch: Answers JSONL question sets from the command line or Python
+- server: Serves crawl jobs, documents and streaming chat over HTTP to many clients
+- render: Prepares chat message markdown for display, cached by message hash
+- debuglog: Keeps a bounded, sampled developer-mode debug log
+- export: Streams chat history and debug log exports, optionally gzip-compressed
+- ratelimit: Limits API requests per key, in process or shared through SQLite or Redis
 """
 
-from .chat import ChatAPI, ChatManager
-from .crawler import AsyncWebCrawler, URLValidator, CrawlResult
-from .file_processor import FileProcessor
+import importlib
+from typing import Any, List
 
 __version__ = "1.0.0"
-__all__ = [
-    'ChatAPI',
-    'ChatManager',
-    'AsyncWebCrawler',
-    'URLValidator',
-    'CrawlResult',
-    'FileProcessor'
-]
\ No newline at end of file
+
+# Exported names and the submodule defining each. Submodules are imported on
+# first attribute access (PEP 562), so importing one module of the package
+# does not pull in aiohttp, requests and the rest.
+_EXPORTS = {
+    'ChatAPI': 'chat',
+    'ChatManager': 'chat',
+    'AsyncWebCrawler': 'crawler',
+    'URLValidator': 'crawler',
+    'CrawlResult': 'crawler',
+    'FileProcessor': 'file_processor',
+    'CrawlJob': 'jobs',
+    'ResponseCache': 'cache',
+    'RateLimiter': 'ratelimit'
+}
+__all__ = list(_EXPORTS)
+
+def __getattr__(name: str) -> Any:
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value  # Later lookups skip __getattr__
+    return value
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(__all__))
\ No newline at end of file
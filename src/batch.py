@@ -0,0 +1,296 @@
+from typing import List, Dict, Optional, Any, Callable, Iterator, Set
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from threading import Lock
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from .chat import ChatAPI, RateLimiter
+from .context import prepare_crawled_content
+from .retrieval import RetrievalIndex
+from .metrics import REGISTRY
+
+BATCH_QUESTIONS = REGISTRY.counter("batch_questions_total", "Batch questions answered by result")
+
+DEFAULT_BASE_URL = "https://openrouter.ai/api/v1"
+DEFAULT_SYSTEM_PROMPT = "You are a helpful AI assistant. Answer using the reference content."
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+def read_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+def load_questions(path: str) -> List[Dict[str, Any]]:
+    """Questions from a JSONL file of {"id", "question"} objects or plain strings; IDs default to the line number"""
+    questions = []
+    for number, item in enumerate(read_jsonl(path), 1):
+        if isinstance(item, str):
+            item = {"question": item}
+        if not item.get("question"):
+            raise ValueError(f"{path}, question {number}: missing 'question'")
+        item["id"] = str(item.get("id", number))
+        questions.append(item)
+    return questions
+
+def load_documents(paths: List[str]) -> List[Dict[str, Any]]:
+    """Documents from JSON/JSONL files of {"url", "title", "content"} objects, or text, markdown and PDF files"""
+    from .file_processor import FileProcessor
+
+    documents = []
+    processor = FileProcessor()
+    for path in paths:
+        if path.endswith('.jsonl'):
+            documents.extend(read_jsonl(path))
+        elif path.endswith('.json'):
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            documents.extend(data if isinstance(data, list) else [data])
+        else:
+            with open(path, 'rb') as f:
+                if path.endswith('.pdf'):
+                    content, error = processor.process_pdf(f)
+                else:
+                    content, error = processor.process_text_file(f)
+            if error:
+                raise ValueError(f"{path}: {error}")
+            documents.append({'url': "uploaded_file", 'title': os.path.basename(path), 'content': content})
+    return documents
+
+def answered_ids(output_path: str, retry_errors: bool = True) -> Set[str]:
+    """IDs already in an output file, skipping failed answers when they should be retried"""
+    if not os.path.exists(output_path):
+        return set()
+    done = set()
+    with open(output_path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                continue  # A line cut short by an interrupted run
+            if not (retry_errors and row.get("error")):
+                done.add(str(row.get("id")))
+    return done
+
+def compact_output(output_path: str) -> int:
+    """Keep only the last row for each ID in an output file, in place; returns the rows dropped
+
+    A retried question leaves its failed row above its answer. Each ID keeps
+    the position of its first row. The file is rewritten only when rows are
+    dropped, through a temporary file, so an interruption leaves it intact.
+    """
+    rows: Dict[str, str] = {}
+    dropped = 0
+    with open(output_path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                dropped += 1  # A line cut short by an interrupted run
+                continue
+            key = str(row.get("id"))
+            if key in rows:
+                dropped += 1
+            rows[key] = line if line.endswith("\n") else line + "\n"
+    if not dropped:
+        return 0
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(output_path)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.writelines(rows.values())
+        os.replace(temp_path, output_path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    return dropped
+
+def _ends_with_newline(path: str) -> bool:
+    with open(path, 'rb') as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+class BatchRunner:
+    """Answer many questions over one document set with bounded concurrency
+
+    Each question gets a reference block built from the passages most
+    relevant to it. Answers are appended to a JSONL file as they complete,
+    and questions already answered there are skipped, so an interrupted run
+    can simply be started again. A run that finishes leaves one row per
+    question, the latest. Requests wait for the API client's rate limiter
+    instead of failing.
+    """
+
+    def __init__(self, api: ChatAPI, documents: List[Dict[str, Any]], model: str,
+                 system_prompt: str = DEFAULT_SYSTEM_PROMPT, concurrency: int = 4, top_k: int = 8,
+                 max_context_chars: int = 10000, temperature: float = 0.2, max_tokens: int = 1000,
+                 max_attempts: int = 3, rate_limit_wait: float = 300.0, index: Optional[RetrievalIndex] = None):
+        self.api = api
+        self.api.rate_limit_wait = rate_limit_wait
+        self.model = model
+        self.system_prompt = system_prompt
+        self.concurrency = concurrency
+        self.top_k = top_k
+        self.max_context_chars = max_context_chars
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.max_attempts = max_attempts
+        self.index = index if index is not None else RetrievalIndex(documents)
+        self.write_lock = Lock()
+
+    def build_messages(self, question: str, context: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+        """System prompt with the passages retrieved for this question, then the question"""
+        reference = prepare_crawled_content(context, self.max_context_chars)
+        return [
+            {"role": "system", "content": f"{self.system_prompt}\n{reference}" if reference else self.system_prompt},
+            {"role": "user", "content": question}
+        ]
+
+    def answer(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """Answer one question, retrying rate-limit and server errors with backoff"""
+        row = {"id": item["id"], "question": item["question"], "model": self.model}
+        context = self.index.context_documents(item["question"], self.top_k)
+        messages = self.build_messages(item["question"], context)
+        row["sources"] = sorted({document['url'] for document in context})
+        started = time.perf_counter()
+        error = None
+        attempts = 0
+        for attempt in range(self.max_attempts):
+            attempts = attempt + 1
+            if attempt:
+                time.sleep(min(2 ** attempt, 30))
+            try:
+                response = self.api.make_request(messages=messages, model=self.model,
+                                                 temperature=self.temperature, max_tokens=self.max_tokens)
+            except Exception as e:
+                error = str(e)
+                continue
+            if response.status_code != 200:
+                error = f"HTTP {response.status_code}: {response.text[:500]}"
+                if response.status_code in RETRY_STATUS_CODES:
+                    continue
+                break
+            stats: Dict[str, Any] = {}
+            text = "".join(self.api.process_stream(response, stats))
+            if stats.get('failed'):
+                error = text.strip()
+                continue
+            row.update(answer=text, error=None, ttft=stats.get('ttft'),
+                       completion_tokens=stats.get('completion_tokens'), attempts=attempt + 1,
+                       duration=round(time.perf_counter() - started, 3))
+            BATCH_QUESTIONS.inc(result="ok")
+            return row
+        row.update(answer=None, error=error, attempts=attempts,
+                   duration=round(time.perf_counter() - started, 3))
+        BATCH_QUESTIONS.inc(result="error")
+        return row
+
+    def _write(self, output, row: Dict[str, Any]) -> None:
+        with self.write_lock:
+            output.write(json.dumps(row, ensure_ascii=False) + "\n")
+            output.flush()
+
+    def run(self, questions: List[Dict[str, Any]], output_path: str, resume: bool = True,
+            retry_errors: bool = True, progress: Optional[Callable[[Dict[str, Any], int, int], None]] = None) -> Dict[str, Any]:
+        """Answer every question not yet in output_path and return a summary"""
+        done = answered_ids(output_path, retry_errors) if resume else set()
+        pending = [item for item in questions if item["id"] not in done]
+        summary = {"questions": len(questions), "skipped": len(questions) - len(pending), "answered": 0, "failed": 0}
+        started = time.perf_counter()
+
+        directory = os.path.dirname(os.path.abspath(output_path))
+        os.makedirs(directory, exist_ok=True)
+        with open(output_path, 'a' if resume else 'w', encoding='utf-8') as output, \
+                ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            if output.tell() and not _ends_with_newline(output_path):
+                output.write("\n")  # Finish a line cut short by an interrupted run
+            queued = iter(pending)
+            in_flight = set()
+            while True:
+                # Keep a bounded number of questions queued so huge sets are not all submitted up front
+                for item in queued:
+                    in_flight.add(pool.submit(self.answer, item))
+                    if len(in_flight) >= self.concurrency * 2:
+                        break
+                if not in_flight:
+                    break
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    row = future.result()
+                    self._write(output, row)
+                    summary["failed" if row["error"] else "answered"] += 1
+                    if progress is not None:
+                        progress(row, summary["answered"] + summary["failed"], len(pending))
+
+        if resume:
+            compact_output(output_path)  # Drop the failed rows of questions retried in this run
+        summary["seconds"] = round(time.perf_counter() - started, 3)
+        return summary
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of questions over crawled pages and documents")
+    parser.add_argument('questions', help="JSONL file of {\"id\", \"question\"} objects or strings")
+    parser.add_argument('-o', '--output', required=True, help="JSONL file answers are appended to")
+    parser.add_argument('-m', '--model', required=True)
+    parser.add_argument('-d', '--documents', action='append', default=[],
+                        help="JSON/JSONL documents or a .txt/.md/.pdf file (repeatable)")
+    parser.add_argument('--crawl', action='append', default=[], help="URL to crawl for documents (repeatable)")
+    parser.add_argument('--corpus', help="Corpus snapshot saved by the app or python -m src.corpus")
+    parser.add_argument('--depth', type=int, default=2)
+    parser.add_argument('--max-pages', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--top-k', type=int, default=8, help="Passages retrieved per question")
+    parser.add_argument('--system-prompt', default=DEFAULT_SYSTEM_PROMPT)
+    parser.add_argument('--temperature', type=float, default=0.2)
+    parser.add_argument('--max-tokens', type=int, default=1000)
+    parser.add_argument('--requests-per-minute', type=int, default=60)
+    parser.add_argument('--no-resume', dest='resume', action='store_false', help="Overwrite the output file")
+    parser.add_argument('--keep-errors', dest='retry_errors', action='store_false',
+                        help="Do not retry questions that failed in an earlier run")
+    parser.add_argument('--base-url', default=os.getenv("OPENROUTER_BASE_URL", DEFAULT_BASE_URL))
+    parser.add_argument('--http2', action='store_true',
+                        help="Multiplex concurrent requests over one HTTP/2 connection (needs httpx[http2])")
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    api_key = os.getenv("OPENROUTER_API_KEY")
+    if not api_key:
+        parser.error("set OPENROUTER_API_KEY in the environment or a .env file")
+
+    documents = load_documents(args.documents)
+    if args.crawl:
+        from .jobs import crawl_sites
+        results = crawl_sites(args.crawl, max_depth=args.depth, max_pages=args.max_pages)
+        documents.extend({'url': result.url, 'title': result.title, 'content': result.content} for result in results)
+    index = None
+    if args.corpus:
+        from .corpus import Corpus
+        corpus = Corpus(args.corpus)
+        if documents:
+            documents = corpus.documents() + documents
+        else:
+            documents, index = corpus.documents(), corpus.index  # Reuse the snapshot's index
+    if not documents:
+        print("Warning: no documents given, questions are answered without reference content", file=sys.stderr)
+
+    api = ChatAPI(args.base_url, api_key, http2=args.http2)
+    api.rate_limiter = RateLimiter(max_requests=args.requests_per_minute)
+    runner = BatchRunner(api, documents, args.model, system_prompt=args.system_prompt,
+                         concurrency=args.concurrency, top_k=args.top_k, temperature=args.temperature,
+                         max_tokens=args.max_tokens, index=index)
+    questions = load_questions(args.questions)
+
+    def report(row: Dict[str, Any], completed: int, total: int) -> None:
+        status = f"error: {row['error'][:80]}" if row["error"] else f"{row['duration']:.1f}s"
+        print(f"[{completed}/{total}] {row['id']} {status}", file=sys.stderr)
+
+    summary = runner.run(questions, args.output, resume=args.resume, retry_errors=args.retry_errors, progress=report)
+    print(json.dumps(summary))
+    return 1 if summary["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
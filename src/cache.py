@@ -0,0 +1,228 @@
+from typing import List, Dict, Optional, Any, Callable, Iterator, NamedTuple
+from collections import OrderedDict
+from threading import Lock
+import datetime
+import hashlib
+import json
+import math
+import os
+import re
+import tempfile
+import time
+import zlib
+from .metrics import REGISTRY
+
+CACHE_LOOKUPS = REGISTRY.counter("chat_cache_lookups_total", "Response cache lookups by result")
+
+_WORD_RE = re.compile(r'\w+')
+_SPACE_RE = re.compile(r'\s+')
+
+def normalize_prompt(prompt: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation"""
+    return _SPACE_RE.sub(' ', prompt.lower()).strip().rstrip('?!. ')
+
+def context_hash(messages: List[Dict[str, str]]) -> str:
+    """Hash of everything sent besides the question: system prompt, reference documents and earlier turns"""
+    digest = hashlib.sha256()
+    for message in messages:
+        digest.update(json.dumps([message.get('role'), message.get('content')]).encode())
+    return digest.hexdigest()
+
+def temperature_bucket(temperature: float, width: float = 0.1) -> int:
+    return int(round(temperature / width))
+
+def hashed_embedding(text: str, dimensions: int = 512) -> Dict[int, float]:
+    """Sparse unit-length bag-of-words vector, using the hashing trick for a fixed size"""
+    counts: Dict[int, float] = {}
+    for word in _WORD_RE.findall(text.lower()):
+        index = zlib.crc32(word.encode()) % dimensions
+        counts[index] = counts.get(index, 0.0) + 1.0
+    norm = math.sqrt(sum(value * value for value in counts.values())) or 1.0
+    return {index: value / norm for index, value in counts.items()}
+
+def cosine_similarity(a: Dict[int, float], b: Dict[int, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(value * b.get(index, 0.0) for index, value in a.items())
+
+class CacheKey(NamedTuple):
+    model: str
+    prompt: str  # Normalized
+    context: str
+    temperature: int  # Bucket
+
+class _Entry:
+    __slots__ = ('key', 'response', 'created', 'vector')
+
+    def __init__(self, key: CacheKey, response: str, created: float):
+        self.key = key
+        self.response = response
+        self.created = created
+        self.vector: Optional[Dict[int, float]] = None
+
+class ResponseCache:
+    """LRU cache of completed chat responses with a time-to-live
+
+    Entries are found by exact key. With a ``similarity_threshold`` a miss
+    falls back to the most similar cached prompt for the same model, context
+    and temperature bucket, compared with ``embed`` (by default a hashed
+    bag-of-words vector). With a ``path`` the cache is loaded from and saved
+    to a JSON file.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 24 * 3600, path: Optional[str] = None,
+                 similarity_threshold: Optional[float] = None,
+                 embed: Callable[[str], Dict[int, float]] = hashed_embedding):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.similarity_threshold = similarity_threshold
+        self.embed = embed
+        self.entries: 'OrderedDict[CacheKey, _Entry]' = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        if path and os.path.exists(path):
+            self.load(path)
+
+    @staticmethod
+    def make_key(messages: List[Dict[str, str]], model: str, temperature: float) -> Optional[CacheKey]:
+        """Key for a request, or None if it does not end with a user question"""
+        if not messages or messages[-1].get('role') != 'user':
+            return None
+        return CacheKey(model, normalize_prompt(messages[-1].get('content', '')),
+                        context_hash(messages[:-1]), temperature_bucket(temperature))
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _expired(self, entry: _Entry, now: float) -> bool:
+        return self.ttl is not None and now - entry.created > self.ttl
+
+    def _vector(self, entry: _Entry) -> Dict[int, float]:
+        if entry.vector is None:
+            entry.vector = self.embed(entry.key.prompt)
+        return entry.vector
+
+    def _find_similar(self, key: CacheKey, threshold: float, now: float) -> Optional[_Entry]:
+        vector = self.embed(key.prompt)
+        best, best_score = None, threshold
+        for entry in self.entries.values():
+            if entry.key[0] != key.model or entry.key[2:] != key[2:] or self._expired(entry, now):
+                continue
+            score = cosine_similarity(vector, self._vector(entry))
+            if score >= best_score:
+                best, best_score = entry, score
+        return best
+
+    def get(self, key: CacheKey, similarity_threshold: Optional[float] = None) -> Optional[str]:
+        """Return the cached response for key, or for a similar enough prompt
+
+        ``similarity_threshold`` overrides the cache-wide threshold for this lookup.
+        """
+        threshold = similarity_threshold if similarity_threshold is not None else self.similarity_threshold
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            result = "hit"
+            if entry is not None and self._expired(entry, now):
+                del self.entries[key]
+                entry = None
+            if entry is None and threshold is not None:
+                entry = self._find_similar(key, threshold, now)
+                result = "similar"
+            if entry is None:
+                self.misses += 1
+                CACHE_LOOKUPS.inc(result="miss")
+                return None
+            self.entries.move_to_end(entry.key)
+            self.hits += 1
+            CACHE_LOOKUPS.inc(result=result)
+            return entry.response
+
+    def put(self, key: CacheKey, response: str) -> None:
+        with self.lock:
+            self.entries[key] = _Entry(key, response, time.time())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        if self.path:
+            self.save(self.path)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+        if self.path:
+            self.save(self.path)
+
+    def save(self, path: str) -> None:
+        """Write the cache to path atomically, least recently used first"""
+        with self.lock:
+            data = {
+                "version": 1,
+                "entries": [{**entry.key._asdict(), "response": entry.response, "created": entry.created}
+                            for entry in self.entries.values()]
+            }
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def load(self, path: str) -> None:
+        """Add the unexpired entries saved at path"""
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        with self.lock:
+            for item in data.get("entries", []):
+                try:
+                    key = CacheKey(item["model"], item["prompt"], item["context"], int(item["temperature"]))
+                    entry = _Entry(key, item["response"], float(item["created"]))
+                except (KeyError, TypeError, ValueError):
+                    continue
+                if not self._expired(entry, now):
+                    self.entries[key] = entry
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0}
+
+class CachedResponse:
+    """Stand-in for a streaming requests.Response that replays a cached answer as SSE events
+
+    Lets ``ChatAPI.process_stream`` consume cached and live responses alike.
+    """
+    status_code = 200
+    from_cache = True
+
+    def __init__(self, text: str, model: str, chunk_chars: int = 64):
+        self.text = text
+        self.model = model
+        self.chunk_chars = chunk_chars
+        self.request_started = time.perf_counter()
+        self.elapsed = datetime.timedelta(0)
+        self.headers = {"Content-Type": "text/event-stream", "X-Cache": "HIT"}
+
+    def __iter__(self) -> Iterator[bytes]:
+        for start in range(0, len(self.text), self.chunk_chars):
+            event = {"model": self.model, "choices": [{"delta": {"content": self.text[start:start + self.chunk_chars]}}]}
+            yield f"data: {json.dumps(event)}\n\n".encode()
+        yield b"data: [DONE]\n\n"
+
+    def json(self) -> Dict[str, Any]:
+        return {}
+
+    def close(self) -> None:
+        pass
\ No newline at end of file
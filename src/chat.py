@@ -1,41 +1,239 @@
-from typing import List, Dict, Any, Optional, Generator, Tuple, AsyncGenerator
+from typing import List, Dict, Any, Optional, Generator, Tuple, AsyncGenerator, TYPE_CHECKING
 import requests
 import json
-import sseclient
 import time
-from collections import deque
-from threading import Lock
+import math
+import queue
+from threading import Event, Lock, Thread
 import functools
+import hashlib
 import random
-import streamlit as st
+from .metrics import REGISTRY
+from .cache import ResponseCache, CachedResponse
+from .ratelimit import RateLimiter
+from .transport import (CountingStream, abort_response, count_aiohttp_wire_bytes, count_wire_bytes, create_session,
+                        iter_sse_data)
 
-class RateLimiter:
-    def __init__(self, max_requests: int = 60, time_window: int = 60):
-        self.max_requests = max_requests
-        self.time_window = time_window
-        self.timestamps: deque = deque(maxlen=max_requests)
+if TYPE_CHECKING:
+    import aiohttp
+
+TTFT_SECONDS = REGISTRY.histogram("chat_ttft_seconds", "Request sent until first streamed content chunk")
+INTER_CHUNK_SECONDS = REGISTRY.histogram("chat_inter_chunk_seconds", "Gap between consecutive streamed content chunks")
+HEADERS_SECONDS = REGISTRY.histogram("chat_response_headers_seconds", "Request sent until response headers")
+CHAT_REQUESTS = REGISTRY.counter("chat_requests_total", "Chat completion requests by HTTP status")
+STREAM_CHUNKS = REGISTRY.counter("chat_stream_chunks_total", "Streamed content chunks received")
+COMPLETION_TOKENS = REGISTRY.counter("chat_completion_tokens_total", "Completion tokens reported by the API")
+KEEPALIVE_PINGS = REGISTRY.counter("chat_keepalive_pings_total", "Keep-alive pings to the API host by result")
+
+class ModelLatencyStats:
+    """Smoothed time to first token and failure rate per model, used to rank models
+
+    Each observation moves the averages by ``alpha``. A model's score is its
+    expected time to first token inflated by its failure rate; lower is better.
+    """
+
+    def __init__(self, alpha: float = 0.3, failure_penalty: float = 4.0):
+        self.alpha = alpha
+        self.failure_penalty = failure_penalty
+        self.models: Dict[str, Dict[str, Any]] = {}
         self.lock = Lock()
 
-    def check_limit(self) -> bool:
-        """Check if we're within rate limits"""
-        current_time = time.time()
+    def _entry(self, model: str) -> Dict[str, Any]:
+        return self.models.setdefault(model, {'ttft': None, 'failure_rate': 0.0, 'requests': 0})
+
+    def record_ttft(self, model: str, seconds: float) -> None:
         with self.lock:
-            while self.timestamps and self.timestamps[0] < current_time - self.time_window:
-                self.timestamps.popleft()
-            
-            if len(self.timestamps) >= self.max_requests:
-                return False
-            
-            self.timestamps.append(current_time)
+            entry = self._entry(model)
+            entry['ttft'] = seconds if entry['ttft'] is None else self.alpha * seconds + (1 - self.alpha) * entry['ttft']
+            entry['failure_rate'] *= 1 - self.alpha
+            entry['requests'] += 1
+
+    def record_failure(self, model: str) -> None:
+        with self.lock:
+            entry = self._entry(model)
+            entry['failure_rate'] = self.alpha + (1 - self.alpha) * entry['failure_rate']
+            entry['requests'] += 1
+
+    def score(self, model: str) -> Optional[float]:
+        """Expected seconds to first token, or None for a model never tried"""
+        entry = self.models.get(model)
+        if entry is None:
+            return None
+        if entry['ttft'] is None:
+            return math.inf  # Only failures so far
+        return entry['ttft'] * (1 + self.failure_penalty * entry['failure_rate'])
+
+    def rank(self, models: List[str]) -> List[str]:
+        """Order models fastest first; untried models go after measured ones but before failing ones"""
+        def key(item: Tuple[int, str]) -> Tuple[int, float, int]:
+            index, model = item
+            score = self.score(model)
+            if score is None:
+                return (1, 0.0, index)
+            return (0 if score < math.inf else 2, score, index)
+        return [model for _, model in sorted(enumerate(models), key=key)]
+
+# Process-wide, so rankings survive Streamlit reruns and are shared between sessions
+MODEL_LATENCY = ModelLatencyStats()
+
+class KeepAliveSession:
+    """HTTP session whose pooled connection to the API host is kept warm
+
+    A background thread sends a lightweight HEAD request every ``interval``
+    seconds, so DNS, TCP and TLS setup are already done when a prompt is sent.
+    One instance can be shared by every ChatAPI talking to the same host.
+    With ``http2`` (and httpx installed) concurrent requests share one
+    multiplexed connection.
+    """
+
+    def __init__(self, ping_url: str, interval: float = 30.0, pool_size: int = 10, http2: bool = False):
+        self.ping_url = ping_url
+        self.interval = interval
+        self.session = create_session(pool_size, http2=http2)
+        self.stopped = Event()
+        self.thread: Optional[Thread] = None
+
+    def ping(self) -> bool:
+        """Open or refresh the pooled connection; the response status does not matter"""
+        try:
+            self.session.head(self.ping_url, timeout=10, allow_redirects=False)
+            KEEPALIVE_PINGS.inc(result="ok")
             return True
+        except requests.exceptions.RequestException:
+            KEEPALIVE_PINGS.inc(result="error")
+            return False
+
+    def _run(self) -> None:
+        self.ping()
+        while not self.stopped.wait(self.interval):
+            self.ping()
+
+    def start(self) -> None:
+        """Warm the connection now and keep pinging in the background"""
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.stopped.clear()
+        self.thread = Thread(target=self._run, name="chat-keepalive", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+
+class _StreamParser:
+    """Turns the SSE data payloads of one completion into content, recording its statistics"""
+
+    def __init__(self, api: 'ChatAPI', stats: Dict[str, Any], model: str, started: float, cached: bool,
+                 cache_key: Any = None):
+        self.api = api
+        self.stats = stats
+        self.model = model
+        self.started = started
+        self.cached = cached
+        self.cache_key = cache_key
+        self.full_response = ""
+        self.last_chunk: Optional[float] = None
+        self.failed = False
+        stats.update({'model': model, 'chunks': 0, 'ttft': None, 'completion_tokens': None,
+                      'finish_reason': None, 'cached': cached, 'failed': False})
+
+    def fail(self, message: str) -> str:
+        self.failed = self.stats['failed'] = True
+        return message
+
+    def feed(self, payload: str) -> Generator[str, None, None]:
+        """Content of one event's data; sets ``failed`` when the stream should stop"""
+        stats, model, cached = self.stats, self.model, self.cached
+        try:
+            data = json.loads(payload)
+            if data.get('usage'):
+                stats['completion_tokens'] = data['usage'].get('completion_tokens')
+            if data.get('choices') and len(data['choices']) > 0:
+                if data['choices'][0].get('finish_reason'):
+                    stats['finish_reason'] = data['choices'][0]['finish_reason']
+                content = data['choices'][0].get('delta', {}).get('content', '')
+                if content:
+                    now = time.perf_counter()
+                    if self.last_chunk is None:
+                        stats['ttft'] = now - self.started
+                        if not cached:
+                            TTFT_SECONDS.observe(stats['ttft'], model=model)
+                            self.api.model_stats.record_ttft(model, stats['ttft'])
+                    elif not cached:
+                        INTER_CHUNK_SECONDS.observe(now - self.last_chunk, model=model)
+                    self.last_chunk = now
+                    stats['chunks'] += 1
+                    self.full_response += content
+                    yield content
+            if data.get('error'):
+                error_message = data.get('error', {}).get('message', 'Unknown error occurred')
+                yield self.fail(f"\n\nError from API: {error_message}")
+        except json.JSONDecodeError:
+            return
+        except Exception as e:
+            yield self.fail(f"\n\nError processing response: {str(e)}")
+
+    def finish(self) -> Generator[str, None, None]:
+        """Called once the stream has ended; caches a complete answer
+
+        An answer cut off at ``max_tokens`` (finish reason "length") is not
+        cached, since the cache key leaves the limit out and the same question
+        asked with a higher limit should get a whole answer.
+        """
+        if not self.full_response:
+            yield self.fail("I apologize, but I couldn't generate a response. Please try again.")
+        elif (not self.failed and not self.cached and self.api.cache is not None and self.cache_key
+              and self.stats.get('finish_reason') != 'length'):
+            self.api.cache.put(self.cache_key, self.full_response)
+
+    def close(self) -> None:
+        stats, model = self.stats, self.model
+        stats['duration'] = time.perf_counter() - self.started
+        if self.failed and not self.cached:
+            self.api.model_stats.record_failure(model)
+        STREAM_CHUNKS.inc(stats['chunks'], model=model)
+        if stats['completion_tokens']:
+            COMPLETION_TOKENS.inc(stats['completion_tokens'], model=model)
+
+class _Contestant:
+    """A raced model's stop flag and open response, so the race can abandon it from another thread"""
+
+    def __init__(self):
+        self.stop = Event()
+        self.response: Optional[Any] = None
+        self.lock = Lock()
+
+    def attach(self, response: Any) -> bool:
+        """Keep the contestant's response; False if it was cancelled meanwhile"""
+        with self.lock:
+            self.response = response
+            return not self.stop.is_set()
+
+    def cancel(self) -> None:
+        """Stop the contestant, closing its response to end a read in progress"""
+        with self.lock:
+            self.stop.set()
+            response = self.response
+        if response is not None:
+            abort_response(response)
 
 class ChatAPI:
-    def __init__(self, base_url: str, api_key: str):
+    def __init__(self, base_url: str, api_key: str, session: Optional[requests.Session] = None,
+                 cache: Optional[ResponseCache] = None, model_stats: Optional[ModelLatencyStats] = None,
+                 http2: bool = False):
         self.base_url = base_url
         self.api_key = api_key
-        self.rate_limiter = RateLimiter()
+        # Reused so requests share pooled keep-alive connections, or one HTTP/2 connection with http2
+        self.session = session or create_session(http2=http2)
+        self.cache = cache
+        self.cache_similarity: Optional[float] = None  # Also reuse answers to similar questions when set
+        self.model_stats = model_stats or MODEL_LATENCY
+        self.rate_limiter = RateLimiter()  # Replace with a shared one to limit several clients together
+        self.rate_limit_wait = 0.0  # Seconds make_request waits for a free slot before failing
+        self.rate_limit_per_model = False  # Separate limiter buckets per model instead of per API key
         self.chat_endpoint = f"{base_url}/chat/completions"
         self.models_endpoint = f"{base_url}/models"
+        self.last_stream_stats: Dict[str, Any] = {}
+        self.last_compare_stats: Dict[str, Dict[str, Any]] = {}
 
     @staticmethod
     def retry_with_backoff(max_retries: int = 3, initial_backoff: int = 1, max_backoff: int = 10):
@@ -62,6 +260,13 @@ class ChatAPI:
             return wrapper
         return decorator
 
+    def rate_limit_key(self, model: Optional[str] = None) -> str:
+        """Limiter bucket for this API key, and for the model when limits are per model"""
+        key = hashlib.sha256(self.api_key.encode()).hexdigest()[:16]
+        if model and self.rate_limit_per_model:
+            key = f"{key}:{model}"
+        return key
+
     def get_headers(self, stream: bool = False) -> Dict[str, str]:
         """Get headers for API requests"""
         headers = {
@@ -78,14 +283,16 @@ class ChatAPI:
     def fetch_models(self) -> Dict[str, Any]:
         """Fetch available models from the API"""
         try:
-            if not self.rate_limiter.check_limit():
+            # A bucket of its own, so model list refreshes on every rerun do not use up the chat quota
+            if not self.rate_limiter.check_limit(f"{self.rate_limit_key()}:models"):
                 return {"error": "Rate limit exceeded"}
 
-            response = requests.get(
+            response = self.session.get(
                 self.models_endpoint,
                 headers=self.get_headers(),
                 timeout=15
             )
+            count_wire_bytes(response, len(response.content))
             if response.status_code == 200:
                 return response.json()
             else:
@@ -93,37 +300,98 @@ class ChatAPI:
         except Exception as e:
             return {"error": str(e)}
 
-    def process_stream(self, response: requests.Response) -> Generator[str, None, None]:
-        """Process streaming response from the API"""
+    def process_stream(self, response: requests.Response, stats: Optional[Dict[str, Any]] = None,
+                       stop: Optional[Event] = None) -> Generator[str, None, None]:
+        """Process streaming response from the API
+
+        Stream statistics go to ``stats`` if given, otherwise to ``last_stream_stats``.
+        ``stats['failed']`` is set before an error message is yielded. Once
+        ``stop`` is set the stream ends quietly, without caching the partial answer.
+        """
+        if stats is None:
+            stats = self.last_stream_stats = {}
+        parser = _StreamParser(self, stats, getattr(response, 'model', 'unknown'),
+                               getattr(response, 'request_started', time.perf_counter()),
+                               getattr(response, 'from_cache', False), getattr(response, 'cache_key', None))
+        body = CountingStream(response, stop)
         try:
-            client = sseclient.SSEClient(response)
-            full_response = ""
-            
+            import sseclient  # Imported on first use to keep package import fast
+
+            client = sseclient.SSEClient(body)
             for event in client.events():
                 if event.data == "[DONE]":
+                    body.drain()  # Only the end of the stream is left; reading it frees the connection
                     break
-                    
+                yield from parser.feed(event.data)
+                if parser.failed:
+                    break
+            if stop is not None and stop.is_set():
+                return
+            yield from parser.finish()
+        except Exception as e:
+            if stop is not None and stop.is_set():
+                return  # Aborted from another thread, e.g. by a race already won
+            yield parser.fail(f"\n\nConnection error: {str(e)}")
+        finally:
+            if not parser.cached:
+                count_wire_bytes(response, body.count)
+            parser.close()
+
+    async def stream_async(self, session: 'aiohttp.ClientSession', messages: List[Dict[str, str]], model: str,
+                           temperature: float = 0.7, max_tokens: int = 2000,
+                           stats: Optional[Dict[str, Any]] = None) -> AsyncGenerator[str, None]:
+        """make_request and process_stream for event loops: streams an answer over an aiohttp session
+
+        Nothing blocks the loop, so one process can stream many answers at
+        once. Cached answers are replayed. Statistics go to ``stats`` and
+        errors are yielded as text after ``stats['failed']`` is set, as with
+        process_stream.
+        """
+        if stats is None:
+            stats = {}
+        cache_key = self.cache.make_key(messages, model, temperature) if self.cache is not None else None
+        if cache_key is not None:
+            cached = self.cache.get(cache_key, self.cache_similarity)
+            if cached is not None:
+                for content in self.process_stream(CachedResponse(cached, model), stats):
+                    yield content
+                return
+        parser = _StreamParser(self, stats, model, time.perf_counter(), False, cache_key)
+        if not messages:
+            yield parser.fail("Cannot send empty messages to the API")
+            return
+        if not await self.rate_limiter.acquire_async(self.rate_limit_wait, key=self.rate_limit_key(model)):
+            yield parser.fail("Rate limit exceeded. Please wait a moment before trying again.")
+            return
+        parser.started = time.perf_counter()
+        payload = {"messages": messages, "model": model, "stream": True,
+                   "temperature": temperature, "max_tokens": max_tokens}
+        try:
+            async with session.post(self.chat_endpoint, headers=self.get_headers(stream=True), json=payload) as response:
+                HEADERS_SECONDS.observe(time.perf_counter() - parser.started, model=model)
+                CHAT_REQUESTS.inc(status=response.status, model=model)
+                if response.status != 200:
+                    # parser.close() records the failure, once
+                    yield parser.fail(f"HTTP {response.status}: {(await response.text())[:500]}")
+                    return
+                decoded = 0
                 try:
-                    data = json.loads(event.data)
-                    if data.get('choices') and len(data['choices']) > 0:
-                        content = data['choices'][0].get('delta', {}).get('content', '')
-                        if content:
-                            full_response += content
+                    async for data in iter_sse_data(response.content):
+                        decoded += len(data)
+                        if data == "[DONE]":
+                            break
+                        for content in parser.feed(data):
                             yield content
-                    if data.get('error'):
-                        error_message = data.get('error', {}).get('message', 'Unknown error occurred')
-                        yield f"\n\nError from API: {error_message}"
-                        break
-                except json.JSONDecodeError:
-                    continue
-                except Exception as e:
-                    yield f"\n\nError processing response: {str(e)}"
-                    break
-            
-            if not full_response:
-                yield "I apologize, but I couldn't generate a response. Please try again."
+                        if parser.failed:
+                            break
+                    for content in parser.finish():
+                        yield content
+                finally:
+                    count_aiohttp_wire_bytes(response, decoded)
         except Exception as e:
-            yield f"\n\nConnection error: {str(e)}"
+            yield parser.fail(f"\n\nConnection error: {str(e)}")
+        finally:
+            parser.close()
 
     @retry_with_backoff()
     def make_request(self, 
@@ -131,8 +399,14 @@ class ChatAPI:
                     model: str,
                     temperature: float = 0.7,
                     max_tokens: int = 2000) -> requests.Response:
-        """Make a request to the chat API"""
-        if not self.rate_limiter.check_limit():
+        """Make a request to the chat API, or replay a cached response to the same question"""
+        cache_key = self.cache.make_key(messages, model, temperature) if self.cache is not None else None
+        if cache_key is not None:
+            cached = self.cache.get(cache_key, self.cache_similarity)
+            if cached is not None:
+                return CachedResponse(cached, model)
+        
+        if not self.rate_limiter.acquire(self.rate_limit_wait, key=self.rate_limit_key(model)):
             raise Exception("Rate limit exceeded. Please wait a moment before trying again.")
         
         # Validate messages - if messages is empty, raise exception
@@ -147,13 +421,137 @@ class ChatAPI:
             "max_tokens": max_tokens
         }
         
-        return requests.post(
+        request_started = time.perf_counter()
+        response = self.session.post(
             self.chat_endpoint,
             headers=self.get_headers(stream=True),
             json=payload,
             stream=True,
             timeout=60
         )
+        HEADERS_SECONDS.observe(response.elapsed.total_seconds(), model=model)
+        CHAT_REQUESTS.inc(status=response.status_code, model=model)
+        if response.status_code != 200:
+            self.model_stats.record_failure(model)
+        # Carried on the response so process_stream can attribute stream timings
+        response.request_started = request_started
+        response.model = model
+        response.cache_key = cache_key
+        return response
+
+    def _contestant(self, model: str, messages: List[Dict[str, str]], temperature: float, max_tokens: int,
+                    events: queue.Queue, contestant: '_Contestant') -> None:
+        """Stream one model's answer into events as (model, kind, value, stats) tuples
+
+        An abandoned contestant records no latency: how long it had waited
+        when another model won says nothing about how fast it would have been.
+        """
+        stats: Dict[str, Any] = {'model': model}
+        stop = contestant.stop
+        try:
+            if stop.is_set():
+                return
+            response = self.make_request(messages=messages, model=model, temperature=temperature, max_tokens=max_tokens)
+            if not contestant.attach(response):
+                abort_response(response)  # Cancelled while the request was being sent
+            elif response.status_code != 200:
+                events.put((model, 'error', f"HTTP {response.status_code}: {response.text[:200]}", stats))
+                return
+            else:
+                for content in self.process_stream(response, stats, stop):
+                    if stop.is_set():
+                        break
+                    if stats['failed']:
+                        events.put((model, 'error', content.strip(), stats))
+                        return
+                    events.put((model, 'content', content, stats))
+                if not stop.is_set():
+                    events.put((model, 'end', None, stats))
+        except Exception as e:
+            if not stop.is_set():
+                events.put((model, 'error', str(e), stats))
+
+    def _start_contestants(self, messages: List[Dict[str, str]], models: List[str], temperature: float,
+                           max_tokens: int) -> Tuple[queue.Queue, Dict[str, '_Contestant']]:
+        events: queue.Queue = queue.Queue()
+        contestants = {model: _Contestant() for model in models}
+        for model in models:
+            Thread(target=self._contestant, args=(model, messages, temperature, max_tokens, events, contestants[model]),
+                   name=f"chat-{model}", daemon=True).start()
+        return events, contestants
+
+    def race(self,
+             messages: List[Dict[str, str]],
+             models: List[str],
+             temperature: float = 0.7,
+             max_tokens: int = 2000) -> Generator[str, None, None]:
+        """Send the request to several models at once and stream whichever answers first
+
+        The other requests are abandoned once one model has produced content.
+        ``last_stream_stats['model']`` names the winner.
+        """
+        if not models:
+            raise ValueError("No models to race")
+        events, contestants = self._start_contestants(messages, models, temperature, max_tokens)
+        self.last_stream_stats = {'model': None, 'chunks': 0, 'ttft': None, 'completion_tokens': None}
+        winner = None
+        failures: Dict[str, str] = {}
+        try:
+            while True:
+                model, kind, value, stats = events.get()
+                if winner is None:
+                    if kind != 'content':
+                        failures[model] = value or "Empty response"
+                        if len(failures) == len(models):
+                            yield "\n\nAll models failed: " + "; ".join(f"{name}: {error}" for name, error in failures.items())
+                            return
+                        continue
+                    winner = model
+                    for other, contestant in contestants.items():
+                        if other != winner:
+                            contestant.cancel()
+                    self.last_stream_stats = stats
+                    stats['race'] = {'models': list(models), 'failures': failures}
+                if model != winner:
+                    continue
+                if kind == 'content':
+                    yield value
+                else:
+                    if kind == 'error':
+                        yield f"\n\n{value}"
+                    break
+        finally:
+            for contestant in contestants.values():
+                contestant.cancel()
+
+    def compare(self,
+                messages: List[Dict[str, str]],
+                models: List[str],
+                temperature: float = 0.7,
+                max_tokens: int = 2000) -> Generator[Tuple[str, str], None, None]:
+        """Stream the request from several models at once as (model, content) pairs
+
+        Errors are yielded as content of the failing model. Per-model stream
+        statistics are kept in ``last_compare_stats``.
+        """
+        if not models:
+            raise ValueError("No models to compare")
+        events, contestants = self._start_contestants(messages, models, temperature, max_tokens)
+        self.last_compare_stats = {}
+        finished = 0
+        try:
+            while finished < len(models):
+                model, kind, value, stats = events.get()
+                self.last_compare_stats[model] = stats
+                if kind == 'content':
+                    yield model, value
+                    continue
+                finished += 1
+                if kind == 'error':
+                    yield model, f"\n\nError: {value}"
+        finally:
+            for contestant in contestants.values():
+                contestant.cancel()
 
 class ChatManager:
     def __init__(self, api: ChatAPI):
@@ -0,0 +1,233 @@
+from typing import List, Dict, Optional, Any, Set, Tuple, Iterable, TYPE_CHECKING
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from .content import CompressedText
+from .crawler import CrawlResult
+from .metrics import REGISTRY
+
+if TYPE_CHECKING:
+    from .crawler import AsyncWebCrawler
+
+CHECKPOINT_SECONDS = REGISTRY.histogram("crawl_checkpoint_seconds", "Time to write a crawl checkpoint")
+CHECKPOINT_ROWS = REGISTRY.counter("crawl_checkpoint_rows_total", "Pages and visited URLs written to crawl checkpoints")
+RESTORED_PAGES = REGISTRY.counter("crawl_checkpoint_restored_pages_total", "Crawled pages restored from checkpoints")
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS crawl_jobs (job_id TEXT PRIMARY KEY, owner TEXT NOT NULL, seeds TEXT NOT NULL, "
+    "options TEXT NOT NULL, state TEXT NOT NULL, error TEXT, created REAL NOT NULL, updated REAL NOT NULL)",
+    # Text stays in its compressed chunks: chunk_sizes splits the concatenated chunks again
+    "CREATE TABLE IF NOT EXISTS crawl_pages (job_id TEXT NOT NULL, host TEXT NOT NULL, seq INTEGER NOT NULL, "
+    "url TEXT NOT NULL, title TEXT, status_code INTEGER, fingerprint TEXT, source_hash TEXT, extracted INTEGER, "
+    "codec TEXT, chunk_chars INTEGER, length INTEGER, chunk_sizes TEXT, chunks BLOB, PRIMARY KEY (job_id, host, seq))",
+    "CREATE TABLE IF NOT EXISTS crawl_visited (job_id TEXT NOT NULL, host TEXT NOT NULL, url TEXT NOT NULL, "
+    "PRIMARY KEY (job_id, host, url)) WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS crawl_frontiers (job_id TEXT NOT NULL, host TEXT NOT NULL, processed INTEGER NOT NULL, "
+    "queued TEXT NOT NULL, prefix_counts TEXT NOT NULL, updated REAL NOT NULL, PRIMARY KEY (job_id, host))",
+)
+
+async def checkpoint_write(write: Any, *args: Any) -> None:
+    """Run a checkpoint write in a thread, waiting for it to finish even if the caller is cancelled
+
+    A cancelled ``asyncio.to_thread`` call leaves its thread running, so the
+    write could land after the job's rows were deleted and leave orphans.
+    """
+    task = asyncio.ensure_future(asyncio.to_thread(write, *args))
+    try:
+        await asyncio.shield(task)
+    except asyncio.CancelledError:
+        await task
+        raise
+
+class CrawlCheckpoint:
+    """Progress of crawl jobs in an SQLite file, so an interrupted job can resume where it stopped
+
+    For each site of a job it keeps the URLs already visited, the pages found
+    (text still compressed) and the frontier of URLs waiting to be fetched.
+    Pages and visited URLs are appended as the crawl goes; the frontier is
+    replaced. A job's rows are deleted once its results are collected.
+    """
+
+    def __init__(self, path: str, timeout: float = 10.0):
+        self.path = path
+        self.timeout = timeout
+        self.local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connection()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")  # WAL stays consistent; a power cut may lose the last save
+            for statement in _SCHEMA:
+                connection.execute(statement)
+            self.local.connection = connection
+        return connection
+
+    def save_job(self, job_id: str, owner: str, seeds: List[str], options: Dict[str, Any]) -> None:
+        """Record a job's seeds and options, which ``job`` returns for resuming it"""
+        now = time.time()
+        self._connection().execute(
+            "INSERT INTO crawl_jobs (job_id, owner, seeds, options, state, created, updated) "
+            "VALUES (?, ?, ?, ?, 'running', ?, ?) ON CONFLICT (job_id) DO UPDATE SET "
+            "owner = excluded.owner, options = excluded.options, state = 'running', error = NULL, updated = ?",
+            (job_id, owner, json.dumps(seeds), json.dumps(options), now, now, now))
+
+    def set_state(self, job_id: str, state: str, error: Optional[str] = None) -> None:
+        self._connection().execute("UPDATE crawl_jobs SET state = ?, error = ?, updated = ? WHERE job_id = ?",
+                                   (state, error, time.time(), job_id))
+
+    def job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """A saved job's owner, seeds, options and state, or None"""
+        jobs = self.jobs(job_id=job_id)
+        return jobs[0] if jobs else None
+
+    def jobs(self, owner: Optional[str] = None, job_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Saved jobs, newest first, with the number of pages found so far"""
+        query = ("SELECT job_id, owner, seeds, options, state, error, created, updated, "
+                 "(SELECT COUNT(*) FROM crawl_pages p WHERE p.job_id = j.job_id) FROM crawl_jobs j")
+        conditions, params = [], []
+        for column, value in (("owner", owner), ("job_id", job_id)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        rows = self._connection().execute(query + " ORDER BY updated DESC", params).fetchall()
+        return [{"job_id": row[0], "owner": row[1], "seeds": json.loads(row[2]), "options": json.loads(row[3]),
+                 "state": row[4], "error": row[5], "created": row[6], "updated": row[7], "pages": row[8]}
+                for row in rows]
+
+    def delete(self, job_id: str) -> None:
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            for table in ("crawl_jobs", "crawl_pages", "crawl_visited", "crawl_frontiers"):
+                connection.execute(f"DELETE FROM {table} WHERE job_id = ?", (job_id,))
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def write_site(self, job_id: str, host: str, pages: List[tuple], visited: List[str], processed: int,
+                   queued: List[tuple], prefix_counts: Dict[str, int]) -> None:
+        """Append a site's new pages and visited URLs and replace its frontier, in one transaction"""
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.executemany(
+                "INSERT OR REPLACE INTO crawl_pages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(job_id, host, *page) for page in pages])
+            connection.executemany("INSERT OR IGNORE INTO crawl_visited VALUES (?, ?, ?)",
+                                   [(job_id, host, url) for url in visited])
+            now = time.time()
+            connection.execute("INSERT OR REPLACE INTO crawl_frontiers VALUES (?, ?, ?, ?, ?, ?)",
+                               (job_id, host, processed, json.dumps(queued), json.dumps(prefix_counts), now))
+            connection.execute("UPDATE crawl_jobs SET updated = ? WHERE job_id = ?", (now, job_id))
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        CHECKPOINT_ROWS.inc(len(pages), kind="page")
+        CHECKPOINT_ROWS.inc(len(visited), kind="visited")
+
+    def read_site(self, job_id: str, host: str) -> Optional[Dict[str, Any]]:
+        """A site's saved state, or None if it has never been checkpointed"""
+        connection = self._connection()
+        frontier = connection.execute("SELECT processed, queued, prefix_counts FROM crawl_frontiers "
+                                      "WHERE job_id = ? AND host = ?", (job_id, host)).fetchone()
+        if frontier is None:
+            return None
+        results, extracted = [], set()
+        for (url, title, status_code, fingerprint, source_hash, was_extracted, codec, chunk_chars, length,
+             chunk_sizes, chunks) in connection.execute(
+                "SELECT url, title, status_code, fingerprint, source_hash, extracted, codec, chunk_chars, length, "
+                "chunk_sizes, chunks FROM crawl_pages WHERE job_id = ? AND host = ? ORDER BY seq", (job_id, host)):
+            parts, offset = [], 0
+            for size in map(int, filter(None, chunk_sizes.split(','))):
+                parts.append(chunks[offset:offset + size])
+                offset += size
+            text = CompressedText.from_chunks(parts, length, chunk_chars, codec)
+            results.append(CrawlResult(url, title, text, status_code, fingerprint=fingerprint, source_hash=source_hash))
+            if was_extracted:
+                extracted.add(url)
+        visited = {url for (url,) in connection.execute(
+            "SELECT url FROM crawl_visited WHERE job_id = ? AND host = ?", (job_id, host))}
+        return {"processed": frontier[0], "queued": json.loads(frontier[1]), "prefix_counts": json.loads(frontier[2]),
+                "results": results, "extracted": extracted, "visited": visited}
+
+    def site(self, job_id: str, host: str) -> 'SiteCheckpoint':
+        return SiteCheckpoint(self, job_id, host)
+
+class SiteCheckpoint:
+    """One site's crawl within a job, saved while it runs
+
+    The crawler saves whenever fetches have finished since the last save,
+    one write at a time; a save appends only what is new and takes a few
+    milliseconds. Pages still being fetched are saved as queued, so a
+    resumed crawl refetches at most the requests that were in flight when
+    it was interrupted.
+    """
+
+    def __init__(self, store: CrawlCheckpoint, job_id: str, host: str):
+        self.store = store
+        self.job_id = job_id
+        self.host = host
+        self.saved_results = 0
+        self.saved_visited: Set[str] = set()
+
+    async def restore(self, crawler: 'AsyncWebCrawler') -> bool:
+        """Load the saved state into a crawler reset for a new run; False if there is none"""
+        state = await asyncio.to_thread(self.store.read_site, self.job_id, self.host)
+        if state is None:
+            return False
+        crawler.results.extend(state["results"])
+        crawler.extracted.update(state["extracted"])
+        crawler.visited.update(state["visited"])
+        crawler.processed = state["processed"]
+        crawler.frontier.restore(state["queued"], state["visited"])
+        if crawler.link_filter is not None:
+            crawler.link_filter.admitted.update(state["visited"])
+            crawler.link_filter.admitted.update(url for url, *_ in state["queued"])
+            crawler.link_filter.prefix_counts.update(state["prefix_counts"])
+        self.saved_results = len(state["results"])
+        self.saved_visited = set(state["visited"])
+        RESTORED_PAGES.inc(len(state["results"]))
+        return True
+
+    async def save(self, crawler: 'AsyncWebCrawler', in_flight: Iterable[Tuple[str, int]] = ()) -> None:
+        """Write what changed since the last save"""
+        await self.write(self.snapshot(crawler, in_flight))
+
+    def snapshot(self, crawler: 'AsyncWebCrawler', in_flight: Iterable[Tuple[str, int]] = ()) -> Dict[str, Any]:
+        """The rows a save writes, gathered on the event loop while the crawl is in a consistent state
+
+        ``in_flight`` are the (url, depth) pairs being fetched, which count as
+        queued rather than visited until their page is in the results.
+        """
+        started = time.perf_counter()
+        in_flight = list(in_flight)
+        fetching = {url for url, _ in in_flight}
+        pages = [(seq, result.url, result.title, result.status_code, result.fingerprint, result.source_hash,
+                  result.url in crawler.extracted, result.text.codec, result.text.chunk_chars, len(result.text),
+                  ','.join(str(len(chunk)) for chunk in result.text.chunks), b''.join(result.text.chunks))
+                 for seq, result in enumerate(crawler.results[self.saved_results:], self.saved_results)]
+        visited = list(crawler.visited - self.saved_visited - fetching)
+        queued = crawler.frontier.queued() + [(url, depth, 0, []) for url, depth in in_flight]
+        link_filter = crawler.link_filter
+        prefix_counts = dict(link_filter.prefix_counts) if link_filter is not None else {}
+        return {"pages": pages, "visited": visited, "processed": crawler.processed, "queued": queued,
+                "prefix_counts": prefix_counts, "started": started}
+
+    async def write(self, snapshot: Dict[str, Any]) -> None:
+        """Write a snapshot off the event loop; one write at a time, in the order they were taken"""
+        await checkpoint_write(self.store.write_site, self.job_id, self.host, snapshot["pages"], snapshot["visited"],
+                               snapshot["processed"], snapshot["queued"], snapshot["prefix_counts"])
+        self.saved_results += len(snapshot["pages"])
+        self.saved_visited.update(snapshot["visited"])
+        CHECKPOINT_SECONDS.observe(time.perf_counter() - snapshot["started"])
@@ -0,0 +1,120 @@
+from typing import Callable, Dict, Iterable, Optional, Tuple, Union
+import zlib
+from .metrics import REGISTRY
+
+try:
+    import zstandard
+except ImportError:  # Optional: zlib is used without it
+    zstandard = None
+
+CONTENT_BYTES = REGISTRY.counter("content_stored_bytes_total", "Page text stored, as UTF-8 and after compression")
+CHUNKS_INFLATED = REGISTRY.counter("content_chunks_inflated_total", "Compressed text chunks decompressed")
+
+def _zstd_compress(data: bytes) -> bytes:
+    return zstandard.ZstdCompressor(level=3).compress(data)
+
+def _zstd_decompress(data: bytes) -> bytes:
+    return zstandard.ZstdDecompressor().decompress(data)
+
+CODECS: Dict[str, Tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]] = {
+    "zlib": (lambda data: zlib.compress(data, 6), zlib.decompress),
+}
+if zstandard is not None:
+    CODECS["zstd"] = (_zstd_compress, _zstd_decompress)
+DEFAULT_CODEC = "zstd" if zstandard is not None else "zlib"
+
+class CompressedText:
+    """Immutable text stored as separately compressed UTF-8 chunks
+
+    The length is known without decompressing, and slicing inflates only
+    the chunks the slice covers, so a preview or a prompt excerpt of a long
+    page costs one chunk. ``str()`` gives the whole text.
+    """
+    __slots__ = ('chunks', 'length', 'chunk_chars', 'codec', '_last')
+
+    def __init__(self, text: str = "", chunk_chars: int = 16384, codec: Optional[str] = None):
+        self.chunk_chars = chunk_chars
+        self.codec = codec or DEFAULT_CODEC
+        compress = CODECS[self.codec][0]
+        chunks = []
+        text_bytes = 0
+        for start in range(0, len(text), chunk_chars):
+            data = text[start:start + chunk_chars].encode('utf-8', 'surrogatepass')
+            text_bytes += len(data)
+            chunks.append(compress(data))
+        self.chunks = tuple(chunks)
+        self.length = len(text)
+        self._last: Tuple[int, str] = (-1, "")  # Most recently inflated chunk, for runs of small slices
+        CONTENT_BYTES.inc(text_bytes, form="text")
+        CONTENT_BYTES.inc(self.compressed_size, form="compressed")
+
+    @classmethod
+    def from_chunks(cls, chunks: Iterable[bytes], length: int, chunk_chars: int, codec: str) -> 'CompressedText':
+        """Wrap chunks compressed earlier, e.g. memoryviews of a corpus snapshot, without copying them"""
+        if codec not in CODECS:
+            raise ValueError(f"Text is {codec}-compressed, but the {codec} codec is not available")
+        text = cls.__new__(cls)
+        text.chunks = tuple(chunks)
+        text.length = length
+        text.chunk_chars = chunk_chars
+        text.codec = codec
+        text._last = (-1, "")
+        return text
+
+    @property
+    def compressed_size(self) -> int:
+        return sum(len(chunk) for chunk in self.chunks)
+
+    def _inflate(self, index: int) -> str:
+        CHUNKS_INFLATED.inc()
+        return CODECS[self.codec][1](self.chunks[index]).decode('utf-8', 'surrogatepass')
+
+    def _chunk(self, index: int) -> str:
+        last = self._last
+        if last[0] != index:
+            last = self._last = (index, self._inflate(index))
+        return last[1]
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __bool__(self) -> bool:
+        return self.length > 0
+
+    def __str__(self) -> str:
+        return ''.join(self._inflate(index) for index in range(len(self.chunks)))
+
+    def __getitem__(self, key: Union[int, slice]) -> str:
+        if isinstance(key, int):
+            if key < 0:
+                key += self.length
+            if not 0 <= key < self.length:
+                raise IndexError("CompressedText index out of range")
+            return self._chunk(key // self.chunk_chars)[key % self.chunk_chars]
+        start, stop, step = key.indices(self.length)
+        if step != 1:
+            return str(self)[key]
+        if start >= stop:
+            return ""
+        first, last = start // self.chunk_chars, (stop - 1) // self.chunk_chars
+        text = ''.join(self._chunk(index) for index in range(first, last + 1))
+        offset = first * self.chunk_chars
+        return text[start - offset:stop - offset]
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, CompressedText):
+            if (self.codec, self.chunk_chars) == (other.codec, other.chunk_chars):
+                return self.length == other.length and self.chunks == other.chunks
+            other = str(other)
+        if isinstance(other, str):
+            return self.length == len(other) and str(self) == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"<CompressedText {self.length} chars in {len(self.chunks)} {self.codec} chunks, {self.compressed_size} bytes>"
+
+def compress_text(text: Union[str, CompressedText]) -> CompressedText:
+    """Compressed form of text; already compressed text is returned as is"""
+    return text if isinstance(text, CompressedText) else CompressedText(text)
\ No newline at end of file
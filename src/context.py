@@ -0,0 +1,61 @@
+from typing import List, Dict, Any, Optional
+
+def prepare_crawled_content(documents: List[Dict[str, Any]], max_chars: int = 10000) -> str:
+    """Prepare crawled content for inclusion in the system prompt"""
+    if not documents:
+        return ""
+    
+    content_parts = []
+    total_chars = 0
+    
+    content_parts.append("\n\n### REFERENCE CONTENT ###\n")
+    content_parts.append("Use the following information to answer the user's questions:\n\n")
+    
+    for idx, item in enumerate(documents):
+        title = item.get('title', f"Document {idx+1}")
+        url = item.get('url', 'No URL')
+        content = item.get('content', '')
+        
+        # Calculate how many characters we can include from this document
+        remaining_chars = max_chars - total_chars
+        if remaining_chars <= 0:
+            break
+            
+        # Truncate the content if needed
+        excerpt = content[:min(len(content), remaining_chars)]
+        total_chars += len(excerpt) + 100  # Add buffer for the formatting
+        
+        content_parts.append(f"--- {title} ---\n")
+        if url != "uploaded_file":
+            content_parts.append(f"Source: {url}\n")
+        content_parts.append(f"{excerpt}\n\n")
+    
+    if total_chars >= max_chars:
+        content_parts.append("(Note: Some content was truncated due to length limits)\n")
+        
+    return "".join(content_parts)
+
+class ReferenceContent:
+    """Reference block for the system prompt, rebuilt only when the document list changes
+
+    The list is compared by identity and length, so replacing it or adding
+    and removing documents triggers a rebuild; call ``invalidate`` after
+    editing a document in place.
+    """
+
+    def __init__(self, max_chars: int = 10000):
+        self.max_chars = max_chars
+        self.documents: Optional[List[Dict[str, Any]]] = None
+        self.count = 0
+        self.text = ""
+
+    def invalidate(self) -> None:
+        self.documents = None
+
+    def update(self, documents: List[Dict[str, Any]]) -> str:
+        """Return the block for documents, rebuilding it if the list changed since the last call"""
+        if documents is not self.documents or len(documents) != self.count:
+            self.text = prepare_crawled_content(documents, self.max_chars)
+            self.documents = documents
+            self.count = len(documents)
+        return self.text
\ No newline at end of file
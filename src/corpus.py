@@ -0,0 +1,328 @@
+from typing import List, Dict, Optional, Any, Tuple, Iterator
+from array import array
+from collections.abc import Sequence
+from itertools import chain
+import argparse
+import datetime
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import time
+from .content import CompressedText, DEFAULT_CODEC, compress_text
+from .retrieval import RetrievalIndex, Passage
+from .metrics import REGISTRY
+
+CORPUS_OPEN_SECONDS = REGISTRY.histogram("corpus_open_seconds", "Opening a corpus snapshot and listing its documents")
+
+MAGIC = b"AICORPUS"
+VERSION = 1
+
+# All integers little-endian. The header is followed by fixed-size record tables and
+# a heap of UTF-8 strings and compressed text chunks; records point into the heap
+# with absolute file offsets, so any document or term is read without parsing the rest.
+_HEADER = struct.Struct('<8sHH5I2Id8sQI7Q')
+_DOCUMENT = struct.Struct('<QIQIIIQ')  # url offset/length, title offset/length, first chunk, chunk count, characters
+_CHUNK = struct.Struct('<QI')  # offset, length
+_PASSAGE = struct.Struct('<III')  # document, start, end (characters)
+_TERM = struct.Struct('<QIQI')  # term offset/length, first posting, posting count
+_POSTING = struct.Struct('<II')  # passage, term count
+_LENGTH = struct.Struct('<I')
+
+class _Heap:
+    """Appends byte strings and returns their absolute offsets"""
+
+    def __init__(self, start: int):
+        self.start = start
+        self.parts: List[bytes] = []
+        self.size = 0
+
+    def add(self, data: bytes) -> Tuple[int, int]:
+        offset = self.start + self.size
+        self.parts.append(data)
+        self.size += len(data)
+        return offset, len(data)
+
+def save_corpus(path: str, documents: List[Dict[str, Any]], index: Optional[RetrievalIndex] = None,
+                metadata: Optional[Dict[str, Any]] = None, chunk_chars: int = 1200, overlap: int = 200) -> int:
+    """Write documents, their passages and a BM25 index to a snapshot file; returns its size in bytes
+
+    The index is built unless one over the same documents is given. Text
+    already held as CompressedText is stored as is, without recompressing.
+    """
+    if index is None:
+        index = RetrievalIndex(documents, chunk_chars, overlap)
+    text_chunk_chars = 16384
+    texts = []
+    for document in documents:
+        text = compress_text(document.get('content', ''))
+        if text.codec != DEFAULT_CODEC or text.chunk_chars != text_chunk_chars:
+            text = CompressedText(str(text), text_chunk_chars)
+        texts.append(text)
+    chunk_count = sum(len(text.chunks) for text in texts)
+    terms = sorted(index.postings)
+    posting_count = sum(len(postings) for postings in index.postings.values())
+
+    documents_offset = _HEADER.size
+    chunks_offset = documents_offset + _DOCUMENT.size * len(documents)
+    passages_offset = chunks_offset + _CHUNK.size * chunk_count
+    lengths_offset = passages_offset + _PASSAGE.size * len(index.passages)
+    terms_offset = lengths_offset + _LENGTH.size * len(index.lengths)
+    postings_offset = terms_offset + _TERM.size * len(terms)
+    heap_offset = postings_offset + _POSTING.size * posting_count
+    heap = _Heap(heap_offset)
+
+    metadata = {"created": datetime.datetime.now().isoformat(timespec='seconds'), **(metadata or {})}
+    metadata_offset, metadata_length = heap.add(json.dumps(metadata).encode('utf-8'))
+    document_records, chunk_records = [], []
+    for document, text in zip(documents, texts):
+        url = heap.add(str(document.get('url', '')).encode('utf-8'))
+        title = heap.add(str(document.get('title', '')).encode('utf-8'))
+        document_records.append(_DOCUMENT.pack(*url, *title, len(chunk_records), len(text.chunks), len(text)))
+        chunk_records.extend(_CHUNK.pack(*heap.add(bytes(chunk))) for chunk in text.chunks)
+    term_records = []
+    posting_values = array('I')  # (passage, count) pairs, flattened
+    for term in terms:
+        postings = index.postings[term]
+        term_records.append(_TERM.pack(*heap.add(term.encode('utf-8')), len(posting_values) // 2, len(postings)))
+        posting_values.extend(chain.from_iterable(postings))
+    lengths = array('I', index.lengths)
+    if sys.byteorder != 'little':
+        posting_values.byteswap()
+        lengths.byteswap()
+
+    header = _HEADER.pack(MAGIC, VERSION, 0, len(documents), chunk_count, len(index.passages), len(terms),
+                          text_chunk_chars, index.chunk_chars, index.overlap, index.average_length,
+                          texts[0].codec.encode() if texts else DEFAULT_CODEC.encode(),
+                          metadata_offset, metadata_length, documents_offset, chunks_offset, passages_offset,
+                          lengths_offset, terms_offset, postings_offset, heap_offset)
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(header)
+            for records in (document_records, chunk_records):
+                f.write(b''.join(records))
+            f.write(b''.join(_PASSAGE.pack(*passage) for passage in index.passages))
+            f.write(lengths.tobytes())
+            f.write(b''.join(term_records))
+            f.write(posting_values.tobytes())
+            f.writelines(heap.parts)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    return heap_offset + heap.size
+
+class _PassageTable(Sequence):
+    """Passage records read from the snapshot on access"""
+
+    def __init__(self, corpus: 'Corpus'):
+        self.corpus = corpus
+
+    def __len__(self) -> int:
+        return self.corpus.passage_count
+
+    def __getitem__(self, passage_id: int) -> Passage:
+        if not 0 <= passage_id < self.corpus.passage_count:
+            raise IndexError("passage index out of range")
+        return Passage(*_PASSAGE.unpack_from(self.corpus.mmap, self.corpus.passages_offset + passage_id * _PASSAGE.size))
+
+class _TermTable:
+    """Postings by term, found by binary search over the sorted term records"""
+
+    def __init__(self, corpus: 'Corpus'):
+        self.corpus = corpus
+        self.found: Dict[str, Optional[List[Tuple[int, int]]]] = {}
+
+    def _record(self, position: int) -> Tuple[int, int, int, int]:
+        return _TERM.unpack_from(self.corpus.mmap, self.corpus.terms_offset + position * _TERM.size)
+
+    def get(self, term: str, default: Any = None) -> Any:
+        if term not in self.found:
+            self.found[term] = self._lookup(term.encode('utf-8'))
+        postings = self.found[term]
+        return default if postings is None else postings
+
+    def _lookup(self, key: bytes) -> Optional[List[Tuple[int, int]]]:
+        data = self.corpus.mmap
+        low, high = 0, self.corpus.term_count
+        while low < high:
+            middle = (low + high) // 2
+            offset, length, first, count = self._record(middle)
+            term = data[offset:offset + length]
+            if term == key:
+                start = self.corpus.postings_offset + first * _POSTING.size
+                return list(_POSTING.iter_unpack(data[start:start + count * _POSTING.size]))
+            if term < key:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def __len__(self) -> int:
+        return self.corpus.term_count
+
+class MappedRetrievalIndex(RetrievalIndex):
+    """BM25 index read from a corpus snapshot instead of built from the documents
+
+    Passages and postings are read from the memory map when used; only the
+    passage lengths are loaded up front.
+    """
+
+    def __init__(self, corpus: 'Corpus', k1: float = 1.5, b: float = 0.75):
+        self.documents = corpus.documents()
+        self.chunk_chars = corpus.passage_chars
+        self.overlap = corpus.passage_overlap
+        self.k1 = k1
+        self.b = b
+        self.passages = _PassageTable(corpus)
+        lengths = array('I')
+        lengths.frombytes(corpus.mmap[corpus.lengths_offset:corpus.lengths_offset + corpus.passage_count * _LENGTH.size])
+        if sys.byteorder != 'little':
+            lengths.byteswap()
+        self.lengths = lengths
+        self.postings = _TermTable(corpus)
+        self.average_length = corpus.average_length
+
+class Corpus:
+    """Read-only, memory-mapped corpus snapshot written by save_corpus
+
+    Opening reads only the header. Documents are listed on first use, with
+    their text left compressed in the mapped file, and the retrieval index
+    reads postings for just the query terms. Several processes can map the
+    same file and share its pages.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.mmap) < _HEADER.size or self.mmap[:len(MAGIC)] != MAGIC:
+            self.mmap.close()
+            raise ValueError(f"{path} is not a corpus snapshot")
+        (_, version, _, self.document_count, self.chunk_count, self.passage_count, self.term_count,
+         self.text_chunk_chars, self.passage_chars, self.passage_overlap, self.average_length, codec,
+         self.metadata_offset, self.metadata_length, self.documents_offset, self.chunks_offset,
+         self.passages_offset, self.lengths_offset, self.terms_offset, self.postings_offset,
+         self.heap_offset) = _HEADER.unpack_from(self.mmap)
+        if version != VERSION:
+            self.mmap.close()
+            raise ValueError(f"{path} is a version {version} corpus snapshot; version {VERSION} is supported")
+        self.codec = codec.rstrip(b'\0').decode()
+        self.view = memoryview(self.mmap)
+        self._documents: Optional[List[Dict[str, Any]]] = None
+        self._index: Optional[MappedRetrievalIndex] = None
+
+    def __len__(self) -> int:
+        return self.document_count
+
+    def __enter__(self) -> 'Corpus':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _string(self, offset: int, length: int) -> str:
+        return self.mmap[offset:offset + length].decode('utf-8')
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        return json.loads(self._string(self.metadata_offset, self.metadata_length))
+
+    def document(self, position: int) -> Dict[str, Any]:
+        """One document as a crawled_data dict; its content is CompressedText over the mapped file"""
+        if not 0 <= position < self.document_count:
+            raise IndexError("document index out of range")
+        url_offset, url_length, title_offset, title_length, first_chunk, chunk_count, length = \
+            _DOCUMENT.unpack_from(self.mmap, self.documents_offset + position * _DOCUMENT.size)
+        chunks = []
+        for chunk in range(first_chunk, first_chunk + chunk_count):
+            offset, size = _CHUNK.unpack_from(self.mmap, self.chunks_offset + chunk * _CHUNK.size)
+            chunks.append(self.view[offset:offset + size])
+        return {
+            'url': self._string(url_offset, url_length),
+            'title': self._string(title_offset, title_length),
+            'content': CompressedText.from_chunks(chunks, length, self.text_chunk_chars, self.codec)
+        }
+
+    def documents(self) -> List[Dict[str, Any]]:
+        """Every document, listed once and then reused"""
+        if self._documents is None:
+            with CORPUS_OPEN_SECONDS.time():
+                self._documents = [self.document(position) for position in range(self.document_count)]
+        return self._documents
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self.documents())
+
+    @property
+    def index(self) -> MappedRetrievalIndex:
+        if self._index is None:
+            self._index = MappedRetrievalIndex(self)
+        return self._index
+
+    def search(self, query: str, top_k: int = 5) -> List[Tuple[float, Passage]]:
+        return self.index.search(query, top_k)
+
+    def context_documents(self, query: str, top_k: int = 8) -> List[Dict[str, Any]]:
+        return self.index.context_documents(query, top_k)
+
+    def close(self) -> None:
+        """Unmap the file, or leave that to garbage collection while its documents are still in use"""
+        self._documents = self._index = None
+        self.view.release()
+        try:
+            self.mmap.close()
+        except BufferError:
+            pass
+
+def open_corpus(path: str) -> Corpus:
+    return Corpus(path)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Save crawled pages and documents as a corpus snapshot, or describe one")
+    commands = parser.add_subparsers(dest='command', required=True)
+    save = commands.add_parser('save', help="Write a snapshot")
+    save.add_argument('output')
+    save.add_argument('-d', '--documents', action='append', default=[],
+                      help="JSON/JSONL documents or a .txt/.md/.pdf file (repeatable)")
+    save.add_argument('--crawl', action='append', default=[], help="URL to crawl for documents (repeatable)")
+    save.add_argument('--depth', type=int, default=2)
+    save.add_argument('--max-pages', type=int, default=50)
+    save.add_argument('--name', help="Name stored in the snapshot metadata")
+    info = commands.add_parser('info', help="Describe a snapshot")
+    info.add_argument('path')
+    args = parser.parse_args(argv)
+
+    if args.command == 'info':
+        started = time.perf_counter()
+        with Corpus(args.path) as corpus:
+            documents = len(corpus.documents())
+            opened = time.perf_counter() - started
+            print(json.dumps({"documents": documents, "passages": corpus.passage_count, "terms": corpus.term_count,
+                              "bytes": os.path.getsize(args.path), "codec": corpus.codec,
+                              "open_ms": round(opened * 1000, 3), "metadata": corpus.metadata}, indent=2))
+        return 0
+
+    from .batch import load_documents
+    documents = load_documents(args.documents)
+    metadata: Dict[str, Any] = {"name": args.name} if args.name else {}
+    if args.crawl:
+        import asyncio
+        from .jobs import CrawlJob
+        job = CrawlJob(args.crawl, max_depth=args.depth, max_pages=args.max_pages)
+        results = asyncio.run(job.run())
+        documents.extend({'url': result.url, 'title': result.title, 'content': result.text} for result in results)
+        metadata["boilerplate"] = {host: sorted(hashes) for host, hashes in job.boilerplate.items()}
+    if not documents:
+        parser.error("no documents: give --documents or --crawl")
+    size = save_corpus(args.output, documents, metadata=metadata)
+    print(json.dumps({"documents": len(documents), "bytes": size, "path": args.output}))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
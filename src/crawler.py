@@ -1,24 +1,119 @@
-from typing import List, Dict, Optional, Any
-import aiohttp
+from typing import List, Dict, Optional, Any, Tuple, Union, TYPE_CHECKING
 import asyncio
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
+from urllib.parse import urljoin, urlparse, urldefrag
 import time
 import re
-from dataclasses import dataclass
-import streamlit as st
+import hashlib
+from .content import CompressedText, compress_text
+from .dedup import ContentDeduplicator, normalize_block
+from .frontier import CrawlFrontier
+from .linkfilter import DEFAULT_LINK_RULES, LinkFilter, LinkRules
+from .resolver import address_guard_trace_config, create_connector, is_ip_literal, is_public_address
+from .structured import extract_structured_text
+from .transport import accept_encoding
+from .throttle import THROTTLED_STATUSES, HostThrottle, parse_retry_after
+from .metrics import REGISTRY, http_trace_config
+
+if TYPE_CHECKING:
+    import aiohttp
+    from .checkpoint import SiteCheckpoint
+
+DOWNLOAD_SECONDS = REGISTRY.histogram("crawler_download_seconds", "Response headers until body fully read")
+PARSE_SECONDS = REGISTRY.histogram("crawler_parse_seconds", "HTML parsing and content extraction per page")
+BYTES_FETCHED = REGISTRY.counter("crawler_bytes_total", "Response body bytes fetched, after decompression")
+WIRE_BYTES = REGISTRY.counter("crawler_wire_bytes_total", "Response body bytes as received, before decompression, by encoding")
+PAGES_FETCHED = REGISTRY.counter("crawler_pages_total", "Fetched pages by HTTP status")
+EXTRACTIONS = REGISTRY.counter("crawler_extractions_total", "Page extractions, reused from the previous crawl or not")
+IN_FLIGHT = REGISTRY.gauge("crawler_in_flight_requests", "Requests currently being fetched")
+FRONTIER_SIZE = REGISTRY.gauge("crawler_frontier_size", "URLs waiting in a crawl frontier")
+
+GONE_STATUSES = (404, 410)  # The only answers that remove a page from an incremental crawl's results
+STRUCTURED_FALLBACK_CHARS = 200  # Pages with less visible text also get their embedded JSON and meta text
+_META_CHARSET_RE = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([a-zA-Z0-9_.:-]+)', re.IGNORECASE)
+
+_URL_RE = re.compile(
+    r'^https?:\/\/'
+    r'(?:(?:[A-Z0-9](?:[A-Z0-9-]{0,61}[A-Z0-9])?\.)+[A-Z]{2,6}\.?|'
+    r'localhost|'
+    r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})'
+    r'(?::\d+)?'
+    r'(?:/?|[/?]\S+)$', re.IGNORECASE)
 
-@dataclass
 class CrawlResult:
-    url: str
-    title: str
-    content: str
-    status_code: int
+    """A crawled page, with its text kept compressed
+
+    ``content`` inflates the whole text; ``text`` is the compressed form,
+    which gives the length and slices without inflating all of it.
+    """
+    __slots__ = ('url', 'title', 'text', 'status_code', 'fingerprint', 'source_hash')
+
+    def __init__(self, url: str, title: str, content: Union[str, CompressedText], status_code: int,
+                 fingerprint: str = "", source_hash: str = ""):
+        self.url = url
+        self.title = title
+        self.text = compress_text(content)
+        self.status_code = status_code
+        self.fingerprint = fingerprint  # SHA-256 of the normalized extracted text
+        self.source_hash = source_hash  # SHA-256 of the raw HTML the text was extracted from
+
+    @property
+    def content(self) -> str:
+        return str(self.text)
+
+    @content.setter
+    def content(self, value: Union[str, CompressedText]) -> None:
+        self.text = compress_text(value)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, CrawlResult):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return (f"CrawlResult(url={self.url!r}, title={self.title!r}, text={self.text!r}, "
+                f"status_code={self.status_code!r})")
+
+def decode_body(body: bytes, charset: Optional[str] = None) -> str:
+    """Page text from its bytes
+
+    Decoded with the Content-Type ``charset``, else a ``<meta>`` charset near
+    the start of the page, else as UTF-8 when it is valid UTF-8, else in the
+    encoding charset_normalizer detects.
+    """
+    if not charset:
+        match = _META_CHARSET_RE.search(body, 0, 4096)
+        charset = match.group(1).decode('ascii') if match else None
+    if charset:
+        try:
+            return body.decode(charset, errors='replace')
+        except LookupError:
+            pass  # Not an encoding Python knows
+    try:
+        return body.decode('utf-8')
+    except UnicodeDecodeError:
+        pass
+    try:
+        from charset_normalizer import from_bytes  # Installed with requests
+        match = from_bytes(body[:65536]).best()
+        if match is not None:
+            return body.decode(match.encoding, errors='replace')
+    except ImportError:
+        pass
+    return body.decode('utf-8', errors='replace')
+
+def content_fingerprint(text: str) -> str:
+    """Fingerprint extracted text, ignoring whitespace-only differences"""
+    return hashlib.sha256(' '.join(text.split()).encode('utf-8')).hexdigest()
 
 class URLValidator:
     @staticmethod
-    def validate(url: str) -> tuple[bool, str]:
-        """Enhanced URL validation with security checks"""
+    def validate(url: str, allow_private: bool = False) -> tuple[bool, str]:
+        """Enhanced URL validation with security checks
+
+        Host names are checked again once resolved, by the crawler's resolver.
+        """
         try:
             result = urlparse(url)
             if not all([result.scheme, result.netloc]):
@@ -27,19 +122,14 @@ class URLValidator:
             if result.scheme not in ['http', 'https']:
                 return False, "Only HTTP(S) protocols are allowed"
             
-            netloc = result.netloc.lower()
-            if any(x in netloc for x in ['localhost', '127.0.0.1', '0.0.0.0']):
-                return False, "Local addresses are not allowed"
+            host = (result.hostname or '').rstrip('.')
+            if not allow_private:
+                if host == 'localhost' or host.endswith('.localhost'):
+                    return False, "Local addresses are not allowed"
+                if is_ip_literal(host) and not is_public_address(host):
+                    return False, "Local addresses are not allowed"
                 
-            url_pattern = re.compile(
-                r'^https?:\/\/'
-                r'(?:(?:[A-Z0-9](?:[A-Z0-9-]{0,61}[A-Z0-9])?\.)+[A-Z]{2,6}\.?|'
-                r'localhost|'
-                r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})'
-                r'(?::\d+)?'
-                r'(?:/?|[/?]\S+)$', re.IGNORECASE)
-            
-            if not url_pattern.match(url):
+            if not _URL_RE.match(url):
                 return False, "URL format is invalid"
                 
             return True, "URL is valid"
@@ -47,40 +137,88 @@ class URLValidator:
             return False, f"URL validation error: {str(e)}"
 
 class AsyncWebCrawler:
-    def __init__(self, max_depth: int = 2, max_pages: int = 50, chunk_size: int = 20):
+    def __init__(self, max_depth: int = 2, max_pages: int = 50, chunk_size: int = 20,
+                 deduplicate: bool = True, topic: Optional[str] = None,
+                 throttle: Optional[HostThrottle] = None, structured_data: bool = True,
+                 link_rules: Optional[LinkRules] = DEFAULT_LINK_RULES, max_concurrency: int = 64,
+                 max_body_bytes: int = 10_000_000):
         self.max_depth = max_depth
         self.max_pages = max_pages
         self.chunk_size = chunk_size
+        self.topic = topic
+        # chunk_size is where each host's request limit starts; it then adapts to the host's responses
+        self.throttle = throttle or HostThrottle(max_concurrency=max(max_concurrency, chunk_size), adaptive=True,
+                                                 initial_concurrency=chunk_size)
+        self.deduplicator = ContentDeduplicator() if deduplicate else None
+        self.structured_data = structured_data
+        self.link_rules = link_rules  # None queues every same-site link
+        self.max_body_bytes = max_body_bytes
+        self.link_filter: Optional[LinkFilter] = None
         self.user_agent = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/91.0.4472.124'
         self.visited: set[str] = set()
         self.results: List[CrawlResult] = []
         self.processed = 0
-        self.queue: List[Dict[str, Any]] = []  # URL queue with depth information
+        self.frontier = CrawlFrontier(topic)
+        self.previous: Dict[str, CrawlResult] = {}  # Results of the last crawl, for incremental mode
+        self.changes: Dict[str, List[str]] = {}
+        self.extracted: set[str] = set()  # URLs extracted in this crawl rather than reused
+        self.gone: set[str] = set()  # URLs fetched in this crawl that answered 404 or 410
+        self.boilerplate: Dict[str, set[int]] = {}  # Each host's boilerplate block hashes, kept for the next crawl
 
-    async def crawl_page(self, url: str, session: aiohttp.ClientSession, timeout: int = 30) -> Dict[str, Any]:
+    async def crawl_page(self, url: str, session: 'aiohttp.ClientSession', timeout: int = 30) -> Dict[str, Any]:
         """Crawl a single page asynchronously"""
         try:
-            async with session.get(url, headers={'User-Agent': self.user_agent}, timeout=timeout) as response:
-                return {
-                    'status_code': response.status,
-                    'content': await response.text() if response.status == 200 else None
-                }
+            async with self.throttle.slot(url) as outcome:
+                IN_FLIGHT.inc()
+                try:
+                    started = time.perf_counter()
+                    headers = {'User-Agent': self.user_agent, 'Accept-Encoding': accept_encoding("aiohttp")}
+                    async with session.get(url, headers=headers, timeout=timeout) as response:
+                        outcome.ttfb = time.perf_counter() - started
+                        outcome.status = response.status
+                        PAGES_FETCHED.inc(status=response.status)
+                        if response.status in THROTTLED_STATUSES:
+                            outcome.retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                        if response.status != 200:
+                            return {'status_code': response.status, 'content': None}
+                        with DOWNLOAD_SECONDS.time():
+                            body = await self.read_body(response)
+                        BYTES_FETCHED.inc(len(body))
+                        # Not response.get_encoding(): it needs the body read by aiohttp itself
+                        return {'status_code': response.status, 'content': decode_body(body, response.charset)}
+                finally:
+                    IN_FLIGHT.dec()
         except Exception as e:
+            PAGES_FETCHED.inc(status="error")
             return {'status_code': 0, 'error': str(e), 'content': None}
 
+    async def read_body(self, response: 'aiohttp.ClientResponse') -> bytes:
+        """Response body, decompressed as it streams in and cut off at max_body_bytes"""
+        chunks = []
+        size = 0
+        async for chunk in response.content.iter_chunked(64 * 1024):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= self.max_body_bytes:
+                break  # Stop reading, so an oversized or maliciously compressed page is never fully inflated
+        body = b''.join(chunks)[:self.max_body_bytes]
+        encoding = response.headers.get('Content-Encoding', 'identity').lower()
+        received = getattr(response.content, 'total_raw_bytes', None)  # aiohttp 3.11+
+        if received is None:
+            received = len(body) if encoding == 'identity' else int(response.headers.get('Content-Length') or 0)
+        WIRE_BYTES.inc(received, encoding=encoding)
+        return body
+
     def update_progress(self, progress_bar: Any, status: Any) -> None:
         """Update the progress bar and status message"""
         self.processed += 1
         progress = min(1.0, self.processed / self.max_pages)
         progress_bar.progress(progress)
         status.write(f"Processed {self.processed}/{self.max_pages} pages. Found {len(self.results)} pages with content.")
-        if progress >= 1.0:
-            time.sleep(0.5)
-            progress_bar.empty()
 
-    async def process_page(self, url: str, depth: int, session: aiohttp.ClientSession, 
+    async def process_page(self, url: str, depth: int, session: 'aiohttp.ClientSession', 
                          progress_bar: Any, status: Any) -> List:
-        """Process a single page and return any new URLs found"""
+        """Process a single page and return any new (url, depth, anchor text) links found"""
         if url in self.visited or len(self.results) >= self.max_pages:
             return []
             
@@ -89,20 +227,55 @@ class AsyncWebCrawler:
         
         response_data = await self.crawl_page(url, session)
         new_urls = []
+        if response_data['status_code'] in GONE_STATUSES:
+            self.gone.add(url)
         
         if response_data['status_code'] == 200 and response_data['content']:
-            soup = BeautifulSoup(response_data['content'], 'html.parser')
-            content_elements = soup.find_all(['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'article', 'section'])
-            content = ' '.join([elem.get_text().strip() for elem in content_elements])
-            title = soup.title.string if soup.title else url.split('/')[-1]
+            from bs4 import BeautifulSoup, SoupStrainer  # Imported on first use; bs4 is slow to import
+
+            html = response_data['content']
+            source_hash = hashlib.sha256(html.encode('utf-8', 'replace')).hexdigest()
+            previous = self.previous.get(url)
             
-            if content.strip():
-                self.results.append(CrawlResult(
-                    url=url,
-                    title=title,
-                    content=content[:500000],  # Limit content size
-                    status_code=response_data['status_code']
-                ))
+            if previous is not None and previous.source_hash == source_hash:
+                # Markup is unchanged since the last crawl: reuse the previous
+                # extraction and only parse the anchors we need for link discovery
+                soup = BeautifulSoup(html, 'html.parser', parse_only=SoupStrainer('a'))
+                result = previous
+                EXTRACTIONS.inc(result="reused")
+            else:
+                parse_start = time.perf_counter()
+                soup = BeautifulSoup(html, 'html.parser')
+                content_elements = soup.find_all(['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'article', 'section'])
+                # One normalized block per line, so boilerplate can be matched block by block
+                blocks = (normalize_block(elem.get_text()) for elem in content_elements)
+                content = '\n'.join(block for block in blocks if block)
+                title = soup.title.string if soup.title else None
+                if self.structured_data and len(content) < STRUCTURED_FALLBACK_CHARS:
+                    # Likely rendered client-side: recover the text from JSON-LD, framework data and meta tags
+                    structured = extract_structured_text(soup)
+                    extra = (normalize_block(block) for block in structured.blocks)
+                    content = '\n'.join(block for block in (content, *extra) if block)
+                    title = title or structured.title
+                title = title or url.split('/')[-1]
+                content = content[:500000]  # Limit content size
+                self.extracted.add(url)
+                EXTRACTIONS.inc(result="extracted")
+                PARSE_SECONDS.observe(time.perf_counter() - parse_start)
+                result = None
+                if content.strip():
+                    result = CrawlResult(
+                        url=url,
+                        title=title,
+                        content=content,
+                        status_code=response_data['status_code'],
+                        fingerprint=content_fingerprint(content),
+                        source_hash=source_hash
+                    )
+            
+            # Concurrent fetches all passed the budget check above, so check again
+            if result is not None and len(self.results) < self.max_pages:
+                self.results.append(result)
                 
                 # Update progress after processing each page with content
                 self.update_progress(progress_bar, status)
@@ -112,44 +285,149 @@ class AsyncWebCrawler:
                 links = soup.find_all('a', href=True)
                 base_domain = urlparse(url).netloc
                 for link in links:
-                    full_url = urljoin(url, link['href'])
-                    # Only follow links within the same domain
-                    if urlparse(full_url).netloc == base_domain and full_url not in self.visited:
-                        new_urls.append((full_url, depth + 1))
+                    full_url = urldefrag(urljoin(url, link['href']))[0]
+                    # Only follow links within the same domain that pass the link rules
+                    if urlparse(full_url).netloc != base_domain:
+                        continue
+                    if self.link_filter is not None:
+                        full_url = self.link_filter.admit(full_url)
+                    if full_url and full_url not in self.visited:
+                        anchor_text = link.get_text(' ', strip=True) or link.get('title', '')
+                        new_urls.append((full_url, depth + 1, anchor_text))
                         
         return new_urls
 
-    async def breadth_first_crawl(self, start_url: str, session: aiohttp.ClientSession, 
-                                progress_bar: Any, status: Any) -> None:
-        """Crawl the website using a breadth-first approach"""
-        # Initialize queue with the starting URL at depth 0
-        queue = [(start_url, 0)]
+    async def best_first_crawl(self, start_urls: List[str], session: 'aiohttp.ClientSession', 
+                               progress_bar: Any, status: Any, checkpoint: Optional['SiteCheckpoint'] = None) -> None:
+        """Crawl the website, fetching the highest-priority frontier URLs first
+
+        As many pages are fetched at once as the host's request limit allows
+        (``chunk_size`` without an adaptive throttle). Each finished fetch is
+        replaced right away by the best queued URL, so one slow response does
+        not hold up the others.
+
+        With a ``checkpoint``, a crawl saved there earlier continues from its
+        frontier instead of the start URLs, and progress is saved as pages come
+        in, one write at a time.
+        """
+        self.frontier = CrawlFrontier(self.topic)
+        if checkpoint is not None and await checkpoint.restore(self):
+            status.write(f"⏯️ Resuming: {len(self.results)} pages found, {len(self.visited)} URLs visited, "
+                         f"{len(self.frontier)} queued")
+        else:
+            for start_url in start_urls:
+                self.frontier.push(start_url, 0)
+        site = urlparse(start_urls[0]).netloc if start_urls else ""
         
-        while queue and len(self.results) < self.max_pages:
-            # Process a batch of URLs concurrently
-            batch = queue[:self.chunk_size]
-            queue = queue[self.chunk_size:]
-            
-            tasks = [self.process_page(url, depth, session, progress_bar, status) 
-                    for url, depth in batch]
-            results = await asyncio.gather(*tasks)
-            
-            # Add newly discovered URLs to the queue
-            for new_urls in results:
-                for url_info in new_urls:
-                    url, depth = url_info
-                    if url not in self.visited and depth <= self.max_depth:
-                        queue.append((url, depth))
-                        
-            # Sort queue so we process lower depths first (breadth-first)
-            queue.sort(key=lambda x: x[1])
-            
-            # Avoid processing too many URLs
-            if len(queue) > self.max_pages * 2:
-                queue = queue[:self.max_pages * 2]
+        in_flight: Dict[asyncio.Task, Tuple[str, int]] = {}
+        saving: Optional[asyncio.Task] = None
+        try:
+            while True:
+                limit = self.throttle.concurrency(site) if self.throttle.adaptive else self.chunk_size
+                while len(in_flight) < limit and len(self.frontier) and len(self.results) < self.max_pages:
+                    url, depth = self.frontier.pop()
+                    if url not in self.visited:
+                        task = asyncio.ensure_future(self.process_page(url, depth, session, progress_bar, status))
+                        in_flight[task] = (url, depth)
+                if not in_flight:
+                    break
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+
+                # Every discovered link counts as an in-link, even for URLs already queued
+                for task in done:
+                    del in_flight[task]
+                    for url, depth, anchor_text in task.result():
+                        if url not in self.visited and depth <= self.max_depth:
+                            self.frontier.push(url, depth, anchor_text)
+                FRONTIER_SIZE.set(len(self.frontier), site=site)
+                if checkpoint is not None and (saving is None or saving.done()):
+                    if saving is not None:
+                        saving.result()  # Raise a failed save
+                    # Taken now, between fetches finishing, and written in the background
+                    saving = asyncio.ensure_future(checkpoint.write(checkpoint.snapshot(self, in_flight.values())))
+        finally:
+            for task in in_flight:
+                task.cancel()
+            if in_flight:
+                await asyncio.gather(*in_flight, return_exceptions=True)
+            if saving is not None:
+                # Let a write started in the background finish, even when cancelled, so none lands later
+                await asyncio.gather(saving, return_exceptions=True)
+        if checkpoint is not None:
+            if saving is not None:
+                saving.result()
+            await checkpoint.save(self)
+
+    def diff_results(self) -> Dict[str, List[str]]:
+        """Compare the current results with the previous crawl by fingerprint
+
+        Only pages this crawl fetched and found gone (404 or 410) are removed.
+        Earlier pages that failed, timed out, were dropped as duplicates or
+        were not reached within ``max_pages`` are left out of every list, so
+        their stored copy is kept.
+        """
+        changes: Dict[str, List[str]] = {'added': [], 'changed': [], 'unchanged': [], 'removed': []}
+        current_urls = set()
+        for result in self.results:
+            current_urls.add(result.url)
+            previous = self.previous.get(result.url)
+            if previous is None:
+                changes['added'].append(result.url)
+            elif previous.fingerprint != result.fingerprint:
+                changes['changed'].append(result.url)
+            else:
+                changes['unchanged'].append(result.url)
+        changes['removed'] = [url for url in self.previous if url not in current_urls and url in self.gone]
+        return changes
 
-    async def crawl(self, url: str, status: Any) -> List[CrawlResult]:
+    async def run(self, start_urls: List[str], session: 'aiohttp.ClientSession', progress_bar: Any,
+                  status: Any, previous: Optional[List[CrawlResult]] = None,
+                  checkpoint: Optional['SiteCheckpoint'] = None,
+                  boilerplate: Optional[Dict[str, set[int]]] = None) -> List[CrawlResult]:
+        """Crawl from one or more seed URLs using an existing session
+        
+        When ``previous`` results are given the crawl is incremental: pages whose
+        markup is unchanged are not re-extracted, and ``self.changes`` reports
+        which URLs were added, changed, unchanged or removed. ``boilerplate``
+        is ``self.boilerplate`` as kept from the crawl that found ``previous``;
+        its blocks are stripped from the pages that changed. A ``checkpoint``
+        saves the crawl as it goes and resumes one saved there before.
+        """
+        self.processed = 0
+        self.visited.clear()
+        self.results.clear()
+        self.previous = {result.url: result for result in previous or []}
+        self.changes = {}
+        self.extracted.clear()
+        self.gone.clear()
+        self.boilerplate = {host: set(hashes) for host, hashes in (boilerplate or {}).items()}
+        self.link_filter = LinkFilter(self.link_rules) if self.link_rules is not None else None
+        
+        await self.best_first_crawl(start_urls, session, progress_bar, status, checkpoint=checkpoint)
+        
+        status.write(f"✅ Crawling complete. Found {len(self.results)} pages with content.")
+        status.write(f"📊 Total processed pages: {self.processed}, visited URLs: {len(self.visited)}")
+        
+        if self.deduplicator and self.results:
+            self.results = self.deduplicator.process(self.results, fresh=self.extracted if self.previous else None,
+                                                     known=self.boilerplate)
+            self.boilerplate = self.deduplicator.boilerplate
+            stats = self.deduplicator.stats
+            status.write(f"🧹 Removed {stats['duplicates']} near-duplicate pages and "
+                         f"{stats['boilerplate_blocks']} boilerplate blocks")
+        
+        self.changes = self.diff_results()
+        if self.previous:
+            status.write(f"🔄 Changes since last crawl: {len(self.changes['added'])} added, "
+                         f"{len(self.changes['changed'])} changed, {len(self.changes['removed'])} removed")
+        return self.results
+
+    async def crawl(self, url: str, status: Any,
+                    previous: Optional[List[CrawlResult]] = None) -> List[CrawlResult]:
         """Main crawl method"""
+        import aiohttp
+        import streamlit as st
+
         is_valid, message = URLValidator.validate(url)
         if not is_valid:
             st.error(f"❌ {message}")
@@ -157,18 +435,11 @@ class AsyncWebCrawler:
         
         try:
             progress_bar = st.progress(0.0)
-            self.processed = 0
-            self.visited.clear()
-            self.results.clear()
 
-            async with aiohttp.ClientSession() as session:
+            async with aiohttp.ClientSession(connector=create_connector(),
+                                             trace_configs=[http_trace_config(), address_guard_trace_config()]) as session:
                 status.write(f"🔍 Starting crawl of: {url}")
-                await self.breadth_first_crawl(url, session, progress_bar, status)
-                
-                status.write(f"✅ Crawling complete. Found {len(self.results)} pages with content.")
-                status.write(f"📊 Total processed pages: {self.processed}, visited URLs: {len(self.visited)}")
-
-            return self.results
+                return await self.run([url], session, progress_bar, status, previous=previous)
 
         except Exception as e:
             st.error(f"Unexpected error: {str(e)}")
@@ -177,7 +448,8 @@ class AsyncWebCrawler:
             if 'progress_bar' in locals():
                 progress_bar.empty()
 
-def crawl_website(url: str, max_depth: int = 2, max_pages: int = 50, status: Any = None) -> List[CrawlResult]:
+def crawl_website(url: str, max_depth: int = 2, max_pages: int = 50, status: Any = None,
+                  previous: Optional[List[CrawlResult]] = None, topic: Optional[str] = None) -> List[CrawlResult]:
     """Synchronous wrapper for the async crawler"""
-    crawler = AsyncWebCrawler(max_depth=max_depth, max_pages=max_pages)
-    return asyncio.run(crawler.crawl(url, status))
\ No newline at end of file
+    crawler = AsyncWebCrawler(max_depth=max_depth, max_pages=max_pages, topic=topic)
+    return asyncio.run(crawler.crawl(url, status, previous=previous))
\ No newline at end of file
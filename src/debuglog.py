@@ -0,0 +1,110 @@
+from typing import List, Dict, Optional, Any, Iterator
+from collections import deque
+from threading import Lock
+import datetime
+import json
+import random
+from .metrics import REGISTRY
+
+DEBUG_EVENTS = REGISTRY.counter("debug_log_events_total", "Debug log events by result: recorded, sampled_out or evicted")
+
+def parse_sample_rates(spec: Optional[str]) -> Dict[str, float]:
+    """Per-category sample rates from ``"API Request=0.1,Messages Being Sent=0"``"""
+    rates = {}
+    for part in (spec or "").split(','):
+        if '=' in part:
+            category, rate = part.rsplit('=', 1)
+            rates[category.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+def format_debug_content(content: Any) -> str:
+    if isinstance(content, (dict, list)):
+        return json.dumps(content, indent=2, default=str)
+    return str(content)
+
+class DebugEntry:
+    """A recorded event; the content is kept as given and formatted on first view"""
+    __slots__ = ('timestamp', 'title', 'raw', 'type', '_content')
+
+    def __init__(self, timestamp: str, title: str, raw: Any, type_info: str):
+        self.timestamp = timestamp
+        self.title = title
+        self.raw = raw
+        self.type = type_info
+        self._content: Optional[str] = None
+
+    @property
+    def content(self) -> str:
+        if self._content is None:
+            self._content = format_debug_content(self.raw)
+            self.raw = None  # Formatted once; the text is all that is needed from now on
+        return self._content
+
+    def to_dict(self) -> Dict[str, str]:
+        return {"timestamp": self.timestamp, "title": self.title, "content": self.content, "type": self.type}
+
+class DebugLog:
+    """Ring buffer of developer-mode debug events with per-category sampling
+
+    Holds the last ``capacity`` entries; older ones are dropped. Events of a
+    category (by default the title) are kept at its rate in ``sample_rates``,
+    else ``default_rate``; errors are always kept. Content is stored as the
+    raw object and only serialized when an entry is viewed or exported, so
+    the log adds little to the request path.
+    """
+
+    def __init__(self, capacity: int = 200, sample_rates: Optional[Dict[str, float]] = None,
+                 default_rate: float = 1.0, seed: Optional[int] = None):
+        self.entries: deque = deque(maxlen=capacity)
+        self.sample_rates = sample_rates or {}
+        self.default_rate = default_rate
+        self.random = random.Random(seed)
+        self.recorded = 0  # Entries ever added, also a version number for exports
+        self.lock = Lock()
+
+    @property
+    def capacity(self) -> int:
+        return self.entries.maxlen
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __iter__(self) -> Iterator[DebugEntry]:
+        return iter(list(self.entries))
+
+    def keep(self, category: str, type_info: str = "info") -> bool:
+        """Sampling decision for an event, made before its content is built"""
+        rate = self.sample_rates.get(category, self.default_rate)
+        if type_info == "error" or rate >= 1.0 or self.random.random() < rate:
+            return True
+        DEBUG_EVENTS.inc(result="sampled_out")
+        return False
+
+    def add(self, title: str, content: Any, type_info: str = "info", timestamp: Optional[str] = None,
+            sample: bool = True) -> bool:
+        """Record an event unless sampled out; pass sample=False if keep() already decided"""
+        if sample and not self.keep(title, type_info):
+            return False
+        entry = DebugEntry(timestamp or datetime.datetime.now().strftime("%H:%M:%S"), title, content, type_info)
+        with self.lock:
+            if len(self.entries) == self.entries.maxlen:
+                DEBUG_EVENTS.inc(result="evicted")
+            self.entries.append(entry)
+            self.recorded += 1
+        DEBUG_EVENTS.inc(result="recorded")
+        return True
+
+    def latest(self, count: int) -> List[DebugEntry]:
+        """The newest count entries, newest first"""
+        with self.lock:
+            entries = list(self.entries)
+        return entries[::-1][:max(count, 0)]
+
+    def records(self) -> Iterator[Dict[str, str]]:
+        """Entries as dicts for export, oldest first"""
+        for entry in self:
+            yield entry.to_dict()
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
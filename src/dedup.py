@@ -0,0 +1,183 @@
+from typing import List, Dict, Optional, Set, Any
+from collections import Counter, defaultdict
+from urllib.parse import urlparse
+import hashlib
+import re
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+_MASK_64 = (1 << 64) - 1
+_MIX = 0x9E3779B97F4A7C15  # Odd multiplier: remixes sampled hashes, whose high bits are all alike
+
+def normalize_block(text: str) -> str:
+    """Collapse whitespace so equal blocks compare equal"""
+    return ' '.join(text.split())
+
+def block_hash(block: str) -> int:
+    """Case-insensitive 64-bit hash of a normalized content block, the same in every process"""
+    digest = hashlib.blake2b(block.lower().encode('utf-8', 'surrogatepass'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+def shingle_hashes(text: str, size: int = 3, sample: int = 512) -> List[int]:
+    """Hash the distinct word shingles of a text into 64-bit features
+
+    Only the ``sample`` smallest hashes are kept (a bottom-k sketch). The
+    selection is consistent across documents, so similar texts keep similar
+    samples while the SimHash cost per page stays bounded.
+    """
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < size:
+        return [hash(tuple(words)) & _MASK_64] if words else []
+    shingles = set(map(hash, zip(*(words[i:] for i in range(size)))))
+    return [(value * _MIX) & _MASK_64 for value in sorted(shingles)[:sample]]
+
+def simhash(features: List[int]) -> int:
+    """Compute a 64-bit SimHash from hashed features
+
+    The 64 per-bit vote counters are kept bit-sliced (``planes[k]`` holds bit
+    k of every counter), so adding a feature and the final majority vote cost
+    a few big-int operations instead of 64-step loops.
+    """
+    planes = [0] * max(1, len(features).bit_length())
+    for feature in features:
+        carry = feature
+        k = 0
+        while carry:
+            plane = planes[k]
+            planes[k] = plane ^ carry
+            carry &= plane
+            k += 1
+
+    # Compare every counter against half the feature count, most significant plane first
+    threshold = len(features) // 2
+    greater, equal = 0, _MASK_64
+    for k in range(len(planes) - 1, -1, -1):
+        plane = planes[k]
+        if (threshold >> k) & 1:
+            equal &= plane
+        else:
+            greater |= equal & plane
+            equal &= ~plane
+    return greater
+
+def hamming_distance(a: int, b: int) -> int:
+    """Number of differing bits between two fingerprints"""
+    return bin(a ^ b).count('1')
+
+class SimHashIndex:
+    """Find near-duplicate fingerprints within a small Hamming distance
+
+    Fingerprints are split into ``max_distance + 1`` bands; by the pigeonhole
+    principle two fingerprints within ``max_distance`` bits share at least one
+    band exactly, so only bucket-mates need a full comparison.
+    """
+
+    def __init__(self, max_distance: int = 5):
+        self.max_distance = max_distance
+        self.bands = max_distance + 1
+        self.band_bits = 64 // self.bands
+        self.buckets: List[Dict[int, List[Any]]] = [defaultdict(list) for _ in range(self.bands)]
+
+    def _band_keys(self, fingerprint: int) -> List[int]:
+        mask = (1 << self.band_bits) - 1
+        return [(fingerprint >> (i * self.band_bits)) & mask for i in range(self.bands)]
+
+    def find(self, fingerprint: int) -> Optional[Any]:
+        """Return the key of a stored near-duplicate, if any"""
+        for band, key in enumerate(self._band_keys(fingerprint)):
+            for other_fingerprint, other_key in self.buckets[band].get(key, ()):
+                if hamming_distance(fingerprint, other_fingerprint) <= self.max_distance:
+                    return other_key
+        return None
+
+    def add(self, key: Any, fingerprint: int) -> None:
+        """Store a fingerprint under the given key"""
+        for band, band_key in enumerate(self._band_keys(fingerprint)):
+            self.buckets[band][band_key].append((fingerprint, key))
+
+class ContentDeduplicator:
+    """Remove boilerplate blocks and near-duplicate pages from crawl results
+
+    Results are expected to hold one normalized content block per line, as
+    produced by ``AsyncWebCrawler.process_page``.
+    """
+
+    def __init__(self, min_pages: int = 3, boilerplate_ratio: float = 0.5, max_distance: int = 5):
+        self.min_pages = min_pages
+        self.boilerplate_ratio = boilerplate_ratio
+        self.max_distance = max_distance
+        self.stats: Dict[str, int] = {'boilerplate_blocks': 0, 'duplicates': 0}
+        self.boilerplate: Dict[str, Set[int]] = {}  # Each host's boilerplate hashes after the last process()
+
+    def find_boilerplate(self, results: List[Any]) -> Dict[str, Set[int]]:
+        """Find blocks repeated across a large share of each host's pages"""
+        pages_per_host: Counter = Counter()
+        block_counts: Dict[str, Counter] = defaultdict(Counter)
+        for result in results:
+            host = urlparse(result.url).netloc
+            pages_per_host[host] += 1
+            block_counts[host].update({block_hash(block) for block in result.content.split('\n') if block})
+
+        boilerplate: Dict[str, Set[int]] = {}
+        for host, pages in pages_per_host.items():
+            if pages < self.min_pages:
+                continue
+            min_count = max(2, pages * self.boilerplate_ratio)
+            repeated = {digest for digest, count in block_counts[host].items() if count >= min_count}
+            if repeated:
+                boilerplate[host] = repeated
+        return boilerplate
+
+    def strip_boilerplate(self, results: List[Any], boilerplate: Dict[str, Set[int]]) -> None:
+        """Drop boilerplate blocks from result content in place"""
+        for result in results:
+            repeated = boilerplate.get(urlparse(result.url).netloc)
+            if not repeated:
+                continue
+            blocks = result.content.split('\n')
+            kept = [block for block in blocks if block and block_hash(block) not in repeated]
+            if len(kept) != len(blocks):
+                self.stats['boilerplate_blocks'] += len(blocks) - len(kept)
+                result.content = '\n'.join(kept)
+
+    def process(self, results: List[Any], fresh: Optional[Set[str]] = None,
+                known: Optional[Dict[str, Set[int]]] = None) -> List[Any]:
+        """Return only the unique results, with boilerplate removed
+
+        ``fresh`` names the pages extracted in this crawl; only those are
+        learned from and cleaned. Reused pages were cleaned when first crawled,
+        and counting them would under-report how often a block repeats, so
+        each host's hashes ``known`` from earlier crawls are stripped as well.
+        Afterwards ``self.boilerplate`` holds the hashes to keep for the next
+        crawl: a full crawl replaces its hosts' hashes, an incremental one adds
+        to them.
+        """
+        self.stats = {'boilerplate_blocks': 0, 'duplicates': 0}
+        self.boilerplate = {host: set(hashes) for host, hashes in (known or {}).items()}
+        if fresh is None:
+            boilerplate = self.find_boilerplate(results)
+            for host in {urlparse(result.url).netloc for result in results}:
+                self.boilerplate[host] = boilerplate.get(host, set())
+            self.strip_boilerplate(results, boilerplate)
+        else:
+            fresh_results = [result for result in results if result.url in fresh]
+            boilerplate = self.find_boilerplate(fresh_results)
+            for host in {urlparse(result.url).netloc for result in fresh_results}:
+                learned = boilerplate.get(host, set()) | self.boilerplate.get(host, set())
+                if learned:
+                    boilerplate[host] = self.boilerplate[host] = learned
+            self.strip_boilerplate(fresh_results, boilerplate)
+
+        index = SimHashIndex(self.max_distance)
+        unique = []
+        for result in results:
+            features = shingle_hashes(result.content)
+            if not features:
+                self.stats['duplicates'] += 1
+                continue
+            fingerprint = simhash(features)
+            if index.find(fingerprint) is not None:
+                self.stats['duplicates'] += 1
+                continue
+            index.add(result.url, fingerprint)
+            unique.append(result)
+        return unique
@@ -0,0 +1,103 @@
+from typing import List, Dict, Any, Optional, Iterable, Iterator, BinaryIO
+import datetime
+import gzip
+import io
+import json
+from .metrics import REGISTRY
+
+EXPORT_BYTES = REGISTRY.counter("export_bytes_total", "Exported bytes by kind, before compression")
+
+# Format -> (MIME type, file extension)
+FORMATS = {
+    "json": ("application/json", "json"),
+    "jsonl": ("application/x-ndjson", "jsonl"),
+    "txt": ("text/plain", "txt"),
+    "prom": ("text/plain", "txt"),
+}
+WRITE_BUFFER_CHARS = 64 * 1024
+
+def iter_json(records: List[Any], indent: int = 2) -> Iterator[str]:
+    """A JSON array, encoded piece by piece"""
+    return json.JSONEncoder(indent=indent, ensure_ascii=False).iterencode(records)
+
+def iter_jsonl(records: Iterable[Any]) -> Iterator[str]:
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + "\n"
+
+def iter_chat_text(messages: Iterable[Dict[str, Any]], date: Optional[datetime.datetime] = None) -> Iterator[str]:
+    date = date or datetime.datetime.now()
+    yield f"Chat Session\nDate: {date.strftime('%Y-%m-%d %H:%M:%S')}\n\n"
+    for message in messages:
+        role = "User" if message["role"] == "user" else "AI"
+        yield f"{role}: {message['content']}\n\n"
+
+def iter_debug_text(entries: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    for entry in entries:
+        yield f"[{entry.get('timestamp', '')}] {entry.get('type', 'info').upper()}: {entry.get('title', '')}\n"
+        yield f"{entry.get('content', '')}\n\n"
+
+def chat_export(messages: List[Dict[str, Any]], fmt: str) -> Iterator[str]:
+    """Chat history as json, jsonl or txt text chunks"""
+    if fmt == "json":
+        return iter_json(messages)
+    if fmt == "jsonl":
+        return iter_jsonl(messages)
+    if fmt == "txt":
+        return iter_chat_text(messages)
+    raise ValueError(f"Unknown chat export format: {fmt}")
+
+def debug_export(entries: Iterable[Dict[str, Any]], fmt: str) -> Iterator[str]:
+    """Debug log entries as json, jsonl or txt text chunks"""
+    if fmt == "json":
+        return iter_json(list(entries))
+    if fmt == "jsonl":
+        return iter_jsonl(entries)
+    if fmt == "txt":
+        return iter_debug_text(entries)
+    raise ValueError(f"Unknown debug export format: {fmt}")
+
+def write_export(chunks: Iterable[str], out: BinaryIO, compress: bool = False, kind: str = "export") -> int:
+    """Write text chunks to a binary stream as UTF-8, gzip-compressed if asked
+
+    Chunks are written in batches as they are produced, so the whole export
+    is never held as one string. Returns the bytes written before compression.
+    """
+    target = gzip.GzipFile(fileobj=out, mode='wb', mtime=0) if compress else out
+    written = 0
+    buffer: List[str] = []
+    buffered = 0
+    try:
+        for chunk in chunks:
+            buffer.append(chunk)
+            buffered += len(chunk)
+            if buffered >= WRITE_BUFFER_CHARS:
+                written += target.write(''.join(buffer).encode('utf-8'))
+                buffer, buffered = [], 0
+        if buffer:
+            written += target.write(''.join(buffer).encode('utf-8'))
+    finally:
+        if compress:
+            target.close()  # Writes the gzip trailer; leaves out open
+    EXPORT_BYTES.inc(written, kind=kind)
+    return written
+
+def export_bytes(chunks: Iterable[str], compress: bool = False, kind: str = "export") -> bytes:
+    """Export into memory, e.g. for a download button"""
+    out = io.BytesIO()
+    write_export(chunks, out, compress, kind)
+    return out.getvalue()
+
+def export_to_file(chunks: Iterable[str], path: str, compress: Optional[bool] = None, kind: str = "export") -> int:
+    """Stream an export to a file, gzip-compressed if compress is set or the path ends in .gz"""
+    if compress is None:
+        compress = path.endswith('.gz')
+    with open(path, 'wb') as out:
+        return write_export(chunks, out, compress, kind)
+
+def export_filename(basename: str, fmt: str, compress: bool, timestamp: Optional[datetime.datetime] = None) -> str:
+    timestamp = timestamp or datetime.datetime.now()
+    name = f"{basename}_{timestamp.strftime('%Y%m%d_%H%M%S')}.{FORMATS[fmt][1]}"
+    return f"{name}.gz" if compress else name
+
+def export_mime_type(fmt: str, compress: bool) -> str:
+    return "application/gzip" if compress else FORMATS[fmt][0]
\ No newline at end of file
@@ -1,14 +1,24 @@
-from typing import Tuple, Optional, BinaryIO
-import streamlit as st
-from PyPDF2 import PdfReader
+from typing import Tuple, Optional, BinaryIO, Any, Callable
 import time
+from .metrics import REGISTRY
+
+PARSE_SECONDS = REGISTRY.histogram("file_parse_seconds", "Document text extraction time by file type")
+BYTES_PROCESSED = REGISTRY.counter("file_bytes_total", "Extracted text bytes by file type")
 
 class FileProcessor:
     def __init__(self, max_file_size: int = 10 * 1024 * 1024):  # 10MB default
         self.max_file_size = max_file_size
 
-    def process_pdf(self, file: BinaryIO, max_pages: int = 100) -> Tuple[Optional[str], Optional[str]]:
-        """Process PDF with enhanced error handling and size limits"""
+    def process_pdf(self, file: BinaryIO, max_pages: int = 100, progress_bar: Any = None,
+                    warn: Optional[Callable[[str], None]] = None) -> Tuple[Optional[str], Optional[str]]:
+        """Process PDF with enhanced error handling and size limits
+
+        Progress and page warnings go to the Streamlit sidebar unless a
+        ``progress_bar`` and ``warn`` callback are given, e.g. by the API server.
+        """
+        from PyPDF2 import PdfReader  # Imported on first use; PyPDF2 is slow to import
+
+        start = time.perf_counter()
         try:
             content = []
             total_size = 0
@@ -19,7 +29,10 @@ class FileProcessor:
             if total_pages > max_pages:
                 return None, f"PDF has too many pages ({total_pages}). Maximum is {max_pages}."
                 
-            progress_bar = st.sidebar.progress(0)
+            if progress_bar is None or warn is None:
+                import streamlit as st
+                progress_bar = progress_bar or st.sidebar.progress(0)
+                warn = warn or st.warning
             
             for i, page in enumerate(pdf_reader.pages):
                 try:
@@ -33,20 +46,23 @@ class FileProcessor:
                     progress_bar.progress((i + 1) / total_pages)
                     
                 except Exception as e:
-                    st.warning(f"Warning: Could not process page {i+1}: {str(e)}")
+                    warn(f"Warning: Could not process page {i+1}: {str(e)}")
                     continue
                     
             progress_bar.empty()
+            PARSE_SECONDS.observe(time.perf_counter() - start, type="pdf")
+            BYTES_PROCESSED.inc(total_size, type="pdf")
             return "\n\n".join(content), None
             
         except Exception as e:
             return None, f"Error processing PDF: {str(e)}"
         finally:
-            if 'progress_bar' in locals():
+            if progress_bar is not None:
                 progress_bar.empty()
 
     def process_text_file(self, file: BinaryIO) -> Tuple[Optional[str], Optional[str]]:
         """Process text files with size limits and encoding detection"""
+        start = time.perf_counter()
         try:
             file_content = file.read()
             if len(file_content) > self.max_file_size:
@@ -57,6 +73,8 @@ class FileProcessor:
             for encoding in encodings:
                 try:
                     text_content = file_content.decode(encoding)
+                    PARSE_SECONDS.observe(time.perf_counter() - start, type="text")
+                    BYTES_PROCESSED.inc(len(file_content), type="text")
                     return text_content, None
                 except UnicodeDecodeError:
                     continue
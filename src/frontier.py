@@ -0,0 +1,117 @@
+from typing import List, Dict, Optional, Set, Tuple, Iterable
+from urllib.parse import urlparse
+import heapq
+import itertools
+import math
+import re
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+_STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'how', 'in', 'is', 'it',
+    'of', 'on', 'or', 'that', 'the', 'this', 'to', 'what', 'when', 'where', 'which', 'who',
+    'why', 'with', 'about', 'www', 'http', 'https', 'html', 'htm', 'php', 'index'
+}
+
+def tokenize(text: str) -> Set[str]:
+    """Lowercase word tokens without stopwords or single characters"""
+    return {token for token in _TOKEN_RE.findall(text.lower())
+            if len(token) > 1 and token not in _STOPWORDS}
+
+class CrawlFrontier:
+    """Best-first URL frontier for focused crawling
+
+    URLs are popped in order of a score built from topic matches in their
+    anchor text and URL tokens, their depth and the number of pages linking
+    to them. Without a topic the order is breadth-first, with well-linked
+    pages first within a depth.
+    """
+
+    def __init__(self, topic: Optional[str] = None, topic_weight: float = 3.0,
+                 depth_weight: float = 1.0, inlink_weight: float = 0.5):
+        self.topic_tokens = tokenize(topic or "")
+        self.topic_weight = topic_weight
+        self.depth_weight = depth_weight
+        self.inlink_weight = inlink_weight
+        self.heap: List[Tuple[float, int, str]] = []
+        self.counter = itertools.count()
+        self.depths: Dict[str, int] = {}
+        self.anchors: Dict[str, Set[str]] = {}
+        self.inlinks: Dict[str, int] = {}
+        self.scores: Dict[str, float] = {}
+        self.popped: Set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def relevance(self, url: str) -> float:
+        """Fraction of topic tokens found in the URL's anchors (counted double) and path"""
+        if not self.topic_tokens:
+            return 0.0
+        parsed = urlparse(url)
+        url_tokens = tokenize(f"{parsed.path} {parsed.query}")
+        anchor_tokens = self.anchors.get(url, set())
+        matches = 2 * len(self.topic_tokens & anchor_tokens) + len(self.topic_tokens & url_tokens)
+        return matches / len(self.topic_tokens)
+
+    def score(self, url: str) -> float:
+        """Priority of a queued URL; higher is fetched first"""
+        return (self.topic_weight * self.relevance(url)
+                - self.depth_weight * self.depths[url]
+                + self.inlink_weight * math.log1p(self.inlinks[url]))
+
+    def push(self, url: str, depth: int, anchor_text: str = "") -> None:
+        """Queue a URL, or update its score if it is already queued"""
+        if url in self.popped:
+            return
+        if url in self.depths:
+            self.depths[url] = min(self.depths[url], depth)
+            self.inlinks[url] += 1
+        else:
+            self.depths[url] = depth
+            self.inlinks[url] = 0
+            self.anchors[url] = set()
+        if anchor_text:
+            self.anchors[url] |= tokenize(anchor_text)
+
+        # Re-pushing leaves a stale heap entry behind; pop() skips entries whose score is outdated
+        score = self.score(url)
+        self.scores[url] = score
+        heapq.heappush(self.heap, (-score, next(self.counter), url))
+
+    def pop(self) -> Optional[Tuple[str, int]]:
+        """Return the best (url, depth) pair, or None when the frontier is empty"""
+        while self.heap:
+            negative_score, _, url = heapq.heappop(self.heap)
+            if self.scores.get(url) != -negative_score:
+                continue
+            depth = self.depths[url]
+            del self.scores[url], self.depths[url], self.anchors[url], self.inlinks[url]
+            self.popped.add(url)
+            return url, depth
+        return None
+
+    def queued(self) -> List[Tuple[str, int, int, List[str]]]:
+        """Queued URLs with their depth, in-link count and anchor tokens, in the order they were first queued"""
+        return [(url, depth, self.inlinks[url], sorted(self.anchors[url])) for url, depth in self.depths.items()]
+
+    def restore(self, queued: Iterable[Tuple[str, int, int, Iterable[str]]], popped: Iterable[str]) -> None:
+        """Queue URLs saved with ``queued`` and mark URLs as already popped, e.g. when resuming a crawl"""
+        self.popped.update(popped)
+        for url, depth, inlinks, anchors in queued:
+            if url in self.popped or url in self.depths:
+                continue
+            self.depths[url] = depth
+            self.inlinks[url] = inlinks
+            self.anchors[url] = set(anchors)
+            score = self.scores[url] = self.score(url)
+            heapq.heappush(self.heap, (-score, next(self.counter), url))
+
+    def pop_batch(self, size: int) -> List[Tuple[str, int]]:
+        """Pop up to size of the best URLs"""
+        batch = []
+        while len(batch) < size:
+            item = self.pop()
+            if item is None:
+                break
+            batch.append(item)
+        return batch
@@ -0,0 +1,396 @@
+from typing import List, Dict, Optional, Any, Set, TYPE_CHECKING
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field, replace
+from urllib.parse import urlparse
+from threading import Lock, Thread
+import asyncio
+import time
+import uuid
+from .checkpoint import CrawlCheckpoint, checkpoint_write
+from .crawler import AsyncWebCrawler, URLValidator, CrawlResult
+from .linkfilter import DEFAULT_LINK_RULES, LinkRules
+from .throttle import HostThrottle
+from .resolver import CachingResolver, address_guard_trace_config, create_connector
+from .metrics import http_trace_config
+
+if TYPE_CHECKING:
+    import aiohttp
+
+def normalize_seed(seed: str) -> str:
+    """Turn a bare domain or URL into a crawlable URL"""
+    seed = seed.strip()
+    if seed and not seed.startswith(('http://', 'https://')):
+        seed = 'https://' + seed
+    return seed
+
+class _SiteStatus:
+    """Status adapter that prefixes a site's messages and feeds job-wide progress"""
+
+    def __init__(self, job: 'CrawlJob', host: str, status: Any, progress_bar: Any):
+        self.job = job
+        self.host = host
+        self.status = status
+        self.progress_bar = progress_bar
+
+    def write(self, message: str) -> None:
+        if self.status is not None:
+            self.status.write(f"[{self.host}] {message}")
+
+    def progress(self, value: float) -> None:
+        if self.progress_bar is not None:
+            self.progress_bar.progress(self.job.progress)
+
+    def empty(self) -> None:
+        pass
+
+class CrawlJob:
+    """Crawl many seed URLs or domains concurrently as a single job
+
+    Seeds are grouped by host, with one crawler per host. All crawlers share
+    one event loop, one connection pool and one per-host throttle, so the job
+    takes roughly as long as its slowest site. ``max_pages`` applies per site.
+    Hosts are resolved concurrently before crawling starts, through the
+    process-wide DNS cache; ``allow_private`` permits private and loopback
+    addresses, e.g. for crawling a local test server. With ``adaptive``, each
+    host's request limit moves up to ``max_per_host`` while its responses
+    stay fast, and backs off when they slow down or are refused. With a
+    ``checkpoint``, each site's progress is saved under ``job_id`` as it
+    goes, and a job with the same ID resumes from it.
+    """
+
+    def __init__(self, seeds: List[str], max_depth: int = 2, max_pages: int = 50,
+                 topic: Optional[str] = None, max_per_host: int = 8, min_interval: float = 0.0,
+                 max_connections: int = 100, previous: Optional[List[CrawlResult]] = None,
+                 allow_private: bool = False, link_rules: Optional[LinkRules] = DEFAULT_LINK_RULES,
+                 adaptive: bool = True, checkpoint: Optional[CrawlCheckpoint] = None, job_id: Optional[str] = None,
+                 boilerplate: Optional[Dict[str, Set[int]]] = None):
+        self.job_id = job_id or uuid.uuid4().hex[:12]
+        self.checkpoint = checkpoint
+        self.seeds = list(seeds)
+        # The options saved with a checkpoint; link rules, previous results and boilerplate are passed again on resume
+        self.options = {'max_depth': max_depth, 'max_pages': max_pages, 'topic': topic, 'max_per_host': max_per_host,
+                        'min_interval': min_interval, 'max_connections': max_connections,
+                        'allow_private': allow_private, 'adaptive': adaptive}
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.topic = topic
+        self.max_connections = max_connections
+        self.allow_private = allow_private
+        self.throttle = HostThrottle(max_concurrency=max_per_host, min_interval=min_interval, adaptive=adaptive,
+                                     initial_concurrency=max(max_per_host // 2, 1))
+        self.previous = previous or []
+        self.boilerplate = dict(boilerplate or {})  # Hashes kept from earlier crawls, then updated by this one
+        self.errors: Dict[str, str] = {}
+        self.results: List[CrawlResult] = []
+        self.changes: Dict[str, List[str]] = {}
+
+        # Group seeds by host, keeping the order they were given in
+        self.site_seeds: Dict[str, List[str]] = OrderedDict()
+        for seed in seeds:
+            url = normalize_seed(seed)
+            if not url:
+                continue
+            is_valid, message = URLValidator.validate(url, allow_private=allow_private)
+            if not is_valid:
+                self.errors[url] = message
+                continue
+            urls = self.site_seeds.setdefault(urlparse(url).netloc, [])
+            if url not in urls:
+                urls.append(url)
+
+        self.crawlers: Dict[str, AsyncWebCrawler] = {
+            host: AsyncWebCrawler(max_depth=max_depth, max_pages=max_pages, topic=topic,
+                                  throttle=self.throttle, link_rules=link_rules)
+            for host in self.site_seeds
+        }
+
+    @classmethod
+    def resume(cls, checkpoint: CrawlCheckpoint, job_id: str, **job_options: Any) -> 'CrawlJob':
+        """The checkpointed job ``job_id``, to run again from where it stopped
+
+        ``job_options`` override the saved options; link rules, previous
+        results and boilerplate hashes are not saved and default as for a new job.
+        """
+        saved = checkpoint.job(job_id)
+        if saved is None:
+            raise ValueError(f"No saved crawl job {job_id}")
+        return cls(saved['seeds'], checkpoint=checkpoint, job_id=job_id, **{**saved['options'], **job_options})
+
+    @property
+    def progress(self) -> float:
+        """Fraction of the job's total page budget processed so far"""
+        if not self.crawlers:
+            return 1.0
+        done = sum(min(crawler.processed, crawler.max_pages) for crawler in self.crawlers.values())
+        return min(1.0, done / (self.max_pages * len(self.crawlers)))
+
+    @property
+    def pages_found(self) -> int:
+        """Pages with content found so far across all sites"""
+        return sum(len(crawler.results) for crawler in self.crawlers.values())
+
+    async def _crawl_site(self, host: str, session: 'aiohttp.ClientSession',
+                          status: Any, progress_bar: Any) -> List[CrawlResult]:
+        crawler = self.crawlers[host]
+        previous = [result for result in self.previous if urlparse(result.url).netloc == host]
+        site_status = _SiteStatus(self, host, status, progress_bar)
+        site_status.write(f"🔍 Starting crawl of: {', '.join(self.site_seeds[host])}")
+        checkpoint = self.checkpoint.site(self.job_id, host) if self.checkpoint is not None else None
+        return await crawler.run(self.site_seeds[host], session, site_status, site_status, previous=previous,
+                                 checkpoint=checkpoint,
+                                 boilerplate={host: self.boilerplate[host]} if host in self.boilerplate else None)
+
+    async def run(self, status: Any = None, progress_bar: Any = None) -> List[CrawlResult]:
+        """Crawl every site concurrently and return the combined results"""
+        import aiohttp
+
+        resolver = CachingResolver(allow_private=self.allow_private)
+        connector = create_connector(resolver=resolver, limit=self.max_connections)
+        trace_configs = [http_trace_config(), address_guard_trace_config(self.allow_private)]
+        async with aiohttp.ClientSession(connector=connector, trace_configs=trace_configs) as session:
+            hosts = list(self.crawlers)
+            await resolver.prefetch(urlparse(self.site_seeds[host][0]).hostname for host in hosts)
+            outcomes = await asyncio.gather(
+                *(self._crawl_site(host, session, status, progress_bar) for host in hosts),
+                return_exceptions=True
+            )
+
+        self.results = []
+        self.changes = {'added': [], 'changed': [], 'unchanged': [], 'removed': []}
+        for host, outcome in zip(hosts, outcomes):
+            if isinstance(outcome, BaseException):
+                self.errors[host] = str(outcome)
+                continue
+            self.results.extend(outcome)
+            self.boilerplate.update(self.crawlers[host].boilerplate)
+            for key, urls in self.crawlers[host].changes.items():
+                self.changes[key].extend(urls)
+        return self.results
+
+class CrawlProgress:
+    """Thread-safe status sink for crawls running off the Streamlit script thread
+
+    Implements the ``write``/``progress``/``empty`` calls crawlers make on
+    Streamlit status and progress elements, and keeps the latest state so it
+    can be polled.
+    """
+
+    def __init__(self, max_messages: int = 50):
+        self.messages: deque = deque(maxlen=max_messages)
+        self.value = 0.0
+
+    def write(self, message: str) -> None:
+        self.messages.append(message)
+
+    def progress(self, value: float) -> None:
+        self.value = value
+
+    def empty(self) -> None:
+        pass
+
+@dataclass
+class JobInfo:
+    """Snapshot of a background crawl job"""
+    job_id: str
+    owner: str
+    seeds: List[str]
+    state: str = "queued"  # queued, running, done, failed, cancelled
+    progress: float = 0.0
+    pages_found: int = 0
+    messages: List[str] = field(default_factory=list)
+    error: Optional[str] = None
+    submitted_at: float = 0.0
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.state in ("done", "failed", "cancelled")
+
+class _ManagedJob:
+    def __init__(self, job_id: str, owner: str, job: CrawlJob):
+        self.info = JobInfo(job_id=job_id, owner=owner, seeds=[url for urls in job.site_seeds.values() for url in urls],
+                            submitted_at=time.time())
+        self.job = job
+        self.status = CrawlProgress()
+        self.future: Optional[Any] = None
+        self.started = False  # Set once _run has begun, which then records how the job ends
+
+class CrawlJobManager:
+    """Run crawl jobs on a dedicated event loop thread
+
+    ``submit`` returns a job ID immediately; callers poll ``status``, may
+    ``cancel``, and take the finished job with ``collect``. At most
+    ``max_concurrent`` jobs run at once across all users, further jobs wait
+    in the queue, and each owner may have ``max_per_owner`` unfinished jobs.
+    Given a running ``loop``, jobs share it instead of starting a thread.
+
+    With a ``checkpoint``, jobs save their progress as they run. A job that
+    was interrupted, by a crash or restart, or that failed can then be
+    continued with ``resume``; ``resumable`` lists them. A job's checkpoint is
+    deleted when it is collected after finishing or being cancelled.
+    """
+
+    def __init__(self, max_concurrent: int = 4, max_per_owner: int = 1, retention: int = 3600,
+                 loop: Optional[asyncio.AbstractEventLoop] = None, checkpoint: Optional[CrawlCheckpoint] = None):
+        self.max_concurrent = max_concurrent
+        self.max_per_owner = max_per_owner
+        self.retention = retention  # Seconds a finished, uncollected job is kept
+        self.jobs: Dict[str, _ManagedJob] = {}
+        self.lock = Lock()
+        self.loop = loop  # Jobs run on this loop, e.g. the API server's, or on a thread of their own
+        self.thread: Optional[Thread] = None
+        self.slots: Optional[asyncio.Semaphore] = None
+        self.checkpoint = checkpoint
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self.lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                self.thread = Thread(target=self.loop.run_forever, name="crawl-jobs", daemon=True)
+                self.thread.start()
+            return self.loop
+
+    async def _run(self, managed: _ManagedJob) -> None:
+        info = managed.info
+        with self.lock:
+            if info.finished:
+                return  # Cancelled before it started
+            managed.started = True
+        if self.slots is None:
+            self.slots = asyncio.Semaphore(self.max_concurrent)
+        state, error = "done", None
+        try:
+            async with self.slots:
+                info.state = "running"
+                info.started_at = time.time()
+                await managed.job.run(managed.status, managed.status)
+        except asyncio.CancelledError:
+            state = "cancelled"
+        except Exception as e:
+            state, error = "failed", str(e)
+        try:
+            # Saved before the job shows as finished, so collect() never deletes the checkpoint under a write
+            if self.checkpoint is not None:
+                await checkpoint_write(self.checkpoint.set_state, info.job_id, state, error)
+        except asyncio.CancelledError:
+            pass  # Cancelled after the crawl had ended; the write has still finished
+        finally:
+            info.error = error
+            info.finished_at = time.time()
+            info.state = state
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.retention
+        for job_id, managed in list(self.jobs.items()):
+            if managed.info.finished and managed.info.finished_at < cutoff:
+                del self.jobs[job_id]
+
+    def submit(self, seeds: List[str], owner: str = "default", **job_options: Any) -> str:
+        """Start a crawl job in the background and return its ID"""
+        job = CrawlJob(seeds, checkpoint=self.checkpoint, **job_options)
+        return self._start(owner, job)
+
+    def resume(self, job_id: str, owner: str = "default", **job_options: Any) -> str:
+        """Continue a checkpointed job that was interrupted or failed, under its ID
+
+        Pages already found are kept and only the rest of its frontier is
+        crawled. ``job_options`` override the job's saved options, e.g. to
+        pass its link rules again.
+        """
+        if self.checkpoint is None:
+            raise ValueError("Crawl checkpoints are not enabled")
+        managed = self.jobs.get(job_id)
+        if managed is not None and not managed.info.finished:
+            raise RuntimeError("This crawl is still running")
+        return self._start(owner, CrawlJob.resume(self.checkpoint, job_id, **job_options))
+
+    def resumable(self, owner: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Checkpointed jobs not running here, e.g. from before a restart, newest first
+
+        Their state is "failed", or "interrupted" for jobs that stopped without finishing.
+        """
+        if self.checkpoint is None:
+            return []
+        jobs = [job for job in self.checkpoint.jobs(owner) if job['job_id'] not in self.jobs]
+        for job in jobs:
+            if job['state'] != "failed":
+                job['state'] = "interrupted"
+        return jobs
+
+    def discard(self, job_id: str, owner: Optional[str] = None) -> bool:
+        """Delete the checkpoint of a job that is not running, if ``owner`` (when given) saved it"""
+        if self.checkpoint is None or job_id in self.jobs:
+            return False
+        if owner is not None and (self.checkpoint.job(job_id) or {}).get('owner') != owner:
+            return False
+        self.checkpoint.delete(job_id)
+        return True
+
+    def _start(self, owner: str, job: CrawlJob) -> str:
+        if not job.crawlers:
+            raise ValueError("No valid URLs to crawl: " + "; ".join(f"{url}: {error}" for url, error in job.errors.items()))
+
+        loop = self._ensure_loop()
+        job_id = job.job_id
+        with self.lock:
+            self._prune()
+            active = sum(1 for managed in self.jobs.values()
+                         if managed.info.owner == owner and not managed.info.finished)
+            if active >= self.max_per_owner:
+                raise RuntimeError("A crawl is already running. Wait for it to finish or cancel it first.")
+            managed = _ManagedJob(job_id, owner, job)
+            self.jobs[job_id] = managed
+        if self.checkpoint is not None:
+            self.checkpoint.save_job(job_id, owner, job.seeds, job.options)
+        managed.future = asyncio.run_coroutine_threadsafe(self._run(managed), loop)
+        managed.future.add_done_callback(lambda future: self._on_done(managed, future))
+        return job_id
+
+    def _on_done(self, managed: _ManagedJob, future: Any) -> None:
+        # Cancelling marks the future done at once, while a started job is still
+        # stopping and saving its checkpoint; only a job that never started ends here
+        info = managed.info
+        with self.lock:
+            if not managed.started and not info.finished:
+                info.finished_at = time.time()
+                info.state = "cancelled" if future.cancelled() else "failed"
+
+    def status(self, job_id: str) -> Optional[JobInfo]:
+        """Return a snapshot of the job, or None if it is unknown"""
+        managed = self.jobs.get(job_id)
+        if managed is None:
+            return None
+        info = managed.info
+        if not info.finished:
+            info.progress = managed.job.progress
+            info.pages_found = managed.job.pages_found
+        elif info.state == "done":
+            info.progress = 1.0
+            info.pages_found = len(managed.job.results)
+        info.messages = list(managed.status.messages)
+        return replace(info)
+
+    def cancel(self, job_id: str) -> bool:
+        """Request cancellation of a queued or running job"""
+        managed = self.jobs.get(job_id)
+        if managed is None or managed.info.finished or managed.future is None:
+            return False
+        return managed.future.cancel()
+
+    def collect(self, job_id: str) -> Optional[CrawlJob]:
+        """Hand off a finished job's results and forget it"""
+        with self.lock:
+            managed = self.jobs.get(job_id)
+            if managed is None or not managed.info.finished:
+                return None
+            del self.jobs[job_id]
+        if self.checkpoint is not None and managed.info.state != "failed":
+            self.checkpoint.delete(job_id)  # A failed job stays resumable
+        return managed.job
+
+def crawl_sites(seeds: List[str], max_depth: int = 2, max_pages: int = 50, status: Any = None,
+                topic: Optional[str] = None) -> List[CrawlResult]:
+    """Synchronous wrapper for a multi-site crawl job"""
+    job = CrawlJob(seeds, max_depth=max_depth, max_pages=max_pages, topic=topic)
+    return asyncio.run(job.run(status))
@@ -0,0 +1,144 @@
+from typing import List, Dict, Optional, Iterable, Tuple, Set
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+import fnmatch
+import re
+from .metrics import REGISTRY
+
+LINKS_FILTERED = REGISTRY.counter("crawler_links_total", "Same-site links found, by whether they were queued or why not")
+
+# Links to these are not HTML pages; fetching them only to discard them wastes the page budget
+DEFAULT_DENY_EXTENSIONS = frozenset({
+    'pdf', 'ps', 'eps', 'doc', 'docx', 'xls', 'xlsx', 'ppt', 'pptx', 'odt', 'ods', 'odp', 'rtf', 'epub',
+    'jpg', 'jpeg', 'png', 'gif', 'webp', 'svg', 'ico', 'bmp', 'tif', 'tiff', 'avif', 'heic',
+    'mp3', 'wav', 'ogg', 'flac', 'm4a', 'aac', 'mp4', 'm4v', 'mov', 'avi', 'mkv', 'webm', 'wmv', 'flv',
+    'zip', 'gz', 'tgz', 'tar', 'bz2', 'xz', 'rar', '7z', 'jar', 'war', 'iso', 'img', 'dmg', 'exe', 'msi',
+    'apk', 'deb', 'rpm', 'bin', 'css', 'js', 'mjs', 'map', 'woff', 'woff2', 'ttf', 'otf', 'eot',
+    'rss', 'atom', 'ics', 'vcf', 'csv', 'tsv', 'sql', 'db', 'swf',
+})
+# Session-ending, editing and endless calendar/print links
+DEFAULT_EXCLUDE = (
+    '*/logout*', '*/log-out*', '*/signout*', '*/sign-out*', '*/wp-admin/*', '*/wp-login.php*',
+    '*action=edit*', '*action=history*', '*/print/*', '*?print=*', '*&print=*',
+    r're:/calendar/.*\d{4}[-/]\d{1,2}', r're:[?&](?:month|date|year)=\d',
+)
+# Tracking and session parameters that change the URL but not the page
+DEFAULT_STRIP_PARAMS = ('utm_*', 'fbclid', 'gclid', 'dclid', 'msclkid', 'mc_cid', 'mc_eid', '_ga', '_gl',
+                        'ref', 'ref_src', 'sessionid', 'sid', 'phpsessid', 'jsessionid', 'replytocom')
+
+def compile_patterns(patterns: Iterable[str]) -> Optional['re.Pattern']:
+    """One case-insensitive regex matching any pattern: a glob over the whole URL, or ``re:`` and a regex searched for"""
+    parts = []
+    for pattern in patterns:
+        pattern = pattern.strip()
+        if not pattern:
+            continue
+        if pattern.startswith('re:'):
+            parts.append(f"(?:.*?(?:{pattern[3:]}))")
+        else:
+            parts.append(f"(?:{fnmatch.translate(pattern)})")
+    return re.compile('|'.join(parts), re.IGNORECASE) if parts else None
+
+def parse_prefix_caps(lines: Iterable[str]) -> Dict[str, int]:
+    """Path prefix caps from ``"/blog/=20"`` lines"""
+    caps = {}
+    for line in lines:
+        if '=' in line:
+            prefix, cap = line.rsplit('=', 1)
+            caps['/' + prefix.strip().lstrip('/')] = int(cap)
+    return caps
+
+class LinkRules:
+    """Include/exclude rules for links found while crawling, compiled once
+
+    Applied before a link is queued:
+
+    - its query string loses tracking and session parameters
+      (``strip_params``, glob names) and the rest are sorted, so permutations
+      of one page become one URL;
+    - links whose path ends in a ``deny_extensions`` extension are dropped;
+    - with ``include`` patterns, only links matching one are kept, and links
+      matching an ``exclude`` pattern are dropped. Patterns are globs over the
+      whole URL, or regexes searched for when prefixed with ``re:``;
+    - ``max_query_params`` drops links with more parameters than that;
+    - ``prefix_caps`` (path prefix to count) limits how many links under a
+      prefix are queued per crawl; the longest matching prefix applies.
+
+    Rules hold no crawl state and can be shared; the counts for the caps
+    live in a LinkFilter per crawl.
+    """
+
+    def __init__(self, include: Iterable[str] = (), exclude: Iterable[str] = DEFAULT_EXCLUDE,
+                 deny_extensions: Iterable[str] = DEFAULT_DENY_EXTENSIONS,
+                 strip_params: Iterable[str] = DEFAULT_STRIP_PARAMS, max_query_params: Optional[int] = 8,
+                 prefix_caps: Optional[Dict[str, int]] = None):
+        self.include = compile_patterns(include)
+        self.exclude = compile_patterns(exclude)
+        self.deny_extensions = frozenset(extension.lower().lstrip('.') for extension in deny_extensions)
+        strip_params = [name.lower() for name in strip_params]
+        self.strip_exact = frozenset(name for name in strip_params if not any(c in name for c in '*?['))
+        self.strip_glob = compile_patterns(name for name in strip_params if name not in self.strip_exact)
+        self.max_query_params = max_query_params
+        # Longest first, so the most specific prefix is found first
+        self.prefix_caps: List[Tuple[str, int]] = sorted((prefix_caps or {}).items(), key=lambda item: -len(item[0]))
+
+    def _keep_param(self, name: str) -> bool:
+        name = name.lower()
+        return name not in self.strip_exact and not (self.strip_glob and self.strip_glob.match(name))
+
+    def normalize(self, url: str) -> str:
+        """URL without stripped parameters, remaining parameters sorted"""
+        parts = urlsplit(url)
+        if not parts.query:
+            return url
+        params = sorted(param for param in parse_qsl(parts.query, keep_blank_values=True) if self._keep_param(param[0]))
+        return urlunsplit(parts._replace(query=urlencode(params)))
+
+    def reject_reason(self, url: str) -> Optional[str]:
+        """Why a normalized URL is not worth fetching, or None"""
+        parts = urlsplit(url)
+        name = parts.path.rsplit('/', 1)[-1]
+        if '.' in name and name.rsplit('.', 1)[1].lower() in self.deny_extensions:
+            return "extension"
+        if self.include is not None and not self.include.match(url):
+            return "not_included"
+        if self.exclude is not None and self.exclude.match(url):
+            return "excluded"
+        if self.max_query_params is not None and parts.query and parts.query.count('&') >= self.max_query_params:
+            return "query_params"
+        return None
+
+    def prefix_cap(self, path: str) -> Optional[Tuple[str, int]]:
+        for prefix, cap in self.prefix_caps:
+            if path.startswith(prefix):
+                return prefix, cap
+        return None
+
+class LinkFilter:
+    """LinkRules applied during one crawl, counting links per capped prefix"""
+
+    def __init__(self, rules: LinkRules):
+        self.rules = rules
+        self.admitted: Set[str] = set()
+        self.prefix_counts: Dict[str, int] = {}
+
+    def admit(self, url: str) -> Optional[str]:
+        """The URL to queue for a link, normalized, or None to skip it"""
+        url = self.rules.normalize(url)
+        if url in self.admitted:
+            return url  # Found again on another page; counts as an in-link, not against a cap
+        reason = self.rules.reject_reason(url)
+        if reason is None and self.rules.prefix_caps:
+            capped = self.rules.prefix_cap(urlsplit(url).path)
+            if capped is not None:
+                prefix, cap = capped
+                if self.prefix_counts.get(prefix, 0) >= cap:
+                    reason = "prefix_cap"
+                else:
+                    self.prefix_counts[prefix] = self.prefix_counts.get(prefix, 0) + 1
+        LINKS_FILTERED.inc(result=reason or "queued")
+        if reason is not None:
+            return None
+        self.admitted.add(url)
+        return url
+
+DEFAULT_LINK_RULES = LinkRules()
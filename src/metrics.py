@@ -0,0 +1,251 @@
+from typing import List, Dict, Optional, Any, Tuple
+from bisect import bisect_left
+from contextlib import contextmanager
+from threading import Lock
+import json
+import math
+import time
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+# Seconds, from sub-millisecond parsing up to slow page downloads and completions
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+def _format_labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    escaped = (name + '="' + value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+               for name, value in key)
+    return "{" + ",".join(escaped) + "}"
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self.lock = Lock()
+
+class Counter(_Metric):
+    """Monotonically increasing value, optionally split by labels"""
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text)
+        self.values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = _label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def get(self, **labels: Any) -> float:
+        return self.values.get(_label_key(labels), 0.0)
+
+    def samples(self) -> List[Tuple[str, LabelKey, float]]:
+        with self.lock:
+            return [(self.name, key, value) for key, value in self.values.items()]
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self.lock:
+            return {"type": self.kind, "help": self.help_text,
+                    "values": [{"labels": dict(key), "value": value} for key, value in self.values.items()]}
+
+class Gauge(Counter):
+    """Value that can go up and down, such as a queue depth"""
+    kind = "gauge"
+
+    def set(self, value: float, **labels: Any) -> None:
+        with self.lock:
+            self.values[_label_key(labels)] = value
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+class _HistogramSeries:
+    def __init__(self, bucket_count: int):
+        self.counts = [0] * (bucket_count + 1)  # Last slot is the +Inf bucket
+        self.count = 0
+        self.total = 0.0
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets"""
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(sorted(buckets))
+        self.series: Dict[LabelKey, _HistogramSeries] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = _label_key(labels)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = _HistogramSeries(len(self.buckets))
+            series.counts[bisect_left(self.buckets, value)] += 1
+            series.count += 1
+            series.total += value
+
+    @contextmanager
+    def time(self, **labels: Any):
+        """Observe the duration of the enclosed block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def percentile(self, q: float, **labels: Any) -> Optional[float]:
+        """Estimate a percentile (0-100) by interpolating within its bucket"""
+        series = self.series.get(_label_key(labels))
+        return self._percentile(series, q) if series else None
+
+    def _percentile(self, series: _HistogramSeries, q: float) -> Optional[float]:
+        if not series.count:
+            return None
+        rank = q / 100 * series.count
+        seen = 0
+        for index, count in enumerate(series.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else lower
+                return lower + (upper - lower) * ((rank - seen) / count)
+            seen += count
+        return self.buckets[-1]
+
+    def samples(self) -> List[Tuple[str, LabelKey, float]]:
+        samples = []
+        with self.lock:
+            for key, series in self.series.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets + (math.inf,), series.counts):
+                    cumulative += count
+                    samples.append((f"{self.name}_bucket", key + (("le", _format_value(bound)),), cumulative))
+                samples.append((f"{self.name}_sum", key, series.total))
+                samples.append((f"{self.name}_count", key, series.count))
+        return samples
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self.lock:
+            values = [{
+                "labels": dict(key),
+                "count": series.count,
+                "sum": series.total,
+                "p50": self._percentile(series, 50),
+                "p95": self._percentile(series, 95),
+                "p99": self._percentile(series, 99),
+                "buckets": dict(zip([_format_value(b) for b in self.buckets + (math.inf,)], series.counts))
+            } for key, series in self.series.items()]
+        return {"type": self.kind, "help": self.help_text, "values": values}
+
+class MetricsRegistry:
+    """Named collection of metrics with Prometheus text and JSON export"""
+
+    def __init__(self):
+        self.metrics: Dict[str, _Metric] = {}
+        self.lock = Lock()
+
+    def _get_or_create(self, cls: type, name: str, help_text: str, **kwargs: Any) -> Any:
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, help_text, **kwargs)
+            elif type(metric) is not cls:
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name: str, help_text: str = "") -> Counter:
+        return self._get_or_create(Counter, name, help_text)
+
+    def gauge(self, name: str, help_text: str = "") -> Gauge:
+        return self._get_or_create(Gauge, name, help_text)
+
+    def histogram(self, name: str, help_text: str = "", buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help_text, buckets=buckets)
+
+    def reset(self) -> None:
+        """Drop all recorded values, keeping the registered metrics"""
+        for metric in list(self.metrics.values()):
+            with metric.lock:
+                if isinstance(metric, Histogram):
+                    metric.series.clear()
+                else:
+                    metric.values.clear()
+
+    def to_prometheus(self) -> str:
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            lines.append(f"# HELP {name} {metric.help_text}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for sample_name, key, value in metric.samples():
+                lines.append(f"{sample_name}{_format_labels(key)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: metric.to_dict() for name, metric in sorted(self.metrics.items())}
+
+    def to_json(self, indent: Optional[int] = 2) -> str:
+        return json.dumps(self.to_dict(), indent=indent)
+
+# Process-wide registry used by the crawler, chat client and file processor
+REGISTRY = MetricsRegistry()
+
+def http_trace_config(registry: MetricsRegistry = REGISTRY) -> Any:
+    """aiohttp TraceConfig recording DNS, connect and time-to-first-byte per request"""
+    import aiohttp
+
+    dns_seconds = registry.histogram("crawler_dns_seconds", "DNS resolution time per lookup")
+    connect_seconds = registry.histogram("crawler_connect_seconds", "Time to open a new connection")
+    ttfb_seconds = registry.histogram("crawler_ttfb_seconds", "Request start until response headers")
+    dns_cache = registry.counter("crawler_dns_cache_total", "aiohttp DNS cache lookups by result")
+    connections = registry.counter("crawler_connections_total", "Connections by reuse")
+
+    async def on_request_start(session, ctx, params):
+        ctx.request_start = time.perf_counter()
+
+    async def on_request_end(session, ctx, params):
+        ttfb_seconds.observe(time.perf_counter() - ctx.request_start)
+
+    async def on_dns_start(session, ctx, params):
+        ctx.dns_start = time.perf_counter()
+
+    async def on_dns_end(session, ctx, params):
+        dns_seconds.observe(time.perf_counter() - ctx.dns_start)
+
+    async def on_connection_start(session, ctx, params):
+        ctx.connect_start = time.perf_counter()
+
+    async def on_connection_end(session, ctx, params):
+        connect_seconds.observe(time.perf_counter() - ctx.connect_start)
+        connections.inc(reused="false")
+
+    async def on_connection_reuse(session, ctx, params):
+        connections.inc(reused="true")
+
+    async def on_dns_cache_hit(session, ctx, params):
+        dns_cache.inc(result="hit")
+
+    async def on_dns_cache_miss(session, ctx, params):
+        dns_cache.inc(result="miss")
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_request_end.append(on_request_end)
+    trace_config.on_dns_resolvehost_start.append(on_dns_start)
+    trace_config.on_dns_resolvehost_end.append(on_dns_end)
+    trace_config.on_connection_create_start.append(on_connection_start)
+    trace_config.on_connection_create_end.append(on_connection_end)
+    trace_config.on_connection_reuseconn.append(on_connection_reuse)
+    trace_config.on_dns_cache_hit.append(on_dns_cache_hit)
+    trace_config.on_dns_cache_miss.append(on_dns_cache_miss)
+    return trace_config
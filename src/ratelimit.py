@@ -0,0 +1,299 @@
+from typing import List, Dict, Optional, Any, Tuple
+from collections import deque
+from threading import Lock
+from urllib.parse import urlparse, unquote
+import asyncio
+import os
+import socket
+import sqlite3
+import threading
+import time
+from .metrics import REGISTRY
+
+RATE_LIMIT_DECISIONS = REGISTRY.counter("rate_limit_decisions_total", "Rate limiter slot requests by backend and result")
+RATE_LIMIT_WAIT_SECONDS = REGISTRY.histogram("rate_limit_wait_seconds", "Time spent waiting for a rate limiter slot")
+
+class MemoryBackend:
+    """Sliding-window request log per key, shared by the threads of one process"""
+    name = "memory"
+    blocking_io = False
+
+    def __init__(self):
+        self.logs: Dict[str, deque] = {}
+        self.lock = Lock()
+
+    def try_acquire(self, key: str, limit: int, window: float) -> Tuple[bool, float]:
+        """Take a slot for key; returns (acquired, seconds until one may free up)"""
+        now = time.time()
+        with self.lock:
+            log = self.logs.setdefault(key, deque())
+            while log and log[0] <= now - window:
+                log.popleft()
+            if len(log) >= limit:
+                return False, log[0] + window - now if log else window
+            log.append(now)
+            return True, 0.0
+
+class SQLiteBackend:
+    """Sliding-window request log in an SQLite file, shared by every process on the host
+
+    Each slot is taken in an immediate transaction, so concurrent processes
+    cannot both take the last one.
+    """
+    name = "sqlite"
+    blocking_io = True
+
+    def __init__(self, path: str, timeout: float = 10.0):
+        self.path = path
+        self.timeout = timeout
+        self.local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._connection()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS rate_limit_hits (key TEXT NOT NULL, at REAL NOT NULL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS rate_limit_hits_key_at ON rate_limit_hits (key, at)")
+            self.local.connection = connection
+        return connection
+
+    def try_acquire(self, key: str, limit: int, window: float) -> Tuple[bool, float]:
+        """Take a slot for key; returns (acquired, seconds until one may free up)"""
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            connection.execute("DELETE FROM rate_limit_hits WHERE key = ? AND at <= ?", (key, now - window))
+            count, oldest = connection.execute(
+                "SELECT COUNT(*), MIN(at) FROM rate_limit_hits WHERE key = ?", (key,)).fetchone()
+            if count >= limit:
+                connection.execute("COMMIT")
+                return False, oldest + window - now if oldest is not None else window
+            connection.execute("INSERT INTO rate_limit_hits (key, at) VALUES (?, ?)", (key, now))
+            connection.execute("COMMIT")
+            return True, 0.0
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+class RedisError(Exception):
+    """Error reply from a Redis server"""
+
+class RedisConnection:
+    """Minimal RESP client: enough commands for rate limiting, without a redis package dependency"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 6379, db: int = 0,
+                 password: Optional[str] = None, timeout: float = 5.0):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self.sock: Optional[socket.socket] = None
+        self.reader = None
+        self.lock = Lock()
+
+    def _connect(self) -> None:
+        self.sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile('rb')
+        setup = []
+        if self.password:
+            setup.append(("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        if setup:
+            self._send(setup)
+            for _ in setup:
+                self._read_reply()
+
+    def close(self) -> None:
+        if self.sock is not None:
+            try:
+                self.reader.close()
+                self.sock.close()
+            finally:
+                self.sock = self.reader = None
+
+    @staticmethod
+    def _encode(command: Tuple[Any, ...]) -> bytes:
+        parts = [b"*%d\r\n" % len(command)]
+        for arg in command:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(parts)
+
+    def _send(self, commands: List[Tuple[Any, ...]]) -> None:
+        self.sock.sendall(b"".join(self._encode(command) for command in commands))
+
+    def _read_reply(self) -> Any:
+        line = self.reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Connection closed by Redis server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RedisError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self.reader.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            length = int(rest)
+            return None if length < 0 else [self._read_reply() for _ in range(length)]
+        raise ConnectionError(f"Unexpected reply from Redis server: {line!r}")
+
+    def pipeline(self, *commands: Tuple[Any, ...]) -> List[Any]:
+        """Send several commands in one round trip and return their replies in order
+
+        Error replies are returned as RedisError instances rather than raised.
+        """
+        with self.lock:
+            for attempt in range(2):
+                try:
+                    if self.sock is None:
+                        self._connect()
+                    self._send(list(commands))
+                    replies = []
+                    for _ in commands:
+                        try:
+                            replies.append(self._read_reply())
+                        except RedisError as e:
+                            replies.append(e)
+                    return replies
+                except OSError:
+                    # A pooled connection the server has since closed: reconnect once
+                    self.close()
+                    if attempt:
+                        raise
+
+    def command(self, *args: Any) -> Any:
+        reply = self.pipeline(args)[0]
+        if isinstance(reply, RedisError):
+            raise reply
+        return reply
+
+class RedisBackend:
+    """Sliding-window counters in Redis, shared by every process and replica using the server
+
+    Uses the two-window approximation: the previous fixed window's count is
+    weighted by how much of it still overlaps the sliding window. Only INCR,
+    DECR, GET and PEXPIRE are needed, so any Redis-protocol server works.
+    """
+    name = "redis"
+    blocking_io = True
+
+    def __init__(self, url: str = "redis://127.0.0.1:6379/0", prefix: str = "ratelimit:", timeout: float = 5.0):
+        parsed = urlparse(url)
+        db = parsed.path.strip('/')
+        self.connection = RedisConnection(parsed.hostname or "127.0.0.1", parsed.port or 6379,
+                                          int(db) if db else 0,
+                                          unquote(parsed.password) if parsed.password else None, timeout)
+        self.prefix = prefix
+
+    def try_acquire(self, key: str, limit: int, window: float) -> Tuple[bool, float]:
+        """Take a slot for key; returns (acquired, seconds until one may free up)"""
+        window_ms = max(int(window * 1000), 1)
+        now_ms = int(time.time() * 1000)
+        slot, elapsed = divmod(now_ms, window_ms)
+        current = f"{self.prefix}{key}:{slot}"
+        previous = f"{self.prefix}{key}:{slot - 1}"
+        count, _, previous_count = self.connection.pipeline(
+            ("INCR", current), ("PEXPIRE", current, window_ms * 2), ("GET", previous))
+        if isinstance(count, RedisError):
+            raise count
+        previous_count = int(previous_count) if previous_count and not isinstance(previous_count, RedisError) else 0
+        weight = 1 - elapsed / window_ms
+        if count + previous_count * weight <= limit:
+            return True, 0.0
+        self.connection.command("DECR", current)  # A refused request does not count
+        if count > limit or not previous_count:
+            return False, (window_ms - elapsed) / 1000
+        # Wait until enough of the previous window has slid out to make room
+        needed = (count + previous_count * weight - limit) / previous_count
+        return False, max(needed * window, 0.01)
+
+def create_backend(url: Optional[str] = None):
+    """Backend from a URL: ``memory``, ``sqlite:///path/to/file.db`` or ``redis://host:port/db``"""
+    if not url or url == "memory":
+        return MemoryBackend()
+    if url.startswith("sqlite://"):
+        path = url[len("sqlite://"):]
+        return SQLiteBackend(path[1:] if path.startswith('/') else path)  # sqlite:////abs/path or sqlite:///relative
+    if url.startswith(("redis://", "rediss://")):
+        return RedisBackend(url)
+    raise ValueError(f"Unknown rate limit backend: {url}")
+
+class RateLimiter:
+    """Sliding-window limit of ``max_requests`` per ``time_window`` seconds for each key
+
+    The request log lives in a pluggable backend: in this process (the
+    default), an SQLite file shared by processes on one host, or a Redis
+    server shared by replicas. Keys give separate buckets, e.g. one per API
+    key or per API key and model. If a shared backend fails the limiter falls
+    back to counting in this process rather than blocking every request.
+    """
+
+    def __init__(self, max_requests: int = 60, time_window: int = 60, backend: Any = None,
+                 key: str = "default"):
+        self.max_requests = max_requests
+        self.time_window = time_window
+        self.backend = backend or MemoryBackend()
+        self.key = key
+        self.fallback = MemoryBackend()
+
+    def try_acquire(self, key: Optional[str] = None) -> Tuple[bool, float]:
+        key = key or self.key
+        backend = self.backend
+        try:
+            acquired, wait = backend.try_acquire(key, self.max_requests, self.time_window)
+        except (OSError, sqlite3.Error, RedisError):
+            backend = self.fallback
+            RATE_LIMIT_DECISIONS.inc(backend=self.backend.name, result="backend_error")
+            acquired, wait = backend.try_acquire(key, self.max_requests, self.time_window)
+        RATE_LIMIT_DECISIONS.inc(backend=backend.name, result="allowed" if acquired else "limited")
+        return acquired, wait
+
+    def check_limit(self, key: Optional[str] = None) -> bool:
+        """Check if we're within rate limits, taking a slot if so"""
+        return self.try_acquire(key)[0]
+
+    def acquire(self, timeout: float = 0.0, key: Optional[str] = None) -> bool:
+        """Take a request slot, waiting up to timeout seconds for one to free up"""
+        started = time.time()
+        deadline = started + timeout
+        while True:
+            acquired, wait = self.try_acquire(key)
+            if acquired:
+                break
+            if time.time() + wait > deadline:
+                return False
+            time.sleep(max(wait, 0.01))
+        RATE_LIMIT_WAIT_SECONDS.observe(time.time() - started, backend=self.backend.name)
+        return True
+
+    async def acquire_async(self, timeout: float = 0.0, key: Optional[str] = None) -> bool:
+        """Like acquire, but waits without blocking the event loop"""
+        started = time.time()
+        deadline = started + timeout
+        while True:
+            if self.backend.blocking_io:
+                acquired, wait = await asyncio.to_thread(self.try_acquire, key)
+            else:
+                acquired, wait = self.try_acquire(key)
+            if acquired:
+                break
+            if time.time() + wait > deadline:
+                return False
+            await asyncio.sleep(max(wait, 0.01))
+        RATE_LIMIT_WAIT_SECONDS.observe(time.time() - started, backend=self.backend.name)
+        return True
\ No newline at end of file
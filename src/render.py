@@ -0,0 +1,76 @@
+from typing import List, Dict, Any, Tuple, Optional
+from collections import OrderedDict
+from threading import Lock
+import hashlib
+import re
+from .metrics import REGISTRY
+
+RENDER_CACHE_LOOKUPS = REGISTRY.counter("chat_render_cache_lookups_total",
+                                        "Chat message markdown render cache lookups by result")
+
+_FENCE_RE = re.compile(r'^ {0,3}(`{3,}|~{3,})(.*)$', re.MULTILINE)
+
+def message_key(message: Dict[str, Any]) -> str:
+    """Hash of a message's role and content"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(message.get('role', '')).encode())
+    digest.update(b'\0')
+    digest.update(str(message.get('content', '')).encode('utf-8', 'surrogatepass'))
+    return digest.hexdigest()
+
+def close_code_fences(text: str) -> str:
+    """Close a code block left open, e.g. by a response cut off at max_tokens
+
+    An unclosed fence would render the rest of the message, and anything
+    appended to it, as code.
+    """
+    open_fence: Optional[str] = None
+    for match in _FENCE_RE.finditer(text):
+        fence, rest = match.groups()
+        if open_fence is None:
+            open_fence = fence
+        elif fence[0] == open_fence[0] and len(fence) >= len(open_fence) and not rest.strip():
+            open_fence = None
+    if open_fence is None:
+        return text
+    return f"{text}\n{open_fence}"
+
+def prepare_markdown(text: str) -> str:
+    """Markdown of a chat message as passed to st.markdown"""
+    return close_code_fences(text.rstrip())
+
+class MarkdownCache:
+    """LRU cache of prepared message markdown, keyed by message hash
+
+    Shared across sessions; a message is prepared once however often the
+    history is rerendered or however many sessions show it.
+    """
+
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, str]" = OrderedDict()
+        self.lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, message: Dict[str, Any]) -> str:
+        key = message_key(message)
+        with self.lock:
+            markdown = self.entries.get(key)
+            if markdown is not None:
+                self.entries.move_to_end(key)
+                RENDER_CACHE_LOOKUPS.inc(result="hit")
+                return markdown
+        RENDER_CACHE_LOOKUPS.inc(result="miss")
+        markdown = prepare_markdown(str(message.get('content', '')))
+        with self.lock:
+            self.entries[key] = markdown
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return markdown
+
+def history_window(messages: List[Dict[str, Any]], shown: int) -> Tuple[int, List[Dict[str, Any]]]:
+    """The last ``shown`` messages, and how many earlier ones are hidden"""
+    hidden = max(len(messages) - shown, 0)
+    return hidden, messages[hidden:]
@@ -0,0 +1,194 @@
+from typing import List, Dict, Optional, Any, Iterable, Tuple
+from urllib.parse import urljoin, urlparse
+import asyncio
+import ipaddress
+import socket
+import time
+from .metrics import REGISTRY
+
+DNS_LOOKUPS = REGISTRY.counter("crawler_dns_lookups_total",
+                               "Crawler host lookups by result: hit, miss, refresh, failed or blocked")
+DNS_RESOLVE_SECONDS = REGISTRY.histogram("crawler_dns_resolve_seconds", "getaddrinfo time for lookups not served from cache")
+
+AddressInfo = Tuple[int, int, str]  # family, proto, address
+
+class BlockedAddressError(OSError):
+    """A host resolves to, or is, an address the crawler may not connect to"""
+
+def is_public_address(address: str) -> bool:
+    """False for private, loopback, link-local, multicast, reserved and unspecified addresses"""
+    ip = ipaddress.ip_address(address.split('%', 1)[0])  # Drop an IPv6 zone index
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return not (ip.is_private or ip.is_loopback or ip.is_link_local or ip.is_multicast
+                or ip.is_reserved or ip.is_unspecified)
+
+def is_ip_literal(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host.strip('[]').split('%', 1)[0])
+    except ValueError:
+        return False
+    return True
+
+def check_host(host: Optional[str]) -> None:
+    """Reject IP literal hosts that are not public; names are checked when resolved"""
+    if host and is_ip_literal(host) and not is_public_address(host.strip('[]')):
+        DNS_LOOKUPS.inc(result="blocked")
+        raise BlockedAddressError(f"Connections to {host} are not allowed")
+
+class DNSCache:
+    """Resolved addresses by (host, family) with expiry times, shared by every crawl in the process
+
+    ``getaddrinfo`` does not report record TTLs, so entries live for the
+    resolver's ``ttl``; failed lookups are remembered for ``negative_ttl``.
+    """
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self.entries: Dict[Tuple[str, int], Tuple[float, float, Any]] = {}  # key -> (stored, expires, infos or error)
+
+    def get(self, key: Tuple[str, int]) -> Optional[Tuple[float, float, Any]]:
+        entry = self.entries.get(key)
+        if entry is not None and entry[1] <= time.monotonic():
+            del self.entries[key]
+            return None
+        return entry
+
+    def put(self, key: Tuple[str, int], value: Any, ttl: float) -> None:
+        if len(self.entries) >= self.max_entries and key not in self.entries:
+            del self.entries[min(self.entries, key=lambda k: self.entries[k][1])]  # Soonest to expire
+        now = time.monotonic()
+        self.entries[key] = (now, now + ttl, value)
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+DNS_CACHE = DNSCache()
+
+class CachingResolver:
+    """aiohttp resolver that caches lookups across crawls and refuses non-public addresses
+
+    Used as ``TCPConnector(resolver=...)``. Concurrent lookups of one host
+    share a single ``getaddrinfo`` call. Once an entry has lived for
+    ``refresh_after`` of its TTL it is still returned, and refreshed in the
+    background, so hosts that are crawled regularly never wait for DNS. With
+    ``allow_private`` unset, a host with any private, loopback or link-local
+    address is refused: checking the resolved addresses, rather than the URL,
+    also covers redirects and names pointing at internal addresses.
+    """
+
+    def __init__(self, cache: Optional[DNSCache] = None, ttl: float = 300.0, negative_ttl: float = 30.0,
+                 refresh_after: float = 0.8, allow_private: bool = False):
+        self.cache = cache if cache is not None else DNS_CACHE
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.refresh_after = refresh_after
+        self.allow_private = allow_private
+        self.pending: Dict[Tuple[str, int], asyncio.Future] = {}
+        self.tasks: set = set()
+
+    async def _lookup(self, host: str, family: int) -> List[AddressInfo]:
+        started = time.perf_counter()
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(host, 0, type=socket.SOCK_STREAM, family=family)
+        finally:
+            DNS_RESOLVE_SECONDS.observe(time.perf_counter() - started)
+        addresses = []
+        for info_family, _, proto, _, sockaddr in infos:
+            if info_family == socket.AF_INET6 and len(sockaddr) >= 4 and sockaddr[3]:
+                address = f"{sockaddr[0].split('%', 1)[0]}%{sockaddr[3]}"  # Keep the scope of a link-local address
+            else:
+                address = sockaddr[0]
+            addresses.append((info_family, proto, address))
+        return addresses
+
+    def _fetch(self, key: Tuple[str, int]) -> asyncio.Future:
+        """Start a lookup for key, or join one already running"""
+        future = self.pending.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._lookup(*key))
+            self.pending[key] = future
+
+            def store(done: asyncio.Future) -> None:
+                self.pending.pop(key, None)
+                if done.cancelled():
+                    return
+                error = done.exception()
+                if error is None:
+                    self.cache.put(key, done.result(), self.ttl)
+                elif isinstance(error, OSError):
+                    self.cache.put(key, error, self.negative_ttl)
+
+            future.add_done_callback(store)
+        return future
+
+    async def _addresses(self, host: str, family: int) -> List[AddressInfo]:
+        key = (host, family)
+        entry = self.cache.get(key)
+        if entry is None:
+            DNS_LOOKUPS.inc(result="miss")
+            return await asyncio.shield(self._fetch(key))
+        stored, expires, value = entry
+        if isinstance(value, BaseException):
+            DNS_LOOKUPS.inc(result="failed")
+            raise type(value)(*value.args)
+        if time.monotonic() - stored >= (expires - stored) * self.refresh_after and key not in self.pending:
+            DNS_LOOKUPS.inc(result="refresh")
+            refresh = self._fetch(key)
+            self.tasks.add(refresh)
+            refresh.add_done_callback(self.tasks.discard)
+        else:
+            DNS_LOOKUPS.inc(result="hit")
+        return value
+
+    async def resolve(self, host: str, port: int = 0, family: int = socket.AF_INET) -> List[Dict[str, Any]]:
+        addresses = await self._addresses(host, family)
+        if not self.allow_private and not all(is_public_address(address) for _, _, address in addresses):
+            DNS_LOOKUPS.inc(result="blocked")
+            raise BlockedAddressError(f"{host} resolves to a private or local address")
+        return [{
+            'hostname': host, 'host': address, 'port': port, 'family': address_family,
+            'proto': proto, 'flags': socket.AI_NUMERICHOST | socket.AI_NUMERICSERV
+        } for address_family, proto, address in addresses]
+
+    async def prefetch(self, hosts: Iterable[str], family: int = socket.AF_UNSPEC) -> None:
+        """Resolve hosts concurrently ahead of their first fetch; failures are cached, not raised
+
+        ``family`` must match the connector's (``AF_UNSPEC`` by default) for
+        the fetches to find the entries.
+        """
+        names = {host for host in hosts if host and not is_ip_literal(host)}
+        await asyncio.gather(*(self._addresses(name, family) for name in names), return_exceptions=True)
+
+    async def close(self) -> None:
+        for task in list(self.tasks):
+            task.cancel()
+
+def address_guard_trace_config(allow_private: bool = False) -> Any:
+    """aiohttp TraceConfig refusing requests and redirects to non-public IP literal hosts
+
+    aiohttp connects to IP literals without calling the resolver, so these
+    are checked here instead.
+    """
+    import aiohttp
+
+    async def on_request_start(session, ctx, params):
+        check_host(params.url.host)
+
+    async def on_request_redirect(session, ctx, params):
+        location = params.response.headers.get('Location') or params.response.headers.get('URI')
+        if location:
+            check_host(urlparse(urljoin(str(params.url), location)).hostname)
+
+    trace_config = aiohttp.TraceConfig()
+    if not allow_private:
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_request_redirect.append(on_request_redirect)
+    return trace_config
+
+def create_connector(allow_private: bool = False, resolver: Optional[CachingResolver] = None, **kwargs: Any) -> Any:
+    """TCPConnector resolving through a CachingResolver in place of aiohttp's per-connector DNS cache"""
+    import aiohttp
+
+    resolver = resolver or CachingResolver(allow_private=allow_private)
+    return aiohttp.TCPConnector(resolver=resolver, use_dns_cache=False, **kwargs)
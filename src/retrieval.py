@@ -0,0 +1,96 @@
+from typing import List, Dict, Any, Tuple, NamedTuple
+from collections import Counter
+import heapq
+import math
+import re
+
+_TERM_RE = re.compile(r'\w+')
+
+def terms(text: str) -> List[str]:
+    """Lowercase word terms; very common words are left to the IDF weighting"""
+    return [term for term in _TERM_RE.findall(text.lower()) if len(term) > 1]
+
+def chunk_boundaries(text: str, chunk_chars: int = 1200, overlap: int = 200) -> List[Tuple[int, int]]:
+    """Split text into overlapping (start, end) spans, ending on whitespace where possible"""
+    spans = []
+    start = 0
+    length = len(text)
+    while start < length:
+        end = min(start + chunk_chars, length)
+        if end < length:
+            cut = text.rfind(' ', start + chunk_chars // 2, end)
+            if cut > start:
+                end = cut
+        spans.append((start, end))
+        if end >= length:
+            break
+        start = max(end - overlap, start + 1)
+    return spans
+
+class Passage(NamedTuple):
+    document: int  # Index into the indexed documents
+    start: int
+    end: int
+
+class RetrievalIndex:
+    """BM25 index over overlapping passages of a document set
+
+    Used to pick the passages most relevant to a question instead of the
+    first characters of every document.
+    """
+
+    def __init__(self, documents: List[Dict[str, Any]], chunk_chars: int = 1200, overlap: int = 200,
+                 k1: float = 1.5, b: float = 0.75):
+        self.documents = documents
+        self.chunk_chars = chunk_chars
+        self.overlap = overlap
+        self.k1 = k1
+        self.b = b
+        self.passages: List[Passage] = []
+        self.lengths: List[int] = []
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+
+        for doc_index, document in enumerate(documents):
+            content = str(document.get('content', ''))  # Also accepts CompressedText
+            for start, end in chunk_boundaries(content, chunk_chars, overlap):
+                passage_id = len(self.passages)
+                self.passages.append(Passage(doc_index, start, end))
+                counts = Counter(terms(content[start:end]))
+                self.lengths.append(sum(counts.values()))
+                for term, count in counts.items():
+                    self.postings.setdefault(term, []).append((passage_id, count))
+        self.average_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+
+    def __len__(self) -> int:
+        return len(self.passages)
+
+    def idf(self, term: str) -> float:
+        matches = len(self.postings.get(term, ()))
+        return math.log(1 + (len(self.passages) - matches + 0.5) / (matches + 0.5))
+
+    def search(self, query: str, top_k: int = 5) -> List[Tuple[float, Passage]]:
+        """Best passages for the query as (score, passage) pairs, highest first"""
+        scores: Dict[int, float] = {}
+        k1, b, average = self.k1, self.b, self.average_length or 1.0
+        for term in set(terms(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self.idf(term)
+            for passage_id, count in postings:
+                norm = k1 * (1 - b + b * self.lengths[passage_id] / average)
+                scores[passage_id] = scores.get(passage_id, 0.0) + idf * count * (k1 + 1) / (count + norm)
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        return [(score, self.passages[passage_id]) for passage_id, score in best]
+
+    def passage_text(self, passage: Passage) -> str:
+        return self.documents[passage.document].get('content', '')[passage.start:passage.end]
+
+    def context_documents(self, query: str, top_k: int = 8) -> List[Dict[str, Any]]:
+        """Best passages as document dicts for prepare_crawled_content, in document order"""
+        passages = sorted(passage for _, passage in self.search(query, top_k))
+        return [{
+            'url': self.documents[passage.document].get('url', ''),
+            'title': self.documents[passage.document].get('title', f"Document {passage.document + 1}"),
+            'content': self.passage_text(passage)
+        } for passage in passages]
\ No newline at end of file
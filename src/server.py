@@ -0,0 +1,455 @@
+"""
+Headless API server for crawling, documents and chat.
+
+Serves many clients from one process and one event loop: crawl jobs run as
+tasks on the server's loop, and chat answers are streamed from the API over
+a shared aiohttp session, so neither holds a thread per user. The Streamlit
+app is one possible client.
+
+    python -m src.server --port 8080
+
+Clients identify themselves with an ``X-Client-ID`` header (the remote
+address otherwise); each client has its own documents and crawl jobs. The
+header is not authenticated, so it keeps cooperating clients apart but is
+no isolation boundary: anyone who can reach the server, or holds its
+token, can name another client's ID and see its documents and jobs.
+"""
+
+from typing import List, Dict, Optional, Any
+from collections import OrderedDict
+from dataclasses import asdict
+import argparse
+import asyncio
+import io
+import json
+import math
+import os
+import time
+from aiohttp import web
+from .cache import ResponseCache
+from .chat import ChatAPI
+from .checkpoint import CrawlCheckpoint
+from .content import CompressedText
+from .context import prepare_crawled_content
+from .file_processor import FileProcessor
+from .jobs import CrawlJobManager, CrawlProgress
+from .metrics import REGISTRY
+from .ratelimit import RateLimiter, create_backend
+from .retrieval import RetrievalIndex
+from .transport import chat_trace_config, create_session
+
+SERVER_REQUESTS = REGISTRY.counter("server_requests_total", "API server requests by route and status")
+SERVER_SECONDS = REGISTRY.histogram("server_request_seconds", "API server request handling time by route")
+ACTIVE_STREAMS = REGISTRY.gauge("server_active_chat_streams", "Chat answers being streamed to clients")
+
+DEFAULT_BASE_URL = "https://openrouter.ai/api/v1"
+DEFAULT_SYSTEM_PROMPT = "You are a helpful AI assistant. Answer using the reference content."
+MAX_DOCUMENT_CHARS = 1_000_000  # Per uploaded document, as in the app
+
+class Workspace:
+    """A client's documents and the retrieval index over them"""
+
+    def __init__(self):
+        self.documents: List[Dict[str, Any]] = []
+        self.index: Optional[RetrievalIndex] = None
+        self.last_used = time.time()
+
+    def add(self, documents: List[Dict[str, Any]]) -> None:
+        self.documents.extend(documents)
+        self.index = None
+
+    def clear(self) -> None:
+        self.documents = []
+        self.index = None
+
+    async def context_documents(self, question: str, top_k: int) -> List[Dict[str, Any]]:
+        """Passages most relevant to the question; the index is rebuilt off the loop after documents change"""
+        if not self.documents:
+            return []
+        if self.index is None:
+            self.index = await asyncio.to_thread(RetrievalIndex, list(self.documents))
+        return self.index.context_documents(question, top_k)
+
+class APIServer:
+    """Request handlers and the state shared by every client"""
+
+    def __init__(self, base_url: str = DEFAULT_BASE_URL, api_key: Optional[str] = None, token: Optional[str] = None,
+                 max_jobs: int = 4, max_jobs_per_client: int = 1, max_depth: int = 5, max_pages: int = 500,
+                 allow_private: bool = False, requests_per_minute: int = 20, rate_limit_backend: Optional[str] = None,
+                 workspace_ttl: float = 3600.0, max_documents: int = 1000, checkpoint_path: Optional[str] = None,
+                 max_api_keys: int = 256):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.token = token
+        self.max_jobs = max_jobs
+        self.max_jobs_per_client = max_jobs_per_client
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.allow_private = allow_private
+        self.workspace_ttl = workspace_ttl
+        self.max_documents = max_documents
+        self.max_api_keys = max_api_keys
+        self.checkpoint = CrawlCheckpoint(checkpoint_path) if checkpoint_path else None
+        self.rate_limiter = RateLimiter(max_requests=requests_per_minute, time_window=60,
+                                        backend=create_backend(rate_limit_backend))
+        self.cache = ResponseCache(max_entries=512, ttl=24 * 3600)
+        self.file_processor = FileProcessor()
+        self.workspaces: Dict[str, Workspace] = {}
+        self.apis: OrderedDict = OrderedDict()  # API key -> ChatAPI, least recently used first
+        self.jobs: Optional[CrawlJobManager] = None
+        self.session: Optional[Any] = None  # aiohttp.ClientSession to the chat API
+        self.models: Dict[str, Any] = {}  # API key -> (fetched at, model list)
+
+    async def start(self, app: web.Application) -> None:
+        import aiohttp
+
+        self.jobs = CrawlJobManager(max_concurrent=self.max_jobs, max_per_owner=self.max_jobs_per_client,
+                                    loop=asyncio.get_running_loop(), checkpoint=self.checkpoint)
+        self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0, keepalive_timeout=60),
+                                             timeout=aiohttp.ClientTimeout(total=None, sock_connect=15, sock_read=60),
+                                             trace_configs=[chat_trace_config()])
+
+    async def stop(self, app: web.Application) -> None:
+        if self.jobs is not None:
+            for job_id in list(self.jobs.jobs):
+                self.jobs.cancel(job_id)
+        if self.session is not None:
+            await self.session.close()
+        for api_key in list(self.apis):
+            self.drop_api(api_key)
+
+    def client_id(self, request: web.Request) -> str:
+        """The client's self-declared name; unauthenticated, see the module docstring"""
+        return request.headers.get('X-Client-ID') or request.remote or "anonymous"
+
+    def workspace(self, request: web.Request) -> Workspace:
+        now = time.time()
+        for client, workspace in list(self.workspaces.items()):
+            if now - workspace.last_used > self.workspace_ttl:
+                del self.workspaces[client]
+        workspace = self.workspaces.setdefault(self.client_id(request), Workspace())
+        workspace.last_used = now
+        return workspace
+
+    def chat_api(self, request: web.Request) -> ChatAPI:
+        api_key = request.headers.get('X-OpenRouter-Key') or self.api_key
+        if not api_key:
+            raise web.HTTPUnauthorized(text=json.dumps({"error": "No API key: set OPENROUTER_API_KEY on the server "
+                                                                 "or send X-OpenRouter-Key"}),
+                                       content_type='application/json')
+        # Clients for keys unused for workspace_ttl, or beyond max_api_keys, are dropped like idle workspaces
+        now = time.time()
+        for key, api in list(self.apis.items()):
+            if now - api.last_used > self.workspace_ttl:
+                self.drop_api(key)
+        api = self.apis.get(api_key)
+        if api is None:
+            api = self.apis[api_key] = ChatAPI(self.base_url, api_key, session=create_session(), cache=self.cache)
+            api.rate_limiter = self.rate_limiter
+            api.rate_limit_wait = 30.0
+        api.last_used = now
+        self.apis.move_to_end(api_key)
+        while len(self.apis) > self.max_api_keys:
+            self.drop_api(next(iter(self.apis)))
+        return api
+
+    def drop_api(self, api_key: str) -> None:
+        """Forget a key's client and model list, closing its pooled connections"""
+        self.models.pop(api_key, None)
+        self.apis.pop(api_key).session.close()
+
+    @web.middleware
+    async def middleware(self, request: web.Request, handler: Any) -> web.StreamResponse:
+        route = request.match_info.route.resource.canonical if request.match_info.route.resource else "unmatched"
+        started = time.perf_counter()
+        status = 500
+        try:
+            if self.token and request.path != "/health" and request.headers.get('Authorization') != f"Bearer {self.token}":
+                raise web.HTTPUnauthorized(text=json.dumps({"error": "Invalid or missing server token"}),
+                                           content_type='application/json')
+            response = await handler(request)
+            status = response.status
+            return response
+        except web.HTTPException as e:
+            status = e.status
+            raise
+        finally:
+            SERVER_REQUESTS.inc(route=route, status=status)
+            SERVER_SECONDS.observe(time.perf_counter() - started, route=route)
+
+    async def read_json(self, request: web.Request) -> Dict[str, Any]:
+        try:
+            body = await request.json()
+        except ValueError:  # Malformed JSON, or a body that is not valid UTF-8
+            raise error(400, "Request body is not valid JSON")
+        if not isinstance(body, dict):
+            raise error(400, "Request body must be a JSON object")
+        return body
+
+    async def health(self, request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok"})
+
+    async def metrics(self, request: web.Request) -> web.Response:
+        if request.query.get('format') == 'json':
+            return web.Response(text=REGISTRY.to_json(), content_type='application/json')
+        return web.Response(text=REGISTRY.to_prometheus(), content_type='text/plain')
+
+    async def list_models(self, request: web.Request) -> web.Response:
+        api = self.chat_api(request)
+        fetched = self.models.get(api.api_key)
+        if fetched is None or time.time() - fetched[0] > 300:
+            models = await asyncio.to_thread(api.fetch_models)
+            if "error" in models:
+                raise error(502, str(models["error"]))
+            fetched = self.models[api.api_key] = (time.time(), models)
+        return web.json_response(fetched[1])
+
+    async def start_crawl(self, request: web.Request) -> web.Response:
+        body = await self.read_json(request)
+        seeds = body.get('seeds') or ([body['url']] if body.get('url') else [])
+        if not isinstance(seeds, list) or not seeds or not all(isinstance(seed, str) for seed in seeds):
+            raise error(400, "Give the URLs to crawl as \"seeds\", a list of strings")
+        options = {
+            'max_depth': min(number_field(body, 'max_depth', 2, minimum=0), self.max_depth),
+            'max_pages': min(number_field(body, 'max_pages', 50, minimum=1), self.max_pages),
+            'topic': string_field(body, 'topic') or None,
+            'allow_private': self.allow_private
+        }
+        try:
+            job_id = self.jobs.submit(seeds, owner=self.client_id(request), **options)
+        except ValueError as e:
+            raise error(400, str(e))
+        except RuntimeError as e:
+            raise error(429, str(e))
+        return web.json_response({"job_id": job_id}, status=202)
+
+    async def list_crawls(self, request: web.Request) -> web.Response:
+        """The client's interrupted or failed crawls, which can be resumed"""
+        jobs = await asyncio.to_thread(self.jobs.resumable, self.client_id(request))
+        return web.json_response([{key: job[key] for key in ("job_id", "seeds", "state", "error", "pages", "updated")}
+                                  for job in jobs])
+
+    async def resume_crawl(self, request: web.Request) -> web.Response:
+        job_id = request.match_info['job_id']
+        owner = self.client_id(request)
+        saved = await asyncio.to_thread(self.checkpoint.job, job_id) if self.checkpoint is not None else None
+        if saved is None or saved['owner'] != owner:
+            raise error(404, "Unknown crawl job")
+        try:
+            self.jobs.resume(job_id, owner=owner, allow_private=self.allow_private)
+        except ValueError as e:
+            raise error(400, str(e))
+        except RuntimeError as e:
+            raise error(429, str(e))
+        return web.json_response({"job_id": job_id}, status=202)
+
+    def owned_job(self, request: web.Request) -> str:
+        job_id = request.match_info['job_id']
+        info = self.jobs.status(job_id)
+        if info is None or info.owner != self.client_id(request):
+            raise error(404, "Unknown crawl job")
+        return job_id
+
+    async def crawl_status(self, request: web.Request) -> web.Response:
+        return web.json_response(asdict(self.jobs.status(self.owned_job(request))))
+
+    async def cancel_crawl(self, request: web.Request) -> web.Response:
+        return web.json_response({"cancelled": self.jobs.cancel(self.owned_job(request))})
+
+    async def collect_crawl(self, request: web.Request) -> web.Response:
+        """Add a finished job's pages to the client's documents"""
+        job = self.jobs.collect(self.owned_job(request))
+        if job is None:
+            raise error(409, "The crawl job has not finished")
+        workspace = self.workspace(request)
+        pages = [{'url': result.url, 'title': result.title, 'content': result.text} for result in job.results]
+        pages = pages[:max(self.max_documents - len(workspace.documents), 0)]
+        workspace.add(pages)
+        return web.json_response({"added": len(pages), "errors": job.errors, "documents": len(workspace.documents)})
+
+    async def list_documents(self, request: web.Request) -> web.Response:
+        documents = self.workspace(request).documents
+        return web.json_response([{"id": number, "url": document['url'], "title": document['title'],
+                                   "chars": len(document['content'])} for number, document in enumerate(documents)])
+
+    async def get_document(self, request: web.Request) -> web.Response:
+        documents = self.workspace(request).documents
+        number = int(request.match_info['number'])
+        if not 0 <= number < len(documents):
+            raise error(404, "Unknown document")
+        document = documents[number]
+        return web.json_response({"url": document['url'], "title": document['title'],
+                                  "content": str(document['content'])})
+
+    def _process_file(self, name: str, data: bytes) -> Any:
+        if name.lower().endswith('.pdf'):
+            progress = CrawlProgress()
+            return self.file_processor.process_pdf(io.BytesIO(data), progress_bar=progress, warn=progress.write)
+        return self.file_processor.process_text_file(io.BytesIO(data))
+
+    async def upload_documents(self, request: web.Request) -> web.Response:
+        """Add documents from multipart file uploads, or a JSON list of {"url", "title", "content"} objects"""
+        workspace = self.workspace(request)
+        added: List[Dict[str, Any]] = []
+        errors: Dict[str, str] = {}
+        if request.content_type.startswith('multipart/'):
+            reader = await request.multipart()
+            async for part in reader:
+                if not part.filename:
+                    continue
+                data = await part.read()
+                # PDF extraction is CPU-bound; a thread keeps the loop serving other clients meanwhile
+                text, problem = await asyncio.to_thread(self._process_file, part.filename, bytes(data))
+                if problem:
+                    errors[part.filename] = problem
+                elif text:
+                    added.append({'url': "uploaded_file", 'title': part.filename,
+                                  'content': CompressedText(text[:MAX_DOCUMENT_CHARS])})
+        else:
+            try:
+                body = await request.json()
+            except ValueError:  # Malformed JSON, or a body that is not valid UTF-8
+                raise error(400, "Request body is not valid JSON")
+            for item in body if isinstance(body, list) else [body]:
+                if not isinstance(item, dict) or not item.get('content'):
+                    raise error(400, "Documents need a \"content\" field")
+                added.append({'url': str(item.get('url', "uploaded_file")),
+                              'title': str(item.get('title') or f"Document {len(workspace.documents) + len(added) + 1}"),
+                              'content': CompressedText(str(item['content'])[:MAX_DOCUMENT_CHARS])})
+        if len(workspace.documents) + len(added) > self.max_documents:
+            raise error(413, f"A client can hold at most {self.max_documents} documents")
+        workspace.add(added)
+        return web.json_response({"added": [document['title'] for document in added], "errors": errors,
+                                  "documents": len(workspace.documents)})
+
+    async def clear_documents(self, request: web.Request) -> web.Response:
+        self.workspace(request).clear()
+        return web.json_response({"documents": 0})
+
+    async def chat(self, request: web.Request) -> web.StreamResponse:
+        """Stream an answer as server-sent events: content chunks, then a done or error event with statistics"""
+        body = await self.read_json(request)
+        model = string_field(body, 'model')
+        prompt = string_field(body, 'prompt')
+        messages = body.get('messages') or ([{"role": "user", "content": prompt}] if prompt else [])
+        if not model or not messages:
+            raise error(400, "Give a \"model\" and \"messages\" or a \"prompt\"")
+        if not isinstance(messages, list) or not all(
+                isinstance(m, dict) and isinstance(m.get('role'), str) and isinstance(m.get('content'), str)
+                for m in messages):
+            raise error(400, "\"messages\" must be a list of {\"role\", \"content\"} objects with string values")
+        system_prompt = string_field(body, 'system_prompt', DEFAULT_SYSTEM_PROMPT)
+        temperature = number_field(body, 'temperature', 0.7, kind=float, minimum=0.0, maximum=2.0)
+        max_tokens = number_field(body, 'max_tokens', 2000, minimum=1)
+        top_k = number_field(body, 'top_k', 8, minimum=0, maximum=100)
+        api = self.chat_api(request)
+        if body.get('use_documents', True):
+            question = next((m['content'] for m in reversed(messages) if m['role'] == 'user'), '')
+            context = await self.workspace(request).context_documents(question, top_k)
+            reference = prepare_crawled_content(context)
+            if reference:
+                system_prompt = f"{system_prompt}\n{reference}"
+        if system_prompt:
+            messages = [{"role": "system", "content": system_prompt}] + [m for m in messages if m.get('role') != 'system']
+
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache',
+                                               'X-Accel-Buffering': 'no'})
+        await response.prepare(request)
+        stats: Dict[str, Any] = {}
+        stream = api.stream_async(self.session, messages, model, temperature=temperature, max_tokens=max_tokens,
+                                  stats=stats)
+        ACTIVE_STREAMS.inc()
+        try:
+            async for content in stream:
+                event = "error" if stats.get('failed') else "message"
+                await response.write(sse_event(event, {"content": content}))
+            await response.write(sse_event("done", stats))
+        except ConnectionResetError:
+            pass  # The client went away; closing the stream ends the upstream request too
+        finally:
+            ACTIVE_STREAMS.dec()
+            await stream.aclose()
+        return response
+
+def error(status: int, message: str) -> web.HTTPException:
+    """JSON error response to raise from a handler"""
+    return _ERRORS[status](text=json.dumps({"error": message}), content_type='application/json')
+
+def number_field(body: Dict[str, Any], name: str, default: Any, kind: type = int,
+                 minimum: Optional[float] = None, maximum: Optional[float] = None) -> Any:
+    """A numeric field of a request body, raising a 400 error if it is not a number in range"""
+    value = body.get(name, default)
+    # bool is an int subclass, and integral floats such as 10.0 are fine where an int is wanted
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise error(400, f"\"{name}\" must be a number")
+    if kind is int and value != int(value):
+        raise error(400, f"\"{name}\" must be a whole number")
+    if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+        if maximum is None:
+            bounds = f"at least {minimum}"
+        else:
+            bounds = f"at most {maximum}" if minimum is None else f"between {minimum} and {maximum}"
+        raise error(400, f"\"{name}\" must be {bounds}")
+    return kind(value)
+
+def string_field(body: Dict[str, Any], name: str, default: Optional[str] = None) -> Optional[str]:
+    """A string (or null) field of a request body, raising a 400 error otherwise"""
+    value = body.get(name, default)
+    if value is not None and not isinstance(value, str):
+        raise error(400, f"\"{name}\" must be a string")
+    return value
+
+_ERRORS = {400: web.HTTPBadRequest, 404: web.HTTPNotFound, 409: web.HTTPConflict, 413: web.HTTPRequestEntityTooLarge,
+           429: web.HTTPTooManyRequests, 502: web.HTTPBadGateway}
+
+def sse_event(event: str, data: Any) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode()
+
+def create_app(server: Optional[APIServer] = None, **options: Any) -> web.Application:
+    """aiohttp application for an APIServer, or one made from options"""
+    server = server or APIServer(**options)
+    app = web.Application(middlewares=[server.middleware], client_max_size=server.file_processor.max_file_size + 2 ** 20)
+    app.on_startup.append(server.start)
+    app.on_cleanup.append(server.stop)
+    app['server'] = server
+    app.router.add_get('/health', server.health)
+    app.router.add_get('/metrics', server.metrics)
+    app.router.add_get('/models', server.list_models)
+    app.router.add_get('/crawl', server.list_crawls)
+    app.router.add_post('/crawl', server.start_crawl)
+    app.router.add_get('/crawl/{job_id}', server.crawl_status)
+    app.router.add_delete('/crawl/{job_id}', server.cancel_crawl)
+    app.router.add_post('/crawl/{job_id}/collect', server.collect_crawl)
+    app.router.add_post('/crawl/{job_id}/resume', server.resume_crawl)
+    app.router.add_get('/documents', server.list_documents)
+    app.router.add_post('/documents', server.upload_documents)
+    app.router.add_delete('/documents', server.clear_documents)
+    app.router.add_get('/documents/{number:\\d+}', server.get_document)
+    app.router.add_post('/chat', server.chat)
+    return app
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Serve crawling, documents and streaming chat over HTTP")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--base-url', default=os.getenv("OPENROUTER_BASE_URL", DEFAULT_BASE_URL))
+    parser.add_argument('--max-jobs', type=int, default=4, help="Crawl jobs running at once across clients")
+    parser.add_argument('--max-jobs-per-client', type=int, default=1)
+    parser.add_argument('--max-pages', type=int, default=500, help="Largest page budget a crawl may ask for")
+    parser.add_argument('--requests-per-minute', type=int, default=int(os.getenv("RATE_LIMIT_PER_MINUTE", "20")))
+    parser.add_argument('--allow-private', action='store_true',
+                        help="Allow crawling private and loopback addresses, e.g. a local test site")
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    app = create_app(base_url=args.base_url, api_key=os.getenv("OPENROUTER_API_KEY"),
+                     token=os.getenv("API_SERVER_TOKEN"), max_jobs=args.max_jobs,
+                     max_jobs_per_client=args.max_jobs_per_client, max_pages=args.max_pages,
+                     allow_private=args.allow_private, requests_per_minute=args.requests_per_minute,
+                     rate_limit_backend=os.getenv("RATE_LIMIT_BACKEND", "memory"),
+                     checkpoint_path=os.getenv("CRAWL_CHECKPOINT_PATH", os.path.join("checkpoints", "crawls.sqlite")))
+    web.run_app(app, host=args.host, port=args.port, access_log=None)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+from typing import List, Any, Optional, Iterator, NamedTuple
+import html
+import json
+import re
+from .metrics import REGISTRY
+
+STRUCTURED_BLOCKS = REGISTRY.counter("crawler_structured_blocks_total",
+                                     "Text blocks taken from embedded JSON and meta tags by source")
+
+META_KEYS = {'og:title', 'og:description', 'description', 'twitter:title', 'twitter:description'}
+# Script ids of JSON page data shipped by client-side rendered frameworks (Next.js, Nuxt, Gatsby...)
+EMBEDDED_JSON_IDS = {'__NEXT_DATA__', '__NUXT_DATA__', '__GATSBY_DATA__', '__APP_DATA__'}
+# Keys whose string values are prose even when short; other strings must read like a sentence
+TEXT_KEYS = {'headline', 'alternativeHeadline', 'name', 'title', 'subtitle', 'description', 'articleBody',
+             'text', 'body', 'content', 'abstract', 'summary', 'excerpt', 'caption', 'reviewBody'}
+# Keys holding identifiers, links, dates and framework bookkeeping rather than page text
+SKIP_KEYS = {'@context', '@id', '@type', 'id', 'url', 'href', 'src', 'image', 'logo', 'thumbnailUrl',
+             'contentUrl', 'embedUrl', 'sameAs', 'slug', 'datePublished', 'dateModified', 'uploadDate',
+             'buildId', 'locale', 'locales', 'defaultLocale', 'query', 'assetPrefix', 'runtimeConfig',
+             'scriptLoader', 'page', 'dynamicIds', 'gssp', 'gsp', 'isFallback', 'appGip', 'className', 'style'}
+
+_TAG_RE = re.compile(r'<[^>]+>')
+_WORD_RE = re.compile(r'[^\W\d_]{2,}')
+_WRAPPER_RE = re.compile(r'^\s*(?://\s*)?(?:<!--|<!\[CDATA\[)|(?://\s*)?(?:-->|\]\]>)\s*$')
+
+class StructuredText(NamedTuple):
+    title: Optional[str]
+    blocks: List[str]
+
+    @property
+    def text(self) -> str:
+        return '\n'.join(self.blocks)
+
+def clean_text(value: str) -> str:
+    """Plain text of a string that may hold HTML markup or entities"""
+    if '<' in value:
+        value = _TAG_RE.sub(' ', value)
+    return ' '.join(html.unescape(value).split())
+
+def _is_prose(text: str, key: Optional[str]) -> bool:
+    if text.startswith(('http://', 'https://', '/', '#', 'data:')):
+        return False
+    words = len(_WORD_RE.findall(text))
+    return words >= 1 if key in TEXT_KEYS else words >= 4 and len(text) >= 20
+
+def json_text(data: Any, key: Optional[str] = None, depth: int = 0) -> Iterator[str]:
+    """Prose strings in a JSON document, in document order"""
+    if depth > 40:
+        return
+    if isinstance(data, str):
+        text = clean_text(data)
+        if text and _is_prose(text, key):
+            yield text
+    elif isinstance(data, dict):
+        for child_key, value in data.items():
+            if child_key not in SKIP_KEYS:
+                yield from json_text(value, child_key, depth + 1)
+    elif isinstance(data, list):
+        for item in data:
+            yield from json_text(item, key, depth + 1)
+
+def load_script_json(raw: str) -> Any:
+    """Parse a script element's JSON, tolerating comment and CDATA wrappers; None if invalid"""
+    raw = _WRAPPER_RE.sub('', raw.strip())
+    try:
+        return json.loads(raw, strict=False)
+    except ValueError:
+        return None
+
+def extract_structured_text(soup: Any, max_chars: int = 500000) -> StructuredText:
+    """Text from meta tags, JSON-LD and embedded framework JSON of a parsed page
+
+    Client-side rendered pages often ship their content only as JSON for the
+    browser to render; this recovers it without running any JavaScript.
+    """
+    blocks: List[str] = []
+    seen = set()
+    total = 0
+    title = None
+
+    def add(text: str, source: str) -> None:
+        nonlocal total
+        if text not in seen:
+            seen.add(text)
+            blocks.append(text)
+            total += len(text)
+            STRUCTURED_BLOCKS.inc(source=source)
+
+    for meta in soup.find_all('meta'):
+        key = (meta.get('property') or meta.get('name') or '').lower()
+        if key in META_KEYS:
+            content = clean_text(meta.get('content') or '')
+            if content:
+                if key.endswith('title'):
+                    title = title or content
+                add(content, "meta")
+
+    for script in soup.find_all('script'):
+        script_type = (script.get('type') or '').lower()
+        script_id = script.get('id') or ''
+        if script_type == 'application/ld+json':
+            source = "json_ld"
+        elif script_id in EMBEDDED_JSON_IDS or script_type == 'application/json':
+            source = "embedded_json"
+        else:
+            continue
+        data = load_script_json(script.string or '')
+        if data is None:
+            continue
+        if script_id == '__NEXT_DATA__' and isinstance(data, dict):
+            data = data.get('props', data)  # The rest is routing and build metadata
+        for text in json_text(data):
+            add(text, source)
+            if total >= max_chars:
+                return StructuredText(title, blocks)
+    return StructuredText(title, blocks)
\ No newline at end of file
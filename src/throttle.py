@@ -0,0 +1,170 @@
+from typing import Dict, Optional, AsyncIterator
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+import asyncio
+import time
+from .metrics import REGISTRY
+
+CONCURRENCY_LIMIT = REGISTRY.gauge("crawler_host_concurrency_limit", "Current adaptive request limit per host")
+CONCURRENCY_CHANGES = REGISTRY.counter("crawler_concurrency_changes_total",
+                                       "Adaptive limit changes by direction and reason: stable, latency, throttled or error")
+
+# Responses telling the client to slow down
+THROTTLED_STATUSES = frozenset({429, 503})
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header, given as seconds or an HTTP date"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+class SlotOutcome:
+    """What became of the request made in a slot, reported back to an adaptive throttle"""
+    __slots__ = ('status', 'ttfb', 'retry_after', 'in_flight')
+
+    def __init__(self, in_flight: int):
+        self.status: Optional[int] = None
+        self.ttfb: Optional[float] = None  # Seconds until response headers
+        self.retry_after: Optional[float] = None
+        self.in_flight = in_flight  # Requests to the host, this one included, when it started
+
+class _HostState:
+    def __init__(self, limit: float):
+        self.limit = limit
+        self.active = 0
+        self.next_start = 0.0
+        self.condition: Optional[asyncio.Condition] = None
+        self.base_latency: Optional[float] = None  # Slow-moving TTFB baseline
+        self.latency: Optional[float] = None  # Recent TTFB
+        self.slow_start = True
+        self.last_decrease = 0.0
+
+class HostThrottle:
+    """Per-host politeness: a concurrency cap and a minimum delay between request starts
+
+    One throttle can be shared by several crawlers so that seeds on the same
+    host do not add up to more load than a single crawl would.
+
+    With ``adaptive`` set, each host's limit starts at
+    ``initial_concurrency`` and moves between ``min_concurrency`` and
+    ``max_concurrency`` with the host's responses (AIMD). While
+    time-to-first-byte stays near its baseline the limit grows: by one per
+    response until the first back-off, like TCP slow start, then by about one
+    per round of requests. It is cut when recent TTFB rises past
+    ``latency_tolerance`` times the baseline, in proportion to the rise, and
+    halved on 429/503, timeouts and connection errors, at most once per
+    round trip. A Retry-After header also holds back new requests to the
+    host for that long, up to ``max_retry_after`` seconds.
+    """
+
+    def __init__(self, max_concurrency: int = 8, min_interval: float = 0.0, adaptive: bool = False,
+                 initial_concurrency: Optional[int] = None, min_concurrency: int = 1,
+                 latency_tolerance: float = 2.0, backoff: float = 0.5, max_retry_after: float = 60.0):
+        self.max_concurrency = max_concurrency
+        self.min_interval = min_interval
+        self.adaptive = adaptive
+        self.min_concurrency = max(1, min(min_concurrency, max_concurrency))
+        if initial_concurrency is None:
+            initial_concurrency = max_concurrency // 4 if adaptive else max_concurrency
+        self.initial_concurrency = min(max(initial_concurrency, self.min_concurrency), max_concurrency)
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+        self.max_retry_after = max_retry_after
+        self.hosts: Dict[str, _HostState] = {}
+
+    def _state(self, host: str) -> _HostState:
+        state = self.hosts.get(host)
+        if state is None:
+            state = self.hosts[host] = _HostState(self.initial_concurrency)
+        if state.condition is None:
+            state.condition = asyncio.Condition()
+        return state
+
+    def concurrency(self, host: str) -> int:
+        """The host's current request limit"""
+        state = self.hosts.get(host)
+        return int(state.limit) if state is not None else self.initial_concurrency
+
+    def _set_limit(self, host: str, state: _HostState, limit: float, reason: str) -> None:
+        limit = min(max(limit, self.min_concurrency), self.max_concurrency)
+        if int(limit) != int(state.limit):
+            CONCURRENCY_CHANGES.inc(direction="up" if limit > state.limit else "down", reason=reason)
+        state.limit = limit
+        CONCURRENCY_LIMIT.set(int(limit), host=host)
+
+    def _decrease(self, host: str, state: _HostState, factor: float, reason: str, now: float) -> None:
+        # Responses to requests sent before the last cut say nothing about the new limit
+        if now - state.last_decrease < (state.latency or 0.0):
+            return
+        state.slow_start = False
+        state.last_decrease = now
+        self._set_limit(host, state, state.limit * factor, reason)
+
+    def _adapt(self, host: str, state: _HostState, outcome: SlotOutcome, error: Optional[BaseException]) -> None:
+        now = time.monotonic()
+        if outcome.retry_after:
+            state.next_start = max(state.next_start, now + min(outcome.retry_after, self.max_retry_after))
+        if error is not None or outcome.status is None:
+            self._decrease(host, state, self.backoff, "error", now)
+            return
+        if outcome.status in THROTTLED_STATUSES:
+            self._decrease(host, state, self.backoff, "throttled", now)
+            return
+        if outcome.ttfb is None:
+            return
+        sample = outcome.ttfb
+        if state.latency is None:
+            state.latency = state.base_latency = sample
+        else:
+            state.latency += 0.2 * (sample - state.latency)
+            # The baseline follows improvements quickly and degradation slowly
+            state.base_latency += (0.5 if sample < state.base_latency else 0.002) * (sample - state.base_latency)
+        gradient = self.latency_tolerance * state.base_latency / max(state.latency, 1e-6)
+        if gradient < 1.0:
+            self._decrease(host, state, max(gradient, self.backoff), "latency", now)
+        elif outcome.in_flight * 2 >= state.limit:  # Only grow a limit that is being used
+            self._set_limit(host, state, state.limit + (1.0 if state.slow_start else 1.0 / state.limit), "stable")
+
+    @asynccontextmanager
+    async def slot(self, url: str) -> AsyncIterator[SlotOutcome]:
+        """Hold one of the URL host's request slots for the duration of the block
+
+        An adaptive throttle learns from the yielded SlotOutcome, which the
+        block fills in, and from any exception leaving the block.
+        """
+        host = urlparse(url).netloc
+        state = self._state(host)
+        async with state.condition:
+            await state.condition.wait_for(lambda: state.active < int(state.limit))
+            state.active += 1
+            outcome = SlotOutcome(state.active)
+            now = time.monotonic()
+            delay = state.next_start - now
+            state.next_start = max(now, state.next_start) + self.min_interval
+        error: Optional[BaseException] = None
+        adapt = self.adaptive
+        try:
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield outcome
+        except asyncio.CancelledError:
+            adapt = False  # Not the host's doing
+            raise
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            async with state.condition:
+                state.active -= 1
+                if adapt:
+                    self._adapt(host, state, outcome, error)
+                    state.condition.notify_all()  # The limit may have grown by more than one
+                else:
+                    state.condition.notify()
@@ -0,0 +1,267 @@
+from typing import Dict, Optional, Any, Iterator, AsyncIterator
+import datetime
+import functools
+import time
+from .metrics import REGISTRY
+
+CHAT_CONNECTIONS = REGISTRY.counter("chat_connections_total", "Connections opened to the chat API by transport")
+CHAT_WIRE_BYTES = REGISTRY.counter("chat_wire_bytes_total",
+                                   "Chat API response body bytes as received, before decompression, by protocol and encoding")
+
+# Preferred first; a client only advertises the codings it can decode
+_CODINGS = ('zstd', 'br', 'gzip', 'deflate')
+
+@functools.lru_cache(maxsize=None)
+def accept_encoding(client: str = "aiohttp") -> str:
+    """Accept-Encoding header listing the codings an HTTP client can decode in this environment
+
+    ``client`` is ``"aiohttp"``, ``"requests"`` or ``"httpx"``. Brotli and
+    zstd are only offered when the client's decoder for them is installed.
+    """
+    if client == "aiohttp":
+        from aiohttp import compression_utils
+        available = {'gzip', 'deflate'}
+        if getattr(compression_utils, 'HAS_BROTLI', False):
+            available.add('br')
+        if getattr(compression_utils, 'HAS_ZSTD', False):  # aiohttp 3.12+ with a zstd decoder
+            available.add('zstd')
+    elif client == "requests":
+        from urllib3.util.request import ACCEPT_ENCODING
+        available = {coding.strip() for coding in ACCEPT_ENCODING.split(',')}
+    elif client == "httpx":
+        from httpx._decoders import SUPPORTED_DECODERS
+        available = set(SUPPORTED_DECODERS) - {'identity'}
+    else:
+        raise ValueError(f"Unknown HTTP client: {client}")
+    return ', '.join(coding for coding in _CODINGS if coding in available)
+
+class CountingStream:
+    """Iterates a response's body chunks, counting their bytes, until the stream ends or ``stop`` is set"""
+
+    def __init__(self, response: Any, stop: Optional[Any] = None):
+        self.response = response
+        self.chunks = iter(response)
+        self.count = 0
+        self.stop = stop  # threading.Event
+
+    def __iter__(self) -> Iterator[bytes]:
+        for chunk in self.chunks:
+            self.count += len(chunk)
+            if self.stop is not None and self.stop.is_set():
+                return
+            yield chunk
+
+    def drain(self) -> None:
+        """Read the rest of a finished stream, so its connection can be reused"""
+        for chunk in self.chunks:
+            self.count += len(chunk)
+
+    def close(self) -> None:
+        self.response.close()
+
+def abort_response(response: Any) -> None:
+    """Close a streaming response from another thread, ending a read blocked on it"""
+    shutdown = getattr(getattr(response, 'raw', None), 'shutdown', None)  # urllib3 2.3+
+    if shutdown is not None:
+        try:
+            shutdown()
+        except (ValueError, RuntimeError, OSError):
+            pass  # Already finished and its connection back in the pool
+    response.close()
+
+def count_wire_bytes(response: Any, decoded: int = 0) -> None:
+    """Add a finished chat API response's received body bytes to the metrics
+
+    ``decoded`` is the body size after decompression, if counted; it stands
+    in for uncompressed chunked responses, whose bytes urllib3 does not count.
+    """
+    encoding = (response.headers.get('Content-Encoding') or 'identity').lower()
+    if isinstance(response, HTTP2Response):
+        received, protocol = response.wire_bytes, response.http_version
+    else:
+        raw = getattr(response, 'raw', None)
+        if raw is None or not hasattr(raw, 'tell'):
+            return  # A replayed cached answer
+        received, protocol = raw.tell(), "HTTP/1.1"
+        if not received and encoding == 'identity':
+            received = decoded
+    CHAT_WIRE_BYTES.inc(received, protocol=protocol, encoding=encoding)
+
+def count_aiohttp_wire_bytes(response: Any, decoded: int = 0) -> None:
+    """count_wire_bytes for an aiohttp response to the chat API"""
+    encoding = (response.headers.get('Content-Encoding') or 'identity').lower()
+    received = getattr(response.content, 'total_raw_bytes', None)  # aiohttp 3.11+
+    if received is None:
+        received = decoded if encoding == 'identity' else 0
+    CHAT_WIRE_BYTES.inc(received, protocol=f"HTTP/{response.version.major}.{response.version.minor}",
+                        encoding=encoding)
+
+async def iter_sse_data(stream: Any) -> AsyncIterator[str]:
+    """Data of each server-sent event read from an aiohttp StreamReader; comments and other fields are skipped"""
+    data = []
+    async for line in stream:
+        line = line.decode('utf-8').rstrip('\r\n')
+        if not line:
+            if data:
+                yield '\n'.join(data)
+                data = []
+        elif line.startswith('data:'):
+            value = line[5:]
+            data.append(value[1:] if value.startswith(' ') else value)
+    if data:
+        yield '\n'.join(data)
+
+def chat_trace_config() -> Any:
+    """aiohttp TraceConfig counting the connections a session opens to the chat API"""
+    import aiohttp
+
+    async def on_connection_create_end(session, ctx, params):
+        CHAT_CONNECTIONS.inc(transport="aiohttp")
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    return trace_config
+
+def _counting_pool(base: type) -> type:
+    """Subclass of a urllib3 connection pool counting the connections it opens"""
+    class CountingPool(base):
+        def _new_conn(self):
+            CHAT_CONNECTIONS.inc(transport="http/1.1")
+            return super()._new_conn()
+    CountingPool.__name__ = f"Counting{base.__name__}"
+    return CountingPool
+
+def counting_adapter(pool_size: int = 10) -> Any:
+    """requests HTTPAdapter for one host whose pools count their connections in ``chat_connections_total``"""
+    import requests
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    adapter.poolmanager.pool_classes_by_scheme = {'http': _counting_pool(HTTPConnectionPool),
+                                                  'https': _counting_pool(HTTPSConnectionPool)}
+    return adapter
+
+class HTTP2Response:
+    """The parts of requests.Response that ChatAPI and the app use, over an httpx response"""
+
+    def __init__(self, response: Any, elapsed: float):
+        self.response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.http_version = response.http_version
+        self.elapsed = datetime.timedelta(seconds=elapsed)  # Until response headers, like requests
+
+    @property
+    def wire_bytes(self) -> int:
+        return self.response.num_bytes_downloaded
+
+    @property
+    def content(self) -> bytes:
+        return self.response.read()
+
+    @property
+    def text(self) -> str:
+        self.response.read()
+        return self.response.text
+
+    def json(self) -> Any:
+        self.response.read()
+        return self.response.json()
+
+    def __iter__(self) -> Iterator[bytes]:
+        import httpx
+
+        try:
+            yield from self.response.iter_bytes()
+        except httpx.HTTPError as e:
+            raise _requests_error(e) from e
+        finally:
+            self.response.close()
+
+    def close(self) -> None:
+        self.response.close()
+
+def _requests_error(error: Exception) -> Exception:
+    """The requests exception matching an httpx one, so retries and error handling treat both alike"""
+    import httpx
+    import requests
+
+    if isinstance(error, httpx.TimeoutException):
+        return requests.exceptions.Timeout(str(error))
+    if isinstance(error, httpx.TransportError):
+        return requests.exceptions.ConnectionError(str(error))
+    return requests.exceptions.RequestException(str(error))
+
+class HTTP2Session:
+    """Stand-in for requests.Session sending requests over HTTP/2 with httpx
+
+    Concurrent requests to the API host, e.g. models raced against each
+    other, are multiplexed as streams over one connection instead of each
+    holding a connection of its own. Needs ``httpx`` and ``h2``
+    (``pip install httpx[http2]``); hosts without HTTP/2 are spoken to over
+    HTTP/1.1.
+    """
+
+    def __init__(self, pool_size: int = 10):
+        import httpx
+
+        self.client = httpx.Client(http2=True, follow_redirects=True,
+                                   limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+                                   headers={'Accept-Encoding': accept_encoding("httpx")})
+
+    @staticmethod
+    def _trace(event_name: str, info: Dict[str, Any]) -> None:
+        if event_name == "connection.connect_tcp.complete":
+            CHAT_CONNECTIONS.inc(transport="httpx")
+
+    def request(self, method: str, url: str, headers: Optional[Dict[str, str]] = None, json: Any = None,
+                stream: bool = False, timeout: Optional[float] = None, allow_redirects: bool = True) -> HTTP2Response:
+        import httpx
+
+        request = self.client.build_request(method, url, headers=headers, json=json, timeout=timeout,
+                                            extensions={"trace": self._trace})
+        started = time.perf_counter()
+        try:
+            response = self.client.send(request, stream=True, follow_redirects=allow_redirects)
+        except httpx.HTTPError as e:
+            raise _requests_error(e) from e
+        elapsed = time.perf_counter() - started
+        if not stream:
+            try:
+                response.read()
+            except httpx.HTTPError as e:
+                raise _requests_error(e) from e
+            finally:
+                response.close()
+        return HTTP2Response(response, elapsed)
+
+    def get(self, url: str, **kwargs: Any) -> HTTP2Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs: Any) -> HTTP2Response:
+        return self.request("POST", url, **kwargs)
+
+    def head(self, url: str, **kwargs: Any) -> HTTP2Response:
+        return self.request("HEAD", url, **kwargs)
+
+    def close(self) -> None:
+        self.client.close()
+
+def create_session(pool_size: int = 10, http2: bool = False) -> Any:
+    """HTTP session for the chat API: HTTP/2 through httpx when asked for and installed, requests otherwise
+
+    Both negotiate compression explicitly and count their connections.
+    """
+    if http2:
+        try:
+            return HTTP2Session(pool_size)
+        except ImportError:  # httpx or h2 is not installed
+            pass
+    import requests
+
+    session = requests.Session()
+    adapter = counting_adapter(pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers['Accept-Encoding'] = accept_encoding("requests")
+    return session
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The tests import the app's modules as the src package, as app.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
\ No newline at end of file
@@ -0,0 +1,42 @@
+import os
+import pytest
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+from src.checkpoint import CrawlCheckpoint
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+OWNER = "0123456789abcdef0123456789abcdef"
+
+@pytest.fixture(autouse=True)
+def fresh_resources():
+    st.cache_resource.clear()  # The crawl job manager is cached with the checkpoint path it was made for
+    yield
+    st.cache_resource.clear()
+
+def test_interrupted_crawls_are_listed_for_their_session_only(tmp_path, monkeypatch):
+    path = str(tmp_path / "crawls.sqlite")
+    monkeypatch.setenv("CRAWL_CHECKPOINT_PATH", path)
+    store = CrawlCheckpoint(path)
+    store.save_job("mine", OWNER, ["https://example.com/docs"], {"max_depth": 2, "max_pages": 5})
+    store.save_job("theirs", "f" * 32, ["https://example.org/private"], {"max_depth": 2, "max_pages": 5})
+
+    at = AppTest.from_file(APP, default_timeout=30)
+    at.query_params["session"] = OWNER  # As when the page is reloaded after a restart
+    at.run()
+    assert not at.exception
+    assert at.session_state.session_id == OWNER
+    listed = [box for box in at.selectbox if box.key == "resume_crawl_id"]
+    assert len(listed) == 1 and len(listed[0].options) == 1 and listed[0].value == "mine"
+
+    at.button(key="discard_crawl").click().run()
+    assert [job["job_id"] for job in store.jobs()] == ["theirs"]
+    assert not [expander for expander in at.expander if "Interrupted" in expander.label]
+
+def test_new_session_gets_an_id_in_the_url(tmp_path, monkeypatch):
+    monkeypatch.setenv("CRAWL_CHECKPOINT_PATH", str(tmp_path / "crawls.sqlite"))
+    at = AppTest.from_file(APP, default_timeout=30)
+    at.query_params["session"] = "not-an-id"
+    at.run()
+    assert not at.exception
+    assert at.session_state.session_id != "not-an-id"
+    assert at.query_params["session"] == at.session_state.session_id
\ No newline at end of file
@@ -0,0 +1,28 @@
+import json
+from benchmarks.servers import BenchmarkServer
+from src.batch import BatchRunner, answered_ids, compact_output
+from src.chat import ChatAPI, RateLimiter
+
+def test_retried_questions_leave_one_row_each(tmp_path):
+    output = tmp_path / "answers.jsonl"
+    output.write_text('{"id": "1", "answer": null, "error": "HTTP 503"}\n'
+                      '{"id": "2", "answer": "Kept", "error": null}\n'
+                      '{"id": "3", "answer": null, "err', encoding='utf-8')  # Cut short by an interrupted run
+    questions = [{"id": str(number), "question": f"Question {number}?"} for number in (1, 2, 3)]
+    with BenchmarkServer() as server:
+        api = ChatAPI(server.api_base_url, "test-key")
+        api.rate_limiter = RateLimiter(max_requests=10 ** 9)
+        summary = BatchRunner(api, [{"url": "https://example.com", "title": "Doc", "content": "Some text."}],
+                              "test/model").run(questions, str(output))
+    assert summary["skipped"] == 1 and summary["answered"] == 2
+    rows = [json.loads(line) for line in output.read_text(encoding='utf-8').splitlines()]
+    assert [row["id"] for row in rows] == ["1", "2", "3"]
+    assert rows[1]["answer"] == "Kept" and all(row["error"] is None for row in rows)
+    assert answered_ids(str(output)) == {"1", "2", "3"}
+
+def test_compacting_leaves_a_clean_file_alone(tmp_path):
+    output = tmp_path / "answers.jsonl"
+    output.write_text('{"id": "1", "answer": "A", "error": null}\n', encoding='utf-8')
+    modified = output.stat().st_mtime_ns
+    assert compact_output(str(output)) == 0
+    assert output.stat().st_mtime_ns == modified
\ No newline at end of file
@@ -0,0 +1,55 @@
+import asyncio
+import threading
+import time
+import aiohttp
+import pytest
+from benchmarks.servers import BenchmarkServer
+from src.cache import ResponseCache
+from src.chat import ChatAPI, ModelLatencyStats, RateLimiter
+
+FAST, SLOW = "bench/fast-model:free", "bench/slow-model:free"
+MESSAGES = [{"role": "user", "content": "Summarize the crawled site."}]
+
+@pytest.fixture(scope="module")
+def api_url():
+    with BenchmarkServer() as server:
+        yield server.api_base_url
+
+def make_api(url: str, cache: ResponseCache = None) -> ChatAPI:
+    api = ChatAPI(url, "test-key", model_stats=ModelLatencyStats(), cache=cache)
+    api.rate_limiter = RateLimiter(max_requests=10 ** 9)
+    return api
+
+def test_race_abandons_the_loser_without_recording_its_latency(api_url):
+    api = make_api(api_url)
+    answer = "".join(api.race(MESSAGES, [FAST, SLOW]))
+    assert answer and api.last_stream_stats["model"] == FAST
+    assert list(api.model_stats.models) == [FAST]
+    assert api.model_stats.rank([SLOW, FAST]) == [FAST, SLOW]
+
+    deadline = time.monotonic() + 2.0
+    while any(thread.name == f"chat-{SLOW}" for thread in threading.enumerate()):
+        assert time.monotonic() < deadline, "the losing contestant is still streaming"
+        time.sleep(0.05)
+
+def test_answers_cut_off_at_max_tokens_are_not_cached(api_url):
+    api = make_api(api_url, cache=ResponseCache())
+    short = "".join(api.process_stream(api.make_request(MESSAGES, FAST, max_tokens=5)))
+    assert len(short.split()) == 5 and api.last_stream_stats["finish_reason"] == "length"
+    assert len(api.cache) == 0
+
+    full = "".join(api.process_stream(api.make_request(MESSAGES, FAST, max_tokens=4000)))
+    assert len(full.split()) > 5 and api.last_stream_stats["finish_reason"] == "stop"
+    assert len(api.cache) == 1
+
+def test_async_answers_cut_off_at_max_tokens_are_not_cached(api_url):
+    api = make_api(api_url, cache=ResponseCache())
+
+    async def ask(max_tokens: int) -> str:
+        async with aiohttp.ClientSession() as session:
+            return "".join([chunk async for chunk in api.stream_async(session, MESSAGES, FAST, max_tokens=max_tokens)])
+
+    assert len(asyncio.run(ask(5)).split()) == 5
+    assert len(api.cache) == 0
+    assert len(asyncio.run(ask(4000)).split()) > 5
+    assert len(api.cache) == 1
\ No newline at end of file
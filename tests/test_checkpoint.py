@@ -0,0 +1,80 @@
+import asyncio
+import sqlite3
+import time
+import pytest
+from benchmarks.servers import BenchmarkServer, SiteConfig
+from src.checkpoint import CrawlCheckpoint
+from src.jobs import CrawlJob, CrawlJobManager
+
+OPTIONS = dict(max_depth=10, max_pages=200, allow_private=True)  # Room for the whole site, so every crawl finds the same pages
+TABLES = ("crawl_jobs", "crawl_pages", "crawl_visited", "crawl_frontiers")
+
+@pytest.fixture(scope="module")
+def site():
+    with BenchmarkServer(SiteConfig(pages=150, latency=0.01)) as server:
+        yield server.site_url
+
+def wait(manager: CrawlJobManager, job_id: str, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while not manager.status(job_id).finished:
+        assert time.monotonic() < deadline, "crawl job did not finish"
+        time.sleep(0.01)
+    return manager.status(job_id)
+
+def row_counts(path: str) -> dict:
+    with sqlite3.connect(path) as connection:
+        return {table: connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in TABLES}
+
+def test_resumed_crawl_finds_the_same_pages(site, tmp_path):
+    path = str(tmp_path / "crawls.sqlite")
+    full = asyncio.run(CrawlJob([site], **OPTIONS).run())
+
+    manager = CrawlJobManager(checkpoint=CrawlCheckpoint(path))
+    job_id = manager.submit([site], owner="a", **OPTIONS)
+    while manager.status(job_id).pages_found < 40:
+        time.sleep(0.01)
+    manager.cancel(job_id)
+    assert wait(manager, job_id).state == "cancelled"
+
+    # A new manager over the same file, as after a restart
+    restarted = CrawlJobManager(checkpoint=CrawlCheckpoint(path))
+    saved = restarted.resumable("a")
+    assert [job["job_id"] for job in saved] == [job_id]
+    assert saved[0]["state"] == "interrupted" and saved[0]["pages"] > 0
+    assert restarted.resumable("b") == []
+
+    restarted.resume(job_id, owner="a")
+    assert wait(restarted, job_id).state == "done"
+    job = restarted.collect(job_id)
+    assert len(full) == 150
+    assert {r.url: r.content for r in job.results} == {r.url: r.content for r in full}
+    assert restarted.resumable() == []
+    assert row_counts(path) == dict.fromkeys(TABLES, 0)
+
+def test_discard_only_for_the_owner(tmp_path):
+    store = CrawlCheckpoint(str(tmp_path / "crawls.sqlite"))
+    store.save_job("job1", "a", ["https://example.com"], {})
+    manager = CrawlJobManager(checkpoint=store)
+    assert not manager.discard("job1", owner="b")
+    assert [job["job_id"] for job in manager.resumable("a")] == ["job1"]
+    assert manager.discard("job1", owner="a")
+    assert manager.resumable() == []
+
+def test_collecting_a_cancelled_crawl_leaves_no_rows(site, tmp_path, monkeypatch):
+    path = str(tmp_path / "crawls.sqlite")
+    write_site = CrawlCheckpoint.write_site
+
+    def slow_write_site(self, *args):
+        time.sleep(0.05)  # Widens the window in which a cancelled crawl's save is still running
+        return write_site(self, *args)
+
+    monkeypatch.setattr(CrawlCheckpoint, "write_site", slow_write_site)
+    manager = CrawlJobManager(checkpoint=CrawlCheckpoint(path), max_per_owner=100)
+    for delay in (0.0, 0.05, 0.1, 0.2, 0.3, 0.4):
+        job_id = manager.submit([site], owner="a", **OPTIONS)
+        time.sleep(delay)
+        manager.cancel(job_id)
+        wait(manager, job_id)
+        assert manager.collect(job_id) is not None
+    time.sleep(0.2)  # A write that outlived its job would land now
+    assert row_counts(path) == dict.fromkeys(TABLES, 0)
\ No newline at end of file
@@ -0,0 +1,62 @@
+import asyncio
+import socket
+import time
+import aiohttp
+from aiohttp import web
+from src.crawler import AsyncWebCrawler
+from src.jobs import CrawlProgress
+from src.throttle import HostThrottle
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def page(title: str, links=()) -> web.Response:
+    anchors = ' '.join(f'<a href="{link}">{link}</a>' for link in links)
+    return web.Response(text=f"<html><head><title>{title}</title></head><body><p>{title} is a page with words "
+                             f"of its own: {title} {title}.</p>{anchors}</body></html>", content_type='text/html')
+
+def test_a_slow_page_does_not_hold_up_the_other_fetches():
+    active = peak = 0
+
+    async def handle(request):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        try:
+            name = request.match_info.get('name', '')
+            await asyncio.sleep(1.0 if name == 'slow' else 0.02)
+            if name == '':
+                return page("home", ['/slow', '/hub'])
+            if name == 'hub':
+                return page("hub", [f'/leaf{i}' for i in range(80)])
+            return page(name)
+        finally:
+            active -= 1
+
+    async def main():
+        app = web.Application()
+        app.router.add_get('/', handle)
+        app.router.add_get('/{name}', handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        port = free_port()
+        await web.TCPSite(runner, '127.0.0.1', port).start()
+        crawler = AsyncWebCrawler(max_depth=3, max_pages=200, chunk_size=4, deduplicate=False,
+                                  throttle=HostThrottle(max_concurrency=4))
+        status = CrawlProgress()
+        try:
+            async with aiohttp.ClientSession() as session:
+                start = time.perf_counter()
+                await crawler.run([f"http://127.0.0.1:{port}/"], session, status, status)
+                return crawler, time.perf_counter() - start
+        finally:
+            await runner.cleanup()
+
+    crawler, seconds = asyncio.run(main())
+    assert len(crawler.results) == 83
+    assert peak <= 4
+    # 80 leaves at four at a time take about 0.4 s, fetched while the slow page is outstanding;
+    # waiting for whole batches would add them after it
+    assert seconds < 1.25
\ No newline at end of file
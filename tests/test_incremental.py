@@ -0,0 +1,118 @@
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+from aiohttp import web
+import aiohttp
+from src.crawler import AsyncWebCrawler, CrawlResult, content_fingerprint
+from src.dedup import block_hash
+from src.jobs import CrawlProgress
+
+PAGE = "<html><head><title>{0}</title></head><body><p>{0} has its own text about {0}.</p>{1}</body></html>"
+
+def previous_result(url: str, text: str) -> CrawlResult:
+    return CrawlResult(url, text, text, 200, fingerprint=content_fingerprint(text), source_hash="old")
+
+async def crawl(seeds, previous):
+    crawler = AsyncWebCrawler(max_depth=2, max_pages=20, deduplicate=False)
+    status = CrawlProgress()
+    async with aiohttp.ClientSession() as session:
+        await crawler.run(seeds, session, status, status, previous=previous)
+    return crawler.changes
+
+def closed_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def test_unreachable_site_removes_nothing():
+    base = f"http://127.0.0.1:{closed_port()}"
+    previous = [previous_result(f"{base}/", "Home"), previous_result(f"{base}/about", "About")]
+    changes = asyncio.run(crawl([f"{base}/"], previous))
+    assert changes['removed'] == []
+    assert changes['added'] == changes['changed'] == changes['unchanged'] == []
+
+def test_only_pages_found_gone_are_removed():
+    async def page(request):
+        return web.Response(text=PAGE.format("Home", '<a href="/gone">Gone</a> <a href="/broken">Broken</a>'),
+                            content_type='text/html')
+
+    async def gone(request):
+        return web.Response(status=410)
+
+    async def broken(request):
+        return web.Response(status=503)
+
+    async def main():
+        app = web.Application()
+        app.router.add_get('/', page)
+        app.router.add_get('/gone', gone)
+        app.router.add_get('/broken', broken)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        port = closed_port()
+        await web.TCPSite(runner, '127.0.0.1', port).start()
+        base = f"http://127.0.0.1:{port}"
+        try:
+            previous = [previous_result(f"{base}/{path}", path or "Home") for path in ("", "gone", "broken", "unlinked")]
+            return base, await crawl([f"{base}/"], previous)
+        finally:
+            await runner.cleanup()
+
+    base, changes = asyncio.run(main())
+    assert changes['removed'] == [f"{base}/gone"]
+    assert changes['changed'] == [f"{base}/"]
+
+def test_block_hash_is_the_same_in_every_process():
+    code = "from src.dedup import block_hash; print(block_hash('Acme  footer'))"
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for seed in ("1", "2"):
+        output = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True,
+                                env={**os.environ, "PYTHONHASHSEED": seed}).stdout
+        assert int(output) == block_hash("Acme  footer")
+
+def test_changed_page_is_cleaned_with_boilerplate_kept_from_an_earlier_crawl():
+    header = "<p>Acme Corporation sells anvils, rockets and other fine products worldwide.</p>"
+    footer = "<p>Copyright Acme Corporation, all rights reserved, terms of use apply.</p>"
+    texts = {"": "Home", "a": "Anvils", "b": "Rockets", "c": "Magnets"}
+
+    async def page(request):
+        name = request.match_info.get("name", "")
+        links = "".join(f'<a href="/{other}">{other}</a>' for other in texts if other)
+        body = header + f"<p>{texts[name]} has its own text about {texts[name]} and nothing else.</p>" + links + footer
+        return web.Response(text=f"<html><head><title>{texts[name]}</title></head><body>{body}</body></html>",
+                            content_type='text/html')
+
+    async def main():
+        app = web.Application()
+        app.router.add_get('/', page)
+        app.router.add_get('/{name}', page)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        port = closed_port()
+        await web.TCPSite(runner, '127.0.0.1', port).start()
+        try:
+            first = AsyncWebCrawler(max_depth=2, max_pages=20)
+            status = CrawlProgress()
+            async with aiohttp.ClientSession() as session:
+                previous = await first.run([f"http://127.0.0.1:{port}/"], session, status, status)
+            # Stored as a corpus snapshot's metadata stores them, then read back by a new process
+            kept = {host: set(hashes) for host, hashes in
+                    json.loads(json.dumps({host: sorted(hashes) for host, hashes in first.boilerplate.items()})).items()}
+            texts["c"] = "Horseshoe magnets"
+            second = AsyncWebCrawler(max_depth=2, max_pages=20)
+            async with aiohttp.ClientSession() as session:
+                results = await second.run([f"http://127.0.0.1:{port}/"], session, status, status,
+                                           previous=previous, boilerplate=kept)
+            return previous, kept, second, results
+        finally:
+            await runner.cleanup()
+
+    previous, kept, second, results = asyncio.run(main())
+    assert len(previous) == 4 and all("Acme" not in result.content for result in previous)
+    changed = next(result for result in results if result.url.endswith("/c"))
+    assert second.changes['changed'] == [changed.url]
+    assert "Horseshoe magnets" in changed.content and "Acme" not in changed.content
+    assert kept and second.boilerplate == kept
\ No newline at end of file
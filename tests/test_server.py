@@ -0,0 +1,32 @@
+import asyncio
+from aiohttp.test_utils import TestClient, TestServer, make_mocked_request
+from src.server import APIServer, create_app
+
+def api_request(key: str):
+    return make_mocked_request("GET", "/models", headers={"X-OpenRouter-Key": key})
+
+def test_bodies_that_are_not_utf8_json_are_rejected():
+    async def main():
+        async with TestClient(TestServer(create_app(api_key="key"))) as client:
+            statuses = []
+            for path in ("/crawl", "/documents", "/chat"):
+                response = await client.post(path, data=b'{"seeds": ["\xff\xfe"]}',
+                                             headers={"Content-Type": "application/json"})
+                statuses.append((response.status, (await response.json())["error"]))
+            return statuses
+
+    assert asyncio.run(main()) == [(400, "Request body is not valid JSON")] * 3
+
+def test_chat_clients_are_bounded_per_api_key():
+    server = APIServer(max_api_keys=2, workspace_ttl=60)
+    first = server.chat_api(api_request("a"))
+    server.models["a"] = (0.0, {"data": []})
+    assert server.chat_api(api_request("a")) is first
+    server.chat_api(api_request("b"))
+    server.chat_api(api_request("a"))
+    server.chat_api(api_request("c"))  # Evicts "b", the least recently used
+    assert list(server.apis) == ["a", "c"]
+
+    server.apis["a"].last_used -= 61
+    server.chat_api(api_request("c"))
+    assert list(server.apis) == ["c"] and "a" not in server.models
\ No newline at end of file